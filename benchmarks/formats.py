@@ -0,0 +1,83 @@
+"""Build time and size of a font in each outline format.
+
+Builds the same sheet as TrueType (quadratic curves, converted by FontForge
+from potrace's cubic ones), CFF and CFF2 OpenType (the cubic curves as
+traced), with a Session, and reports side by side how long each build took
+(in all, and the FontForge and ligature stages that differ between formats)
+and how big the font is, as is and, if brotli is installed, as WOFF2 for web
+pages.
+
+CFF fonts are only subroutinized if cffsubr is installed. Needs potrace and
+FontForge. Without a sheet, uses a synthetic one (see handwrite.synthetic).
+
+Usage:
+    python benchmarks/formats.py [SHEET] [--sheet-version V] [--runs N]
+"""
+
+import io
+import argparse
+import statistics
+
+from handwrite import Session
+from handwrite.svgtottf import FONT_FORMATS
+
+
+def woff2_size(font):
+    """Size of the font compressed as WOFF2, or None without brotli."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return None
+    from fontTools.ttLib import TTFont
+
+    tt = TTFont(io.BytesIO(font))
+    tt.flavor = "woff2"
+    data = io.BytesIO()
+    tt.save(data)
+    return len(data.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sheet", nargs="?", default=None)
+    parser.add_argument("--sheet-version", default=None)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    metadata = {"sheetversion": args.sheet_version}
+    if args.sheet:
+        with open(args.sheet, "rb") as f:
+            sheet = f.read()
+    else:
+        from handwrite.synthetic import SyntheticSheets
+
+        sheet = SyntheticSheets(metadata=metadata).render()
+
+    with Session() as session:
+        # the first build warms up the session (and the disk cache)
+        session.build(sheet, metadata)
+        for format in FONT_FORMATS:
+            totals, fonts = [], []
+            for _ in range(args.runs):
+                result = session.build(sheet, dict(metadata, format=format))
+                seconds = result.stats["seconds"]
+                totals.append(sum(seconds.values()))
+                fonts.append(seconds["fontforge"] + seconds["ligatures"])
+            line = "%-5s build %6.2fs  font stages %6.2fs  %8d bytes" % (
+                format,
+                statistics.median(totals),
+                statistics.median(fonts),
+                result.stats["font_bytes"],
+            )
+            compressed = woff2_size(result.font)
+            if compressed is not None:
+                line += "  woff2 %8d bytes" % compressed
+            print(line)
+    try:
+        import cffsubr  # noqa: F401
+    except ImportError:
+        print("cffsubr isn't installed, CFF outlines not subroutinized")
+
+
+if __name__ == "__main__":
+    main()
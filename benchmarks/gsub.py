@@ -0,0 +1,222 @@
+"""Size and shaping time of the GSUB table add_ligatures makes.
+
+Compiles the ligature features of a config into a stand-in font (one empty
+glyph per glyph of the config, with its codepoint), both as add_ligatures
+writes them and as it used to (one flat list of ligatures, and a calt rule
+for each of cartouche start and middle). For each, reports the compiled
+GSUB size, the feaLib compile time and, if uharfbuzz is installed, how
+long HarfBuzz takes to shape the example web page's text, and checks both
+shape it the same.
+
+--extra-ligatures N adds N made-up ligatures (random words of 2 to 8
+letters), to see how it scales with bigger glyph inventories.
+
+Usage:
+    python benchmarks/gsub.py [--config CONFIG] [--extra-ligatures N] [--runs N]
+"""
+
+import os
+import re
+import json
+import random
+import argparse
+import time
+
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from handwrite.svgtottf import WORD_LIST, SVGtoTTF
+
+# glyphs add_glyphs makes that aren't in the config
+EXTRA_GLYPHS = {
+    "space": 0x20,
+    "ideographicspace": 0x3000,
+    "zerowidth": 0x200B,
+    "exclamation": 0x21,
+    "comma": 0x2C,
+    "question": 0x3F,
+}
+
+TEXT = (
+    re.sub(r"<br>", "\n", WORD_LIST)
+    + "\nsina ken sitelen wile lon ni\n"
+    + "jan [sonja] li pona. mi [misa] li toki, tan [wesa] [kama] [lipu]\n"
+)
+
+
+def flat_features(config):
+    """The features as add_ligatures used to write them."""
+    ligs = []
+    cartoucheable = []
+    for glyph in config.get("glyphs-fancy", []):
+        if "ligature" in glyph:
+            ligs.append(
+                (
+                    "  sub " + glyph["ligature"] + " by " + glyph["name"] + ";",
+                    len(glyph["ligature"].split(" ")),
+                )
+            )
+            cartoucheable.append(glyph["name"])
+    ligs.append(("  sub comma space by zerowidth;", 2))
+    ligs.append(("  sub space space by ideographicspace;", 2))
+    ligs.append(("  sub exclamation space by ideographicspace;", 2))
+    ligs.append(("  sub question space by ideographicspace;", 2))
+    ligs.append(("  sub l i n u w i by linluwiTok;", 6))
+    ligs.sort(reverse=True, key=lambda x: x[1])
+    text = "feature liga {\n" + "".join(line + "\n" for line, _ in ligs) + "} liga;\n"
+    text += "@cartoucheableGlyph = [\n  a e i j k l m n o p s t u w\n  period colon space exclamation question underscore\n"
+    text += "".join(
+        "  " + name + "\n"
+        for name in cartoucheable
+        if name not in ("cartoucheStartTok", "cartoucheEndTok")
+    )
+    text += """];
+lookup add_cartouche_middle {
+  sub   @cartoucheableGlyph   by   @cartoucheableGlyph cartoucheMiddleTok;
+} add_cartouche_middle;
+feature calt {
+  sub   cartoucheStartTok  [@cartoucheableGlyph]'   lookup add_cartouche_middle;
+  sub   cartoucheMiddleTok [@cartoucheableGlyph]'   lookup add_cartouche_middle;
+} calt;
+"""
+    return text
+
+
+def add_extra_ligatures(config, count, seed=0):
+    letters = "aeijklmnopstuw"
+    rng = random.Random(seed)
+    glyphs = list(config["glyphs-fancy"])
+    seen = {glyph.get("ligature") for glyph in glyphs}
+    while count:
+        word = " ".join(rng.choice(letters) for _ in range(rng.randint(2, 8)))
+        if word in seen:
+            continue
+        seen.add(word)
+        glyphs.append({"name": "extra%dTok" % count, "ligature": word})
+        count -= 1
+    return dict(config, **{"glyphs-fancy": glyphs})
+
+
+def stand_in_font(config):
+    """A TrueType font with an empty glyph for each glyph of the config."""
+    order = [".notdef"]
+    cmap = {}
+    for glyph in config["glyphs-fancy"]:
+        if "name" in glyph and glyph["name"] not in order:
+            order.append(glyph["name"])
+            if glyph.get("codepoint"):
+                cmap.setdefault(int(glyph["codepoint"], 16), glyph["name"])
+    for name, codepoint in EXTRA_GLYPHS.items():
+        if name not in order:
+            order.append(name)
+        cmap.setdefault(codepoint, name)
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(order)
+    builder.setupCharacterMap(cmap)
+    empty = TTGlyphPen(None).glyph()
+    builder.setupGlyf({name: empty for name in order})
+    builder.setupHorizontalMetrics({name: (1000, 0) for name in order})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Bench", "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+    return builder.font
+
+
+def measure(config, features, runs):
+    import io
+
+    font = stand_in_font(config)
+    start = time.perf_counter()
+    addOpenTypeFeaturesFromString(font, features)
+    compile_time = time.perf_counter() - start
+    data = io.BytesIO()
+    font.save(data)
+    font.close()
+    result = {
+        "gsub_bytes": len(font_table(data.getvalue(), "GSUB")),
+        "lookups": gsub_lookups(data.getvalue()),
+        "compile_seconds": compile_time,
+    }
+    try:
+        import uharfbuzz as hb
+    except ImportError:
+        return result, None
+    face = hb.Face(data.getvalue())
+    hb_font = hb.Font(face)
+    times = []
+    for _ in range(runs):
+        buf = hb.Buffer()
+        buf.add_str(TEXT * 20)
+        buf.guess_segment_properties()
+        start = time.perf_counter()
+        hb.shape(hb_font, buf, {"liga": True, "calt": True})
+        times.append(time.perf_counter() - start)
+    result["shape_seconds"] = min(times)
+    return result, [(info.codepoint, info.cluster) for info in buf.glyph_infos]
+
+
+def font_table(data, tag):
+    import io
+    from fontTools.ttLib import TTFont
+
+    return TTFont(io.BytesIO(data)).reader[tag]
+
+
+def gsub_lookups(data):
+    import io
+    from fontTools.ttLib import TTFont
+
+    gsub = TTFont(io.BytesIO(data))["GSUB"].table
+    return [
+        (lookup.LookupType, lookup.SubTableCount) for lookup in gsub.LookupList.Lookup
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--config",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "..",
+            "handwrite",
+            "default.json",
+        ),
+    )
+    parser.add_argument("--extra-ligatures", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    if args.extra_ligatures:
+        config = add_extra_ligatures(config, args.extra_ligatures)
+    converter = SVGtoTTF()
+    converter.config = config
+    shaped = {}
+    for label, features in (
+        ("before", flat_features(config)),
+        ("now", converter.ligature_features()),
+    ):
+        result, shaped[label] = measure(config, features, args.runs)
+        line = "%-7s GSUB %7d bytes  compile %.3fs" % (
+            label,
+            result["gsub_bytes"],
+            result["compile_seconds"],
+        )
+        if "shape_seconds" in result:
+            line += "  shape %.2fms" % (result["shape_seconds"] * 1000)
+        print(line + "  lookups (type, subtables) %s" % result["lookups"])
+    if shaped["now"] is None:
+        print("uharfbuzz isn't installed, shaping not measured")
+    elif shaped["now"] != shaped["before"]:
+        print("DIFFERENT shaping")
+        raise SystemExit(1)
+    else:
+        print("same shaping")
+
+
+if __name__ == "__main__":
+    main()
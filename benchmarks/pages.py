@@ -0,0 +1,88 @@
+"""Memory and time of cutting multi-page sheet sets.
+
+Cuts 1, 2, 4, ... copies of a sheet, with a config that puts a glyph in every
+cell of every page, and reports the time and the peak memory (traced numpy
+and Python allocations) of SHEETtoPNG. Time should grow linearly with the
+number of pages, and peak memory should stay flat.
+
+Usage:
+    python benchmarks/pages.py [SHEET] [--pages 8] [--sheet-version 2]
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from handwrite.sheettopng import SHEETtoPNG
+
+
+def write_config(path, pages, rows=9, cols=20):
+    glyphs = [
+        {
+            "codepoint": hex(0xF0000 + index),
+            "name": "glyph%d" % index,
+            "page": index // (rows * cols),
+            "row": index % (rows * cols) // cols,
+            "col": index % cols,
+        }
+        for index in range(pages * rows * cols)
+    ]
+    with open(path, "w") as f:
+        json.dump({"threshold_value": 200, "glyphs-fancy": glyphs}, f)
+
+
+def measure(sheet, pages, metadata):
+    directory = tempfile.mkdtemp()
+    try:
+        config = os.path.join(directory, "config.json")
+        write_config(config, pages)
+        tracemalloc.start()
+        start = time.perf_counter()
+        SHEETtoPNG().convert(
+            [sheet] * pages, os.path.join(directory, "cells"), config, metadata
+        )
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "sheet",
+        nargs="?",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "..",
+            "tests",
+            "test_data",
+            "sheettopng",
+            "two-squares.png",
+        ),
+    )
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--sheet-version", default="2")
+    parser.add_argument("--glyph-store", choices=["directory", "zip"], default="zip")
+    args = parser.parse_args()
+
+    metadata = {"sheetversion": args.sheet_version, "glyphstore": args.glyph_store}
+    print("pages   glyphs   time     per page   peak memory")
+    pages = 1
+    while pages <= args.pages:
+        elapsed, peak = measure(args.sheet, pages, metadata)
+        print(
+            "%5d %8d %7.2fs %9.2fs %10.1f MiB"
+            % (pages, pages * 180, elapsed, elapsed / pages, peak / 2**20)
+        )
+        pages *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Startup time of the handwrite command.
+
+Measures, over a few runs:
+
+- `handwrite --help`, which shouldn't load any of the heavy dependencies
+  (OpenCV, Pillow, fontTools);
+- time to first output of a real build, i.e. until the first line the
+  build prints. This is what short-lived jobs (CI, containers) wait for
+  before they know the build has started.
+
+Usage:
+    python benchmarks/startup.py [SHEET] [--runs N]
+
+Exits with status 1 if a median is over its target.
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+
+HELP_TARGET = 0.15  # seconds
+FIRST_OUTPUT_TARGET = 0.5  # seconds
+
+HANDWRITE = [sys.executable, "-c", "from handwrite.cli import main; main()"]
+
+
+def time_help():
+    start = time.perf_counter()
+    subprocess.run(HANDWRITE + ["--help"], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def time_first_output(sheet):
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            HANDWRITE
+            + [sheet, directory, "--debug-directory", os.path.join(directory, "debug")],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
+        )
+        process.stdout.readline()
+        elapsed = time.perf_counter() - start
+        process.kill()
+        process.wait()
+        return elapsed
+    finally:
+        shutil.rmtree(directory)
+
+
+def report(label, times, target):
+    median = statistics.median(times)
+    status = "ok" if median <= target else "SLOW"
+    print(
+        "%-22s median %.3fs  min %.3fs  target %.2fs  %s"
+        % (label, median, min(times), target, status)
+    )
+    return median <= target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "sheet",
+        nargs="?",
+        default=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "..",
+            "tests",
+            "test_data",
+            "sheettopng",
+            "two-squares.png",
+        ),
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = report(
+        "handwrite --help", [time_help() for _ in range(args.runs)], HELP_TARGET
+    )
+    ok &= report(
+        "time to first output",
+        [time_first_output(args.sheet) for _ in range(args.runs)],
+        FIRST_OUTPUT_TARGET,
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,32 @@
-from handwrite.sheettopng import SHEETtoPNG
-from handwrite.pngtosvg import PNGtoSVG
-from handwrite.svgtottf import SVGtoTTF
-from handwrite.cli import converters
+__version__ = "0.3.1"
+
+# The converters pull in OpenCV, Pillow and fontTools, which take a while to
+# load. They're imported on first use, so `handwrite --help` (and anything
+# else that doesn't convert) starts fast.
+_LAZY = {
+    "SHEETtoPNG": "handwrite.sheettopng",
+    "PNGtoSVG": "handwrite.pngtosvg",
+    "SVGtoTTF": "handwrite.svgtottf",
+    "converters": "handwrite.cli",
+    "Progress": "handwrite.progress",
+    "build_family": "handwrite.family",
+    "AsyncConverter": "handwrite.aio",
+    "Session": "handwrite.session",
+    "Limits": "handwrite.limits",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module 'handwrite' has no attribute %r" % name)
+    import importlib
+
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
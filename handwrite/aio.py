@@ -0,0 +1,324 @@
+"""Build fonts from an asyncio event loop.
+
+`handwrite.converters` blocks whatever calls it for the whole build. Here,
+potrace and FontForge run with asyncio.create_subprocess_exec, and the
+OpenCV/Pillow work runs in a thread pool, so the event loop stays free and
+can drive many builds at once. Semaphores shared by every build of an
+AsyncConverter cap how many potrace and FontForge processes run at a time.
+
+Cancelling a build kills its potrace and FontForge processes, waits for
+the thread pool jobs it started (they can't be interrupted), and removes
+its temp directory.
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import weakref
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from handwrite.progress import as_progress
+
+
+def glyph_names(config):
+    with open(config) as f:
+        return [
+            glyph["name"] for glyph in json.load(f)["glyphs-fancy"] if "name" in glyph
+        ]
+
+
+async def run_all(coroutines):
+    """Run coroutines at once. If one fails (or this is cancelled), cancel the rest."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_process(
+    command, input=None, env=None, lines=None, tool=None, limits=None
+):
+    """Run a command, and kill it if this is cancelled.
+
+    Parameters
+    ----------
+    command : list of str
+    input : bytes, optional
+        Written to the process' stdin.
+    env : dict, optional
+    lines : callable, optional
+        Called with each line of stdout as it arrives, instead of
+        collecting stdout.
+    tool : str, optional
+        "potrace" or "fontforge", for `limits`.
+    limits : handwrite.limits.Limits, optional
+        Timeout, resource limits and retries of the run.
+
+    Returns
+    -------
+    bytes
+        The process' stdout (empty when `lines` is given).
+
+    Raises
+    ------
+    handwrite.limits.ToolError
+        If the command fails, or takes too long.
+    """
+    import subprocess
+    import tempfile
+
+    from handwrite.limits import Limits, ToolError, ToolTimeout, check
+
+    limits = limits or Limits()
+    retries = limits.retries
+
+    async def communicate(process):
+        if lines is None:
+            stdout, _ = await process.communicate(input)
+            return stdout
+        async for line in process.stdout:
+            lines(line)
+        await process.wait()
+        return b""
+
+    while True:
+        timeout = limits.timeout(tool, command)
+        with tempfile.TemporaryFile() as stderr:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=env,
+                preexec_fn=limits.preexec(),
+            )
+            try:
+                try:
+                    stdout = await asyncio.wait_for(communicate(process), timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    stderr.seek(0)
+                    raise ToolTimeout(
+                        tool,
+                        command,
+                        "timed out after %gs" % timeout,
+                        stderr=stderr.read(),
+                    )
+                stderr.seek(0)
+                check(tool, command, process.returncode, stderr.read())
+                return stdout
+            except ToolError:
+                if retries <= 0:
+                    raise
+                retries -= 1
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+
+class AsyncConverter:
+    """Convert sheets to fonts without blocking the event loop.
+
+    Parameters
+    ----------
+    potrace_limit : int, optional
+        Most potrace processes running at once, over every build. Defaults
+        to the number of CPUs.
+    fontforge_limit : int, optional
+        Most FontForge processes running at once, over every build.
+        Defaults to the number of CPUs.
+    executor : concurrent.futures.ThreadPoolExecutor, optional
+        Where the CPU-bound steps run. By default, a pool of its own,
+        shut down by close().
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of potrace and FontForge. A
+        deadline applies to each build.
+    """
+
+    def __init__(
+        self, potrace_limit=None, fontforge_limit=None, executor=None, limits=None
+    ):
+        from handwrite.limits import Limits
+
+        self.potrace_limit = potrace_limit or os.cpu_count() or 1
+        self.fontforge_limit = fontforge_limit or os.cpu_count() or 1
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(os.cpu_count() or 1)
+        self.tool_limits = limits or Limits()
+        # one pair of semaphores per event loop, made in the loop
+        self.limits = weakref.WeakKeyDictionary()
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown()
+
+    def semaphores(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.limits:
+            self.limits[loop] = (
+                asyncio.Semaphore(self.potrace_limit),
+                asyncio.Semaphore(self.fontforge_limit),
+            )
+        return self.limits[loop]
+
+    async def convert(
+        self,
+        sheet,
+        output_directory,
+        directory=None,
+        config=None,
+        metadata=None,
+        deterministic=False,
+        check=True,
+        progress=None,
+    ):
+        """Convert a sheet (or a list of pages) to a font in `output_directory`.
+
+        Like handwrite.converters, without checkpoints or the build cache.
+
+        Parameters
+        ----------
+        sheet : str or list of str
+            Path to the sheet, or to each page of a sheet set.
+        output_directory : str
+            Where to write the font and its web page.
+        directory : str, optional
+            Debug directory. Temp (and removed afterwards) by default.
+        config : str, optional
+            Path to config file.
+        metadata : dict, optional
+            Dictionary containing the metadata (filename, family, ...)
+        deterministic : bool, default=False
+            Reproducible output, like `handwrite --deterministic`.
+        check : bool, default=True
+            Check the sheet and the tools before converting.
+        progress : callable or handwrite.progress.Progress, optional
+            Gets the build's events. It's called from the thread pool too,
+            not only from the event loop.
+
+        Returns
+        -------
+        str
+            Path to the font.
+        """
+        is_temp = not directory
+        directory = directory or tempfile.mkdtemp()
+        jobs = []
+
+        def run(function, *args):
+            job = self.executor.submit(function, *args)
+            jobs.append(job)
+            return asyncio.wrap_future(job)
+
+        try:
+            return await self.build(
+                run,
+                sheet,
+                output_directory,
+                directory,
+                config,
+                metadata,
+                deterministic,
+                check,
+                as_progress(progress),
+            )
+        finally:
+            # threads can't be stopped: let the running jobs finish before
+            # cleaning up after them
+            for job in jobs:
+                job.cancel()
+            running = [asyncio.wrap_future(job) for job in jobs if not job.done()]
+            if running:
+                await asyncio.wait(running)
+            if is_temp:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    async def build(
+        self,
+        run,
+        sheet,
+        output_directory,
+        directory,
+        config,
+        metadata,
+        deterministic,
+        check,
+        progress,
+    ):
+        from handwrite.cache import build_key
+        from handwrite.glyphstore import open_store
+        from handwrite.pngtosvg import PNGtoSVG, PotraceNotFound
+        from handwrite.preflight import with_sheet_version
+        from handwrite.sheettopng import SHEETtoPNG
+        from handwrite.svgtottf import SVGtoTTF, relay_progress
+
+        if config is None:
+            config = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "default.json"
+            )
+        limits = self.tool_limits.start()
+        metadata = await run(with_sheet_version, sheet, config, metadata)
+        if deterministic:
+            metadata["deterministic"] = True
+            metadata["buildid"] = await run(build_key, sheet, config, metadata)
+        if check:
+            from handwrite.preflight import preflight
+
+            await run(preflight, sheet, config, metadata)
+        elif shutil.which("potrace") is None:
+            raise PotraceNotFound("Potrace is either not installed or not in path")
+        potrace_slots, fontforge_slots = self.semaphores()
+        reporting = progress.callback is not None
+
+        await run(
+            SHEETtoPNG(progress=progress).convert, sheet, directory, config, metadata
+        )
+
+        store = await run(open_store, directory, metadata)
+        tracer = PNGtoSVG()
+        try:
+            names = await run(lambda: list(store.names(".png")))
+
+            async def trace(name):
+                bmp = await run(tracer.glyph_bmp, store, name, metadata)
+                async with potrace_slots:
+                    svg = await run_process(
+                        ["potrace", "--backend", "svg", "--output", "-"],
+                        bmp,
+                        tool="potrace",
+                        limits=limits,
+                    )
+                await run(tracer.save_svg, store, name, svg)
+                progress.glyph("pngtosvg", name)
+
+            with progress.stage("pngtosvg", len(names)):
+                await run_all(trace(name) for name in names)
+        finally:
+            await run(store.close)
+
+        converter = SVGtoTTF(progress)
+        await run(converter.place_glyphs, directory, config, metadata)
+        total = len(await run(glyph_names, config))
+        with progress.stage("fontforge", total):
+            async with fontforge_slots:
+                await run_process(
+                    converter.fontforge_command(
+                        directory, config, metadata, progress=reporting
+                    ),
+                    env=converter.fontforge_env(metadata),
+                    lines=lambda line: relay_progress([line], progress),
+                    tool="fontforge",
+                    limits=limits,
+                )
+
+        os.makedirs(output_directory, exist_ok=True)
+        return await run(
+            converter.add_ligatures, directory, output_directory, config, metadata
+        )
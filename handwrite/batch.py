@@ -0,0 +1,810 @@
+"""Build fonts on several hosts, from a queue of jobs in a shared directory.
+
+There's no broker: `handwrite-batch submit` writes each job to a directory
+every host can reach (NFS, SMB...), and `handwrite-batch work` processes on
+any number of hosts take jobs from it until there are none left. The queue
+directory has a subdirectory for each state of a job:
+
+    pending/<id>.json           waiting for a worker
+    running/<id>.json           claimed by a worker, with
+    running/<id>.<token>.lease  the worker's lease, touched every few seconds
+    done/<id>.json        the job, and how its build went
+    failed/<id>.json      same, for a build that failed
+    output/<id>/          the font and web page the build wrote
+    sheets/<id>/          the job's sheets (and config), copied on submit
+
+A worker claims a job by renaming it from pending/ to running/, which only
+one worker can do, then writes its lease next to it. While it builds, it
+keeps touching the lease (its heartbeat). A lease nobody touched for
+`lease_timeout` seconds belongs to a worker that crashed or lost its host:
+any worker moves the job back to pending/ for another try, up to
+`max_attempts` tries. Whoever removes the lease decides the job's fate:
+the worker, when it's done, or a worker reclaiming it, and never both.
+Results are written to a temp directory in the queue and renamed into
+place, so a job's output and status are never seen half written, and a
+worker that lost its lease keeps its result to itself.
+
+Lease ages are measured with the shared file system's clock (the mtime of
+a file touched just before), so the hosts' clocks don't need to agree.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import shutil
+import socket
+import tempfile
+import threading
+
+from handwrite.progress import Progress, as_progress
+
+STATES = ("pending", "running", "done", "failed")
+
+# Temp files in tmp/ holding a job that's being reclaimed or finished,
+# "<job id>.<token><suffix>". A worker that crashed meanwhile leaves them
+# behind, for reap to put back
+JOB_TOKENS = (".reclaim", ".finish")
+
+
+def write_json(path, data, directory):
+    """Write JSON to `path` through a temp file in `directory`, so it's never seen half written."""
+    handle, temp = tempfile.mkstemp(dir=directory, suffix=".json")
+    try:
+        with os.fdopen(handle, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def job_progress(progress, job_id):
+    """A Progress for one job, that adds the job's id to every event."""
+    if progress.callback is None:
+        return Progress()
+
+    def callback(event):
+        event.details["job"] = job_id
+        progress.callback(event)
+
+    return Progress(callback)
+
+
+class WorkQueue:
+    """A queue of builds in a directory shared by every worker.
+
+    Parameters
+    ----------
+    directory : str
+        The queue directory. Created if it doesn't exist.
+    lease_timeout : float, default=60
+        Seconds after its last heartbeat a lease is taken to be abandoned.
+        Set by whoever creates the queue, and kept in its queue.json, so
+        every worker goes by the same one.
+    """
+
+    def __init__(self, directory, lease_timeout=60):
+        self.directory = directory
+        for name in STATES + ("output", "sheets", "tmp"):
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+        settings = os.path.join(directory, "queue.json")
+        if not os.path.exists(settings):
+            try:
+                with open(settings, "x") as f:
+                    json.dump({"lease_timeout": lease_timeout}, f)
+            except FileExistsError:
+                # another worker made it first
+                pass
+        for _ in range(10):
+            try:
+                self.lease_timeout = read_json(settings)["lease_timeout"]
+                break
+            except ValueError:
+                # still being written
+                time.sleep(0.1)
+        else:
+            raise ValueError("Can't read %s" % settings)
+
+    def path(self, state, name=""):
+        return os.path.join(self.directory, state, name)
+
+    def jobs(self, state):
+        """Ids of the jobs in a state, oldest first."""
+        return sorted(
+            name[:-5]
+            for name in os.listdir(self.path(state))
+            if name.endswith(".json") and not name.startswith(".")
+        )
+
+    def leases(self):
+        """Paths of the lease files in running/, by job id."""
+        leases = {}
+        for name in os.listdir(self.path("running")):
+            if name.endswith(".lease") and not name.startswith("."):
+                # "<job id>.<token>.lease", and job ids may have dots
+                job_id = name[: -len(".lease")].rsplit(".", 1)[0]
+                leases.setdefault(job_id, []).append(self.path("running", name))
+        return leases
+
+    def take(self, path):
+        """Remove a lease, if nobody else does first.
+
+        Returns
+        -------
+        bool
+            Whether this call did. Of a worker finishing the job and the
+            workers reclaiming it, only one can.
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def now(self):
+        """The shared file system's current time."""
+        clock = self.path("tmp", ".clock")
+        with open(clock, "a"):
+            pass
+        os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    def submit(
+        self,
+        sheet,
+        metadata=None,
+        config=None,
+        deterministic=False,
+        job_id=None,
+        copy=True,
+    ):
+        """Add a build to the queue.
+
+        Parameters
+        ----------
+        sheet : str or list of str
+            Path to the sheet, or to each page of a sheet set.
+        metadata : dict, optional
+            Dictionary containing the metadata (filename, family, ...)
+        config : str, optional
+            Path to config file.
+        deterministic : bool, default=False
+            Reproducible output, like `handwrite --deterministic`.
+        job_id : str, optional
+            The job's id. By default, the submit time and a random part, so
+            jobs are taken about in the order they were submitted.
+        copy : bool, default=True
+            Copy the sheets and the config into the queue directory, so
+            every host can read them. Otherwise the paths have to be the
+            same on every host.
+
+        Returns
+        -------
+        str
+            The job's id.
+        """
+        if job_id is None:
+            job_id = "%013d-%s" % (time.time() * 1000, uuid.uuid4().hex[:8])
+        elif not job_id or job_id.startswith(".") or os.sep in job_id or "/" in job_id:
+            raise ValueError("Invalid job id %r" % job_id)
+        if any(os.path.exists(self.path(state, job_id + ".json")) for state in STATES):
+            raise ValueError("There's already a job %r" % job_id)
+        pages = sheet if isinstance(sheet, list) else [sheet]
+        if copy:
+            sheets = self.path("sheets", job_id)
+            os.makedirs(sheets, exist_ok=True)
+            # numbered, in case two pages have the same name
+            pages = [
+                os.path.relpath(
+                    shutil.copy(
+                        page,
+                        os.path.join(
+                            sheets, "%d-%s" % (number, os.path.basename(page))
+                        ),
+                    ),
+                    self.directory,
+                )
+                for number, page in enumerate(pages)
+            ]
+            if config is not None:
+                config = os.path.relpath(
+                    shutil.copy(config, os.path.join(sheets, "config.json")),
+                    self.directory,
+                )
+        else:
+            pages = [os.path.abspath(page) for page in pages]
+            config = config and os.path.abspath(config)
+        job = {
+            "id": job_id,
+            "sheet": pages if isinstance(sheet, list) else pages[0],
+            "metadata": metadata or {},
+            "config": config,
+            "deterministic": deterministic,
+            "attempts": 0,
+            "submitted": time.time(),
+        }
+        write_json(self.path("pending", job_id + ".json"), job, self.path("tmp"))
+        return job_id
+
+    def resolve(self, job):
+        """The job, with its paths relative to the queue directory made absolute."""
+
+        def absolute(path):
+            return (
+                path
+                if path is None
+                else os.path.join(os.path.abspath(self.directory), path)
+            )
+
+        sheet = job["sheet"]
+        return dict(
+            job,
+            sheet=(
+                [absolute(page) for page in sheet]
+                if isinstance(sheet, list)
+                else absolute(sheet)
+            ),
+            config=absolute(job.get("config")),
+        )
+
+    def claim(self, worker):
+        """Take the oldest pending job.
+
+        Returns
+        -------
+        Lease or None
+            None if there's no pending job.
+        """
+        for job_id in self.jobs("pending"):
+            name = job_id + ".json"
+            if self.finished(job_id):
+                # a worker finished it, then crashed before cleaning up
+                self.remove(self.path("pending", name))
+                continue
+            try:
+                # fresh mtime, so the job isn't taken for abandoned before
+                # its lease is written
+                os.utime(self.path("pending", name))
+                os.rename(self.path("pending", name), self.path("running", name))
+            except FileNotFoundError:
+                # another worker got it
+                continue
+            lease = Lease(self, job_id, worker)
+            lease.write()
+            job = read_json(self.path("running", name))
+            job["attempts"] = job.get("attempts", 0) + 1
+            write_json(self.path("running", name), job, self.path("tmp"))
+            lease.job = job
+            return lease
+        return None
+
+    def finished(self, job_id):
+        return os.path.exists(self.path("done", job_id + ".json")) or os.path.exists(
+            self.path("failed", job_id + ".json")
+        )
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def reap(self):
+        """Put the jobs of abandoned leases back in pending/.
+
+        Returns
+        -------
+        list of str
+            Ids of the jobs put back.
+        """
+        now = self.now()
+        leases = self.leases()
+        reclaimed = []
+        for job_id in self.jobs("running"):
+            job_path = self.path("running", job_id + ".json")
+            lease_paths = leases.get(job_id, [])
+            try:
+                heartbeat = max(
+                    os.stat(path).st_mtime for path in lease_paths or [job_path]
+                )
+            except FileNotFoundError:
+                # finished (or reaped) meanwhile
+                continue
+            if now - heartbeat <= self.lease_timeout:
+                continue
+            # taking the lease away decides between this and its worker
+            # finishing the job (see finish)
+            if not all(self.take(path) for path in lease_paths):
+                continue
+            # the rename decides which worker reclaims it
+            token = self.job_token(job_id, ".reclaim")
+            try:
+                os.rename(job_path, token)
+            except FileNotFoundError:
+                continue
+            if self.finished(job_id):
+                self.remove(token)
+            else:
+                os.rename(token, self.path("pending", job_id + ".json"))
+                reclaimed.append(job_id)
+        # jobs whose reclaiming or finishing was cut short
+        for name in os.listdir(self.path("tmp")):
+            path = self.path("tmp", name)
+            suffix = os.path.splitext(name)[1]
+            if suffix in JOB_TOKENS:
+                # "<job id>.<token><suffix>", and job ids may have dots
+                job_id = name[: -len(suffix)].rsplit(".", 1)[0]
+                try:
+                    if now - os.stat(path).st_mtime <= self.lease_timeout:
+                        continue
+                    if self.finished(job_id):
+                        self.remove(path)
+                        continue
+                    os.rename(path, self.path("pending", job_id + ".json"))
+                except FileNotFoundError:
+                    continue
+                reclaimed.append(job_id)
+        return reclaimed
+
+    def job_token(self, job_id, suffix):
+        return self.path("tmp", "%s.%s%s" % (job_id, uuid.uuid4().hex, suffix))
+
+    def finish(self, lease, state, record, output_directory=None):
+        """Write back a job's result, if its lease is still the worker's.
+
+        Parameters
+        ----------
+        lease : Lease
+        state : str
+            "done" or "failed".
+        record : dict
+            How the build went, stored with the job.
+        output_directory : str, optional
+            Directory with the build's files, copied to output/<id>/.
+
+        Returns
+        -------
+        bool
+            False if the lease was lost (and the job given to another
+            worker), in which case nothing is written.
+        """
+        job_id = lease.job_id
+        # removing the lease, then moving the job out of running/, is what
+        # a reclaiming worker does too (see reap): only one of them can
+        if not self.take(lease.path):
+            return False
+        token = self.job_token(job_id, ".finish")
+        try:
+            os.rename(self.path("running", job_id + ".json"), token)
+        except FileNotFoundError:
+            return False
+        outputs = []
+        if output_directory is not None:
+            staging = tempfile.mkdtemp(dir=self.path("tmp"), prefix="." + job_id)
+            for name in sorted(os.listdir(output_directory)):
+                shutil.copy(os.path.join(output_directory, name), staging)
+                outputs.append(os.path.join("output", job_id, name))
+            final = self.path("output", job_id)
+            if os.path.exists(final):
+                # from an attempt that crashed before writing its status
+                shutil.rmtree(final)
+            os.rename(staging, final)
+        result = dict(lease.job, state=state, outputs=outputs, **record)
+        write_json(self.path(state, job_id + ".json"), result, self.path("tmp"))
+        self.remove(token)
+        return True
+
+    def status(self):
+        """What's in the queue.
+
+        Returns
+        -------
+        dict
+            Number of jobs in each state, and for each running job, its
+            worker and how long ago its lease was renewed ("leases").
+        """
+        now = self.now()
+        status = {state: len(self.jobs(state)) for state in STATES}
+        leases = []
+        for job_id, paths in sorted(self.leases().items()):
+            try:
+                lease = read_json(paths[0])
+                heartbeat = os.stat(paths[0]).st_mtime
+            except (FileNotFoundError, ValueError):
+                continue
+            leases.append(
+                {
+                    "id": job_id,
+                    "worker": lease["worker"],
+                    "age": round(now - heartbeat, 1),
+                }
+            )
+        status["leases"] = leases
+        return status
+
+
+class Lease:
+    """A worker's claim on a running job, kept alive by heartbeats."""
+
+    def __init__(self, queue, job_id, worker):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.job = None
+        # a name of its own, so a worker that lost its lease never takes
+        # the one of the worker the job went to next
+        self.path = queue.path("running", "%s.%s.lease" % (job_id, uuid.uuid4().hex))
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def write(self):
+        write_json(
+            self.path,
+            {"worker": self.worker, "host": socket.gethostname(), "pid": os.getpid()},
+            self.queue.path("tmp"),
+        )
+
+    def owned(self):
+        """Whether the lease is still this worker's."""
+        try:
+            return read_json(self.path)["worker"] == self.worker
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def renew(self):
+        """Touch the lease. Returns False if it's no longer this worker's."""
+        if not self.owned():
+            return False
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def start(self, interval):
+        """Renew the lease every `interval` seconds, in a thread, until stop()."""
+
+        def beat():
+            while not self.stopped.wait(interval):
+                if not self.renew():
+                    break
+
+        self.thread = threading.Thread(target=beat, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def build_job(job, output_directory, limits=None, progress=None):
+    """Build a job's font with handwrite.converters. Returns the font's path."""
+    from handwrite.cli import converters
+
+    converters(
+        job["sheet"],
+        output_directory,
+        config=job.get("config"),
+        metadata=job.get("metadata"),
+        deterministic=job.get("deterministic", False),
+        progress=progress,
+        limits=limits,
+    )
+
+
+class Worker:
+    """Takes jobs from a WorkQueue and builds them, one at a time.
+
+    Run as many as there are cores to spare, on as many hosts as needed.
+
+    Parameters
+    ----------
+    queue : WorkQueue
+    name : str, optional
+        Unique name of the worker. Host name, process id and a random part
+        by default.
+    heartbeat : float, default=10
+        Seconds between renewals of the lease. Well under the queue's
+        lease timeout (ValueError if it isn't under it).
+    max_attempts : int, default=3
+        A job whose worker crashed this many times goes to failed/.
+    build : callable, optional
+        Called with the job (its paths made absolute) and an output
+        directory, and the `limits` and `progress` of the build. build_job
+        by default.
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of each build's tools.
+    progress : callable or handwrite.progress.Progress, optional
+        Gets the events of every build, with a "job" detail, and a "job"
+        event when a job is done or failed.
+    """
+
+    def __init__(
+        self,
+        queue,
+        name=None,
+        heartbeat=10,
+        max_attempts=3,
+        build=None,
+        limits=None,
+        progress=None,
+    ):
+        self.queue = queue
+        self.name = name or "%s-%d-%s" % (
+            socket.gethostname(),
+            os.getpid(),
+            uuid.uuid4().hex[:6],
+        )
+        if not 0 < heartbeat < queue.lease_timeout:
+            # the queue's, which may not be the one asked for if it existed
+            raise ValueError(
+                "The heartbeat (%gs) must be positive, and less than the queue's lease timeout (%gs)"
+                % (heartbeat, queue.lease_timeout)
+            )
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self.build = build or build_job
+        self.limits = limits
+        self.progress = as_progress(progress)
+
+    def run(self, exit_when_empty=False, poll=2.0, max_jobs=None):
+        """Take and build jobs.
+
+        Parameters
+        ----------
+        exit_when_empty : bool, default=False
+            Return once no job is pending or running, instead of waiting
+            for more.
+        poll : float, default=2.0
+            Seconds between looks at an empty queue.
+        max_jobs : int, optional
+            Return after this many jobs.
+
+        Returns
+        -------
+        int
+            Number of jobs taken.
+        """
+        taken = 0
+        backoff = 0.01
+        while max_jobs is None or taken < max_jobs:
+            self.queue.reap()
+            lease = self.queue.claim(self.name)
+            if lease is None:
+                if exit_when_empty and not self.queue.jobs("running"):
+                    # one last look, for a job submitted or reclaimed meanwhile
+                    if not self.queue.jobs("pending"):
+                        break
+                    # other workers got there first: let them get on with it
+                    time.sleep(random.uniform(0, backoff))
+                    backoff = min(backoff * 2, poll)
+                    continue
+                time.sleep(poll)
+                continue
+            backoff = 0.01
+            self.work(lease)
+            taken += 1
+        return taken
+
+    def work(self, lease):
+        """Build a claimed job, and write back its result.
+
+        Returns
+        -------
+        str or None
+            "done" or "failed", or None if the lease was lost meanwhile.
+        """
+        job = lease.job
+        record = {
+            "worker": self.name,
+            "host": socket.gethostname(),
+            "started": time.time(),
+        }
+        if job["attempts"] > self.max_attempts:
+            record.update(
+                finished=time.time(),
+                error="Gave up after %d attempts" % (job["attempts"] - 1),
+            )
+            self.queue.finish(lease, "failed", record)
+            self.progress.emit(
+                "job", job=job["id"], state="failed", error=record["error"]
+            )
+            return "failed"
+
+        output = tempfile.mkdtemp()
+        lease.start(self.heartbeat)
+        try:
+            self.build(
+                self.queue.resolve(job),
+                output,
+                limits=self.limits,
+                progress=job_progress(self.progress, job["id"]),
+            )
+            state = "done"
+        except Exception as e:
+            state = "failed"
+            record["error"] = "%s: %s" % (type(e).__name__, e)
+            if hasattr(e, "as_dict"):
+                record.update(e.as_dict())
+        finally:
+            lease.stop()
+        record["finished"] = time.time()
+        record["seconds"] = round(record["finished"] - record["started"], 3)
+        try:
+            if not self.queue.finish(lease, state, record, output):
+                self.progress.emit("job", job=job["id"], state="lost")
+                return None
+        finally:
+            shutil.rmtree(output, ignore_errors=True)
+        self.progress.emit("job", job=job["id"], state=state, error=record.get("error"))
+        return state
+
+
+def main():
+    import argparse
+
+    from handwrite.limits import add_limit_arguments, limits_from_arguments
+
+    parser = argparse.ArgumentParser(
+        description="Build fonts on several hosts, from a queue of jobs in a shared directory"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser(
+        "submit", help="Add a build to the queue, and print its id"
+    )
+    submit.add_argument("queue", help="The queue directory")
+    submit.add_argument(
+        "input_path", nargs="+", help="Path to sample sheet (or one per page, in order)"
+    )
+    submit.add_argument("--id", help="Id of the job (made up by default)", default=None)
+    submit.add_argument(
+        "--filename", help='Font File name ("MyFont" by default)', default=None
+    )
+    submit.add_argument(
+        "--family", help="Font Family name (filename by default)", default=None
+    )
+    submit.add_argument(
+        "--designer", help='Font Designer name ("me" by default)', default=None
+    )
+    submit.add_argument(
+        "--license", help="Font License, like handwrite's --license", default=None
+    )
+    submit.add_argument(
+        "--license-url", help='Font License URL ("" by default)', default=None
+    )
+    submit.add_argument(
+        "--sheet-version",
+        help="Sheet version (worked out from the sheet by default)",
+        default=None,
+    )
+    submit.add_argument("--config", help="Use custom configuration file", default=None)
+    submit.add_argument(
+        "--specimen",
+        help="Also render specimen PNGs of the font at these sizes, like handwrite's --specimen",
+        default=None,
+    )
+    submit.add_argument(
+        "--specimen-width",
+        help="Wrap the specimens' text to this many pixels (as wide as the lines by default)",
+        type=int,
+        default=None,
+    )
+    submit.add_argument(
+        "--deterministic",
+        help="Reproducible output, like handwrite --deterministic",
+        action="store_true",
+    )
+    submit.add_argument(
+        "--no-copy",
+        help="Don't copy the sheets into the queue: they're at the same path on every host",
+        action="store_true",
+    )
+
+    work = commands.add_parser("work", help="Take jobs from the queue and build them")
+    work.add_argument("queue", help="The queue directory")
+    work.add_argument("--name", help="Unique name of this worker", default=None)
+    work.add_argument(
+        "--exit-when-empty",
+        help="Stop once no job is pending or running, instead of waiting for more",
+        action="store_true",
+    )
+    work.add_argument(
+        "--lease-timeout",
+        help="Seconds without a heartbeat before a job is given to another worker, if this makes the queue (60 by default)",
+        type=float,
+        default=60,
+    )
+    work.add_argument(
+        "--heartbeat",
+        help="Seconds between heartbeats (10 by default)",
+        type=float,
+        default=10,
+    )
+    work.add_argument(
+        "--max-attempts",
+        help="Give up on a job after its worker crashed this many times (3 by default)",
+        type=int,
+        default=3,
+    )
+    work.add_argument(
+        "--poll",
+        help="Seconds between looks at an empty queue (2 by default)",
+        type=float,
+        default=2,
+    )
+    add_limit_arguments(work)
+
+    status = commands.add_parser("status", help="Show what's in the queue, as JSON")
+    status.add_argument("queue", help="The queue directory")
+
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        metadata = {
+            "filename": args.filename,
+            "family": args.family,
+            "designer": args.designer,
+            "license": args.license,
+            "licenseurl": args.license_url,
+            "sheetversion": args.sheet_version,
+        }
+        if args.specimen:
+            from handwrite.specimen import parse_sizes
+
+            try:
+                metadata["specimen"] = parse_sizes(args.specimen)
+            except ValueError as e:
+                parser.error("--specimen: %s" % e)
+            if args.specimen_width:
+                metadata["specimenwidth"] = args.specimen_width
+        sheet = args.input_path[0] if len(args.input_path) == 1 else args.input_path
+        try:
+            job_id = WorkQueue(args.queue).submit(
+                sheet,
+                metadata,
+                args.config,
+                args.deterministic,
+                args.id,
+                not args.no_copy,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(job_id)
+    elif args.command == "work":
+        if args.heartbeat <= 0 or args.heartbeat >= args.lease_timeout:
+            parser.error("--heartbeat must be positive, and less than --lease-timeout")
+
+        def report(event):
+            if event.kind == "job":
+                line = "%s %s" % (event.job, event.state)
+                if event.details.get("error"):
+                    line += ": " + event.error.splitlines()[0]
+                print(line, flush=True)
+
+        try:
+            worker = Worker(
+                WorkQueue(args.queue, args.lease_timeout),
+                args.name,
+                args.heartbeat,
+                args.max_attempts,
+                limits=limits_from_arguments(args),
+                progress=report,
+            )
+        except ValueError as e:
+            # the queue was made with a shorter lease timeout
+            parser.error("--heartbeat: %s" % e)
+        worker.run(args.exit_when_empty, args.poll)
+    else:
+        print(json.dumps(WorkQueue(args.queue).status(), indent=2))
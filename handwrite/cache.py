@@ -0,0 +1,139 @@
+import os
+import time
+import shutil
+import tempfile
+
+from handwrite.checkpoint import hash_file, hash_json, hash_sheets
+
+# Staging directories (".tmp-*") older than this many seconds were left by a
+# build that crashed while storing its entry
+STALE_STAGING = 3600
+
+
+def build_key(sheet, config, metadata):
+    """Hash everything that determines a build's output.
+
+    Parameters
+    ----------
+    sheet : str or list of str
+        Path to the sheet file, or to each page of a sheet set.
+    config : str
+        Path to config file.
+    metadata : dict
+        Dictionary containing the metadata (filename, family, sheetversion...)
+    """
+    from handwrite import __version__
+
+    return hash_json(
+        {
+            "sheet": hash_sheets(sheet),
+            "config": hash_file(config),
+            "metadata": metadata or {},
+            "handwrite": __version__,
+        }
+    )
+
+
+class BuildCache:
+    """Cache of finished builds (TTF and HTML), keyed by build_key.
+
+    Each entry is a directory named after its key, holding copies of the
+    files the build wrote to its output directory. Entries are used
+    least-recently-first evicted once the cache grows past `max_bytes`.
+
+    Only deterministic builds (see `--deterministic`) come out byte for byte
+    the same as a rebuild, but any build can be cached.
+
+    Parameters
+    ----------
+    directory : str
+        Path to the cache directory. Created if it doesn't exist.
+    max_bytes : int, default=512 MiB
+        Size limit of the whole cache.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, output_directory):
+        """Copy a cached build to `output_directory`.
+
+        Returns
+        -------
+        list of str or None
+            Paths of the copied files, or None on a cache miss.
+        """
+        entry = os.path.join(self.directory, key)
+        if not os.path.isdir(entry):
+            return None
+        os.makedirs(output_directory, exist_ok=True)
+        outputs = []
+        for name in sorted(os.listdir(entry)):
+            outputs.append(shutil.copy(os.path.join(entry, name), output_directory))
+        # mark as recently used
+        os.utime(entry)
+        return outputs
+
+    def put(self, key, paths):
+        """Store the output files of a build, then evict old entries if needed."""
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            return
+        # copy next to the final location, then rename, so that concurrent
+        # builds never see a half-written entry
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            for path in paths:
+                shutil.copy(path, staging)
+            os.rename(staging, entry)
+        except OSError:
+            # another build of the same inputs got there first
+            shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def size(self, entry):
+        path = os.path.join(self.directory, entry)
+        return sum(
+            os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+        )
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes.
+
+        Staging directories left by crashed builds are removed first. The
+        ones still being written count against max_bytes too.
+        """
+        now = time.time()
+        total = 0
+        entries = []
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            try:
+                if not os.path.isdir(path):
+                    continue
+                if not entry.startswith("."):
+                    entries.append(entry)
+                elif not entry.startswith(".tmp-"):
+                    continue
+                elif now - os.path.getmtime(path) > STALE_STAGING:
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    total += self.size(entry)
+            except FileNotFoundError:
+                # renamed into place (or removed) meanwhile
+                continue
+        entries.sort(
+            key=lambda entry: os.path.getmtime(os.path.join(self.directory, entry))
+        )
+        sizes = {entry: self.size(entry) for entry in entries}
+        total += sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+            total -= sizes[entry]
@@ -0,0 +1,219 @@
+"""Get cells ready for tracing on several cores at once.
+
+Cutting a cell out of the sheet, trimming it, resizing it to the tracing
+size and working out its ink levels is all numpy and Pillow, and holds the
+GIL, so threads don't help. CellPool does it in worker processes instead.
+The decoded sheet goes in shared memory once, rather than being pickled
+for every worker: workers cut their cells straight out of it (through the
+rectangle each cell covers) and write the ink levels to a shared output
+array that's allocated beforehand, one slot per cell.
+
+The worker processes are started the first time a CellPool needs them, and
+kept for all the sheets it prepares after that, until it's closed. Shared
+memory is new in Python 3.8; on 3.7, cells are prepared in this process.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from handwrite.pngtosvg import PNGtoSVG, ink_levels
+from handwrite.sheettopng import TRIMMED_GLYPHS, SHEETtoPNG
+
+
+def has_shared_memory():
+    """Whether this Python has multiprocessing.shared_memory (new in 3.8)."""
+    try:
+        from multiprocessing import shared_memory  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class SharedArray:
+    """A numpy array in shared memory, that other processes can attach to.
+
+    Parameters
+    ----------
+    shape : tuple of int
+    dtype : numpy.dtype
+    name : str, optional
+        Attach to this block (created by another SharedArray), instead of
+        creating a new one.
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        # new in Python 3.8
+        from multiprocessing import shared_memory
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.owner = name is None
+        # workers are children of the creator, and share its resource
+        # tracker, so only the creator has to unlink
+        self.memory = shared_memory.SharedMemory(
+            name=name, create=self.owner, size=size
+        )
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)
+
+    @classmethod
+    def copy_of(cls, array):
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    def spec(self):
+        """What another process needs to attach: (name, shape, dtype)."""
+        return self.memory.name, self.shape, self.dtype.str
+
+    def close(self):
+        del self.array
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cell_rects(characters):
+    """Where each cell cut by detect_characters is on its sheet.
+
+    The cells are numpy views of the sheet, so that's read from their
+    offset in the sheet's buffer.
+
+    Returns
+    -------
+    sheet : numpy.ndarray
+        The sheet the cells were cut from.
+    rects : numpy.ndarray
+        int array (cells, 4): top, left, height and width of each cell.
+    """
+    sheet = characters[0][0]
+    while isinstance(sheet.base, np.ndarray):
+        sheet = sheet.base
+    rects = np.zeros((len(characters), 4), int)
+    for i, (roi, *_) in enumerate(characters):
+        offset = (
+            roi.__array_interface__["data"][0] - sheet.__array_interface__["data"][0]
+        )
+        top, rest = divmod(offset, sheet.strides[0])
+        rects[i] = top, rest // sheet.strides[1], roi.shape[0], roi.shape[1]
+    return sheet, rects
+
+
+def cell_levels(cell, name, metadata):
+    """Trim a BGR cell if its glyph needs it, resize it and return its ink levels."""
+    if name in TRIMMED_GLYPHS:
+        sides, resize = TRIMMED_GLYPHS[name]
+        cell = SHEETtoPNG().trim(cell, sides, metadata, resize)
+    rgba = Image.fromarray(cv2.cvtColor(cell, cv2.COLOR_BGR2RGBA))
+    return ink_levels(np.asarray(PNGtoSVG().resize(rgba, metadata)))
+
+
+def prepare(sheet_spec, levels_spec, tasks, metadata):
+    """Fill the output slots of a chunk of cells, in a worker."""
+    # the workers outlive the sheet, so they attach to it for each chunk
+    with SharedArray(*sheet_spec[1:], name=sheet_spec[0]) as shared_sheet, SharedArray(
+        *levels_spec[1:], name=levels_spec[0]
+    ) as shared_levels:
+        sheet = shared_sheet.array
+        levels = shared_levels.array
+        for index, (top, left, height, width), name in tasks:
+            levels[index] = cell_levels(
+                sheet[top : top + height, left : left + width], name, metadata
+            )
+
+
+class CellPool:
+    """Worker processes that get the cells of a sheet ready for tracing.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes. Defaults to the number of CPUs. With 1 (or
+        without shared memory), cells are prepared in this process.
+    chunks_per_worker : int, default=4
+        Cells are handed out in this many chunks per worker, so a worker
+        that gets the slow cells doesn't hold up the others.
+
+    The processes are started on first use, and stopped by close() (or at
+    the end of a with block).
+    """
+
+    def __init__(self, workers=None, chunks_per_worker=4):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def pool(self):
+        """The worker processes, started the first time they're needed."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers)
+            return self.executor
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def levels(self, characters, names, metadata):
+        """Ink levels of the named cells, at the tracing size.
+
+        Parameters
+        ----------
+        characters : list of list
+            Cells as returned by SHEETtoPNG.detect_characters.
+        names : dict
+            Cell number to glyph name (see sheettopng.page_cells). Cells
+            without a name are skipped.
+        metadata : dict
+            Dictionary containing the metadata (sheetversion, ...)
+
+        Returns
+        -------
+        cells : list of int
+            The cell numbers that were prepared, in order.
+        levels : numpy.ndarray
+            uint8 array (cells, height, width), like sweep.sheet_levels.
+        """
+        metadata = metadata or {}
+        cells = [cell for cell in range(len(characters)) if cell in names]
+        width, height = PNGtoSVG().trace_size(metadata)
+        if self.workers == 1 or len(cells) < 2 or not has_shared_memory():
+            levels = np.zeros((len(cells), height, width), np.uint8)
+            for i, cell in enumerate(cells):
+                levels[i] = cell_levels(characters[cell][0], names[cell], metadata)
+            return cells, levels
+
+        sheet, rects = cell_rects(characters)
+        tasks = [(i, tuple(rects[cell]), names[cell]) for i, cell in enumerate(cells)]
+        count = min(self.workers * self.chunks_per_worker, len(tasks))
+        chunks = [tasks[i::count] for i in range(count)]
+        pool = self.pool()
+        with SharedArray.copy_of(sheet) as shared_sheet, SharedArray(
+            (len(cells), height, width), np.uint8
+        ) as shared_levels:
+            specs = shared_sheet.spec(), shared_levels.spec()
+            for future in [
+                pool.submit(prepare, *specs, chunk, metadata) for chunk in chunks
+            ]:
+                future.result()
+            return cells, shared_levels.array.copy()
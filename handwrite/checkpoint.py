@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+
+
+def hash_file(path):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_sheets(sheet):
+    """Hash a sheet, or each page of a sheet set (a list of paths)."""
+    if isinstance(sheet, str):
+        return hash_file(sheet)
+    return [hash_file(path) for path in sheet]
+
+
+def hash_output(path):
+    """Hash an output file, or a member of a glyph store ("glyphs.zip#member")."""
+    if "#" in path and not os.path.isfile(path):
+        from handwrite.glyphstore import read_member
+
+        try:
+            return hashlib.sha256(read_member(path)).hexdigest()
+        except (OSError, KeyError):
+            return None
+    if not os.path.isfile(path):
+        return None
+    return hash_file(path)
+
+
+def hash_json(obj):
+    """Return the sha256 hex digest of a JSON-serializable object.
+
+    Keys are sorted, so two dicts with the same items always hash the same.
+    """
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class Checkpoint:
+    """Manifest of one pipeline stage's inputs and outputs.
+
+    Each stage writes ``<directory>/.<stage>.manifest.json`` after it runs.
+    On a rerun in the same directory, the stage can be skipped (like make)
+    when its inputs hash the same and every recorded output is still on disk
+    with the same contents.
+
+    Parameters
+    ----------
+    directory : str
+        Working directory of the build (``--debug-directory``).
+    stage : str
+        Stage name, e.g. "sheettopng".
+    inputs : dict
+        JSON-serializable description of everything the stage depends on:
+        file hashes, metadata, upstream output digests, ...
+    """
+
+    def __init__(self, directory, stage, inputs):
+        self.directory = directory
+        self.stage = stage
+        self.inputs = inputs
+        self.path = os.path.join(directory, "." + stage + ".manifest.json")
+        self.outputs = {}
+
+    def load(self):
+        """Return the manifest recorded by a previous run, or None."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def recorded(self):
+        """Paths of the outputs the previous run recorded, current or not."""
+        manifest = self.load() or {}
+        return [
+            os.path.normpath(os.path.join(self.directory, relpath))
+            for relpath in manifest.get("outputs", {})
+        ]
+
+    def is_current(self):
+        """Check whether the previous run of this stage can be reused.
+
+        If it can, ``self.outputs`` is filled in from the old manifest.
+        """
+        manifest = self.load()
+        if manifest is None or manifest.get("inputs") != hash_json(self.inputs):
+            return False
+        outputs = manifest.get("outputs", {})
+        for relpath, digest in outputs.items():
+            if hash_output(os.path.join(self.directory, relpath)) != digest:
+                return False
+        self.outputs = outputs
+        return True
+
+    def record(self, paths):
+        """Hash the stage's output files and write the manifest.
+
+        Parameters
+        ----------
+        paths : iterable of str
+            Output files of the stage, or members of a glyph store
+            ("glyphs.zip#member"). Missing files are ignored, since blank
+            cells don't always produce every file.
+        """
+        self.outputs = {}
+        for path in paths:
+            digest = hash_output(path)
+            if digest is not None:
+                self.outputs[os.path.relpath(path, self.directory)] = digest
+        manifest = {
+            "stage": self.stage,
+            "inputs": hash_json(self.inputs),
+            "outputs": self.outputs,
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def invalidate(self):
+        """Forget the previous run, so the stage runs again."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def digest(self):
+        """Digest of the outputs, used as an input of the next stage."""
+        return hash_json(self.outputs)
@@ -1,25 +1,220 @@
 import os
 import shutil
+import json
 import argparse
 import tempfile
 
-from handwrite import SHEETtoPNG
-from handwrite import PNGtoSVG
-from handwrite import SVGtoTTF
+from handwrite.cache import BuildCache, build_key
+from handwrite.checkpoint import Checkpoint, hash_file, hash_sheets
+from handwrite.glyphstore import open_store
+from handwrite.limits import (
+    Limits,
+    ToolError,
+    add_limit_arguments,
+    limits_from_arguments,
+)
+from handwrite.preflight import PreflightError, sheet_list, with_sheet_version
+from handwrite.progress import TerminalProgress, as_progress
 
+STAGES = ["sheettopng", "pngtosvg", "fontforge", "ligatures"]
 
-def run(sheet, output_directory, characters_dir, config, metadata):
-    SHEETtoPNG().convert(sheet, characters_dir, config, metadata)
-    PNGtoSVG().convert(metadata, directory=characters_dir)
-    SVGtoTTF().convert(characters_dir, output_directory, config, metadata)
 
+def glyph_files(characters_dir, config, metadata, suffixes):
+    """List the per-glyph files (name/name.suffix) named in the config, in the glyph store."""
+    with open(config) as f:
+        glyphs = json.load(f).get("glyphs-fancy", [])
+    with open_store(characters_dir, metadata) as store:
+        return store.outputs(
+            [glyph["name"] for glyph in glyphs if "name" in glyph], suffixes
+        )
 
-def converters(sheet, output_directory, directory=None, config=None, metadata=None):
-    if not directory:
-        directory = tempfile.mkdtemp()
-        isTempdir = True
-    else:
-        isTempdir = False
+
+def run(
+    sheet,
+    output_directory,
+    characters_dir,
+    config,
+    metadata,
+    force=(),
+    layout_cache=None,
+    fontforge_workers=1,
+    progress=None,
+    features=None,
+    web_page=True,
+    limits=None,
+):
+    """Run every stage, skipping the ones whose checkpoint is still current.
+
+    Each stage records a manifest of its inputs and outputs in
+    `characters_dir`, so rerunning with the same --debug-directory only
+    redoes the stages affected by a change. Stages named in `force` (or
+    "all") always run.
+
+    `progress` (a callback, see handwrite.progress) gets the stages'
+    events, and a "skip" event for each stage that's up to date.
+    `features` and `web_page` are passed on to SVGtoTTF.add_ligatures.
+    `limits` (a handwrite.limits.Limits) bounds the potrace and FontForge
+    runs.
+
+    Returns the paths of the files the build wrote to `output_directory`:
+    the font first, then its web page and specimens. When the ligatures
+    stage was up to date, those its last run wrote.
+    """
+    metadata = metadata or {}
+    progress = as_progress(progress)
+    limits = limits or Limits()
+    force = set(STAGES) if "all" in force else set(force)
+    config_hash = hash_file(config)
+    sheet_version = metadata.get("sheetversion")
+    filename = metadata.get("filename")
+    if not filename:
+        with open(config) as f:
+            filename = json.load(f)["props"].get("filename")
+
+    written = []
+    # a rerun replaces these, rather than writing "MyFont (1).ttf" next to them
+    replace = Checkpoint(characters_dir, "ligatures", None).recorded()
+
+    def stage(name, inputs, action):
+        checkpoint = Checkpoint(characters_dir, name, inputs)
+        if name not in force and checkpoint.is_current():
+            progress.emit("skip", name)
+        else:
+            checkpoint.invalidate()
+            checkpoint.record(action())
+        return checkpoint.digest()
+
+    def sheettopng():
+        from handwrite.sheettopng import SHEETtoPNG
+
+        SHEETtoPNG(layout_cache, progress).convert(
+            sheet, characters_dir, config, metadata
+        )
+        return glyph_files(characters_dir, config, metadata, [".png"])
+
+    def pngtosvg():
+        from handwrite.pngtosvg import PNGtoSVG
+
+        PNGtoSVG(progress, limits).convert(metadata, directory=characters_dir)
+        return glyph_files(characters_dir, config, metadata, [".bmp", ".svg"])
+
+    def fontforge():
+        from handwrite.svgtottf import SVGtoTTF, font_extension
+
+        converter = SVGtoTTF(progress, limits)
+        converter.place_glyphs(characters_dir, config, metadata)
+        converter.run_fontforge(characters_dir, config, metadata, fontforge_workers)
+        return [
+            os.path.join(
+                characters_dir,
+                filename + " without ligatures" + font_extension(metadata),
+            ),
+            os.path.join(characters_dir, filename + " without ligatures.sfd"),
+        ]
+
+    def ligatures():
+        from handwrite.svgtottf import SVGtoTTF
+
+        converter = SVGtoTTF(progress)
+        converter.add_ligatures(
+            characters_dir,
+            output_directory,
+            config,
+            metadata,
+            features,
+            web_page,
+            replace,
+        )
+        # the font, its web page and specimens
+        written.extend(converter.outputs)
+        return converter.outputs
+
+    digest = stage(
+        "sheettopng",
+        {
+            "sheet": hash_sheets(sheet),
+            "config": config_hash,
+            "sheetversion": sheet_version,
+        },
+        sheettopng,
+    )
+    digest = stage(
+        "pngtosvg",
+        {
+            "cells": digest,
+            "sheetversion": sheet_version,
+            "threshold": metadata.get("threshold"),
+        },
+        pngtosvg,
+    )
+    digest = stage(
+        "fontforge",
+        # specimens are drawn after the font's done, changing them doesn't redo it
+        {
+            "svgs": digest,
+            "config": config_hash,
+            "metadata": {
+                key: value
+                for key, value in metadata.items()
+                if key not in ("specimen", "specimenwidth")
+            },
+        },
+        fontforge,
+    )
+    stage(
+        "ligatures",
+        {
+            "font": digest,
+            "config": config_hash,
+            "metadata": metadata,
+            "output_directory": os.path.abspath(output_directory),
+        },
+        ligatures,
+    )
+    if written:
+        return written
+    from handwrite.svgtottf import font_extension
+
+    extension = font_extension(metadata)
+    return sorted(
+        Checkpoint(characters_dir, "ligatures", None).recorded(),
+        key=lambda path: not path.endswith(extension),
+    )
+
+
+def font_name(config, metadata):
+    """File name add_ligatures gives the font, unless that's taken."""
+    from handwrite.svgtottf import font_extension
+
+    filename = metadata.get("filename")
+    if not filename:
+        with open(config) as f:
+            filename = json.load(f)["props"].get("filename")
+    extension = font_extension(metadata)
+    return filename if filename.endswith(extension) else filename + extension
+
+
+def converters(
+    sheet,
+    output_directory,
+    directory=None,
+    config=None,
+    metadata=None,
+    force=(),
+    stream=False,
+    deterministic=False,
+    cache_dir=None,
+    cache_size=512 * 1024 * 1024,
+    check=True,
+    layout_cache=None,
+    fontforge_workers=1,
+    progress=None,
+    cell_workers=None,
+    limits=None,
+):
+    progress = as_progress(progress)
+    # the deadline counts from here
+    limits = (limits or Limits()).start()
 
     if config is None:
         config = os.path.join(
@@ -28,18 +223,94 @@ def converters(sheet, output_directory, directory=None, config=None, metadata=No
     if os.path.isdir(config):
         raise IsADirectoryError("Config parameter should not be a directory.")
 
-    if os.path.isdir(sheet):
-        raise IsADirectoryError("Sheet parameter should not be a directory.")
+    for path in sheet_list(sheet):
+        if os.path.isdir(path):
+            raise IsADirectoryError("Sheet parameter should not be a directory.")
+    from handwrite.sheettopng import page_count
+
+    with open(config) as f:
+        pages = page_count(json.load(f).get("glyphs-fancy", []))
+    if pages > len(sheet_list(sheet)):
+        raise ValueError(
+            "The config has glyphs on %d pages, but only %d sheets were given"
+            % (pages, len(sheet_list(sheet)))
+        )
+
+    # without a sheet version, it's worked out from the sheet's row boxes
+    metadata = with_sheet_version(sheet, config, metadata)
+    if deterministic:
+        metadata["deterministic"] = True
+        metadata["buildid"] = build_key(sheet, config, metadata)
+    if cache_dir:
+        cache = BuildCache(cache_dir, cache_size)
+        key = build_key(sheet, config, metadata)
+        if cache.get(key, output_directory) is not None:
+            progress.emit("cached", key=key)
+            return
+        os.makedirs(output_directory, exist_ok=True)
+
+    if check:
+        from handwrite.preflight import preflight
+
+        preflight(sheet, config, metadata)
+
+    if layout_cache:
+        from handwrite.layout import LayoutCache
+
+        layout_cache = LayoutCache(layout_cache)
+
+    if not directory:
+        directory = tempfile.mkdtemp()
+        isTempdir = True
     else:
-        run(sheet, output_directory, directory, config, metadata)
+        isTempdir = False
+    try:
+        if stream:
+            from handwrite.pipeline import StreamingPipeline
+
+            pipeline = StreamingPipeline(
+                layout_cache=layout_cache,
+                progress=progress,
+                cell_workers=cell_workers,
+                limits=limits,
+            )
+            pipeline.convert(sheet, output_directory, directory, config, metadata)
+            outputs = pipeline.outputs
+        else:
+            outputs = run(
+                sheet,
+                output_directory,
+                directory,
+                config,
+                metadata,
+                force,
+                layout_cache,
+                fontforge_workers,
+                progress,
+                limits=limits,
+            )
+    finally:
+        # failed or interrupted builds too
+        if isTempdir:
+            shutil.rmtree(directory, ignore_errors=True)
 
-    if isTempdir:
-        shutil.rmtree(directory)
+    # only what this build wrote, and not a font it had to save as
+    # "MyFont (1).ttf" next to another one
+    if (
+        cache_dir
+        and outputs
+        and os.path.basename(outputs[0]) == font_name(config, metadata)
+    ):
+        cache.put(key, outputs)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("input_path", help="Path to sample sheet")
+    parser.add_argument(
+        "input_path",
+        help="Path to sample sheet (or one per page, in order, for configs with glyphs on several pages)",
+        nargs="+",
+    )
     parser.add_argument("output_directory", help="Directory Path to save font output")
     parser.add_argument(
         "--debug-directory",
@@ -51,8 +322,91 @@ def main():
     parser.add_argument("--designer", help="Font Designer name (\"me\" by default)", default=None)
     parser.add_argument("--license", help="Font License. (`--license ofl` and `--license cc0` will populate License and LicenseURL appropriately. \"All rights reserved\" by default.)", default=None)
     parser.add_argument("--license-url", help="Font License URL (\"\" by default)", default=None)
-    # TODO: add --sheet-version argument
-    parser.add_argument("--sheet-version", help="Sheet version", default=None)
+    parser.add_argument(
+        "--sheet-version",
+        help="Sheet version (worked out from the shape of the sheet's row boxes by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--force",
+        help="Rerun a stage even if its checkpoint in --debug-directory is up to date (repeatable)",
+        choices=STAGES + ["all"],
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--deterministic",
+        help="Reproducible output: UniqueID from a hash of the inputs, timestamps from SOURCE_DATE_EPOCH (0 by default)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Reuse the TTF and HTML of an earlier build with the same sheet, config and metadata from this directory",
+        default=None,
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="Size limit of --cache-dir in MiB (512 by default)",
+        type=int,
+        default=512,
+    )
+    parser.add_argument(
+        "--glyph-store",
+        help='Keep each glyph\'s PNG, BMP and SVG in their own directory ("directory", default) or all in one glyphs.zip ("zip"). Unpack glyphs.zip with handwrite-export-glyphs',
+        choices=["directory", "zip"],
+        default=None,
+    )
+    parser.add_argument(
+        "--stream",
+        help="Trace and import glyphs while the sheet is still being cut, instead of one stage at a time (ignores checkpoints)",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--layout-cache",
+        help="Remember where the rows are on sheets of each size in this directory, and reuse that for sheets that line up",
+        default=None,
+    )
+    parser.add_argument(
+        "--fontforge-workers",
+        help="Import glyphs in this many FontForge processes at once (1 by default, ignored with --stream)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--cell-workers",
+        help="With --stream, resize and threshold the cells in this many processes before tracing them",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--threshold",
+        help='Pixels darker than this are ink when tracing: a number (200 by default) or "otsu" to pick one per glyph. Try some with handwrite-sweep',
+        default=None,
+    )
+    parser.add_argument(
+        "--format",
+        help='Outlines of the font: TrueType ("ttf", default), or CFF ("otf") or CFF2 ("cff2") OpenType, which keep potrace\'s cubic curves',
+        choices=["ttf", "otf", "cff2"],
+        default=None,
+    )
+    parser.add_argument(
+        "--specimen",
+        help="Also render specimen PNGs of the font at these sizes, in pixels per em, comma separated (like 48,96). Needs uharfbuzz",
+        default=None,
+    )
+    parser.add_argument(
+        "--specimen-width",
+        help="Wrap the specimens' text to this many pixels (as wide as the lines by default)",
+        type=int,
+        default=None,
+    )
+    add_limit_arguments(parser)
+    parser.add_argument(
+        "--skip-preflight",
+        help="Don't check the sheet and the tools before converting",
+        action="store_true",
+    )
 
     args = parser.parse_args()
     metadata = {
@@ -63,6 +417,56 @@ def main():
         "licenseurl": args.license_url, 
         "sheetversion": args.sheet_version
     }
-    converters(
-        args.input_path, args.output_directory, args.debug_directory, None, metadata
-    ) 
+    if args.glyph_store:
+        metadata["glyphstore"] = args.glyph_store
+    if args.format:
+        metadata["format"] = args.format
+    if args.threshold:
+        if args.threshold != "otsu" and not args.threshold.isdigit():
+            parser.error('--threshold must be a number or "otsu"')
+        metadata["threshold"] = args.threshold
+    if args.specimen:
+        from handwrite.specimen import parse_sizes
+
+        try:
+            metadata["specimen"] = parse_sizes(args.specimen)
+        except ValueError as e:
+            parser.error("--specimen: %s" % e)
+        if args.specimen_width:
+            metadata["specimenwidth"] = args.specimen_width
+    # a single sheet stays a path, so its builds hash the same as before
+    sheet = args.input_path[0] if len(args.input_path) == 1 else args.input_path
+    try:
+        converters(
+            sheet,
+            args.output_directory,
+            args.debug_directory,
+            None,
+            metadata,
+            args.force,
+            args.stream,
+            args.deterministic,
+            args.cache_dir,
+            args.cache_size * 1024 * 1024,
+            not args.skip_preflight,
+            args.layout_cache,
+            args.fontforge_workers,
+            TerminalProgress(),
+            args.cell_workers,
+            limits_from_arguments(args),
+        )
+    except PreflightError as e:
+        parser.exit(
+            2,
+            "%s: can't convert %s\n%s\n"
+            % (
+                parser.prog,
+                ", ".join(args.input_path),
+                "\n".join("  - " + problem.message for problem in e.problems),
+            ),
+        )
+    except ToolError as e:
+        parser.exit(
+            1,
+            "%s: can't convert %s: %s\n" % (parser.prog, ", ".join(args.input_path), e),
+        )
@@ -0,0 +1,330 @@
+"""Build every style of a font family (Regular, Bold, ...) in one run.
+
+Each style has its own sheet (or sheets, one per page), drawn by the same
+designer on the same template. They're built side by side, sharing what
+doesn't depend on the drawings: the row layout of the sheets, and the
+compiled ligature features. One web page shows all of them.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from handwrite.cache import build_key
+from handwrite.preflight import PreflightError, sheet_list, with_sheet_version
+from handwrite.progress import Progress, as_progress
+
+
+def parse_member(spec):
+    """Read a "STYLE=SHEET[,SHEET...]" command line argument.
+
+    Returns
+    -------
+    (str, str or list of str)
+        The style, and the sheet (or a list of its pages).
+    """
+    style, sep, sheets = spec.partition("=")
+    if not sep or not style or not sheets:
+        raise ValueError("Expected STYLE=SHEET, not %r" % spec)
+    pages = sheets.split(",")
+    return style, pages[0] if len(pages) == 1 else pages
+
+
+def member_progress(progress, style):
+    """A Progress for one style, that adds the style to every event."""
+    if progress.callback is None:
+        return Progress()
+
+    def callback(event):
+        event.details["style"] = style
+        progress.callback(event)
+
+    return Progress(callback)
+
+
+def build_family(
+    members,
+    output_directory,
+    directory=None,
+    config=None,
+    metadata=None,
+    workers=None,
+    deterministic=False,
+    check=True,
+    progress=None,
+    limits=None,
+):
+    """Build a font for each style of a family, and a web page with all of them.
+
+    Parameters
+    ----------
+    members : list of (str, str or list of str)
+        Style name and sheet (or list of pages) of each style, in the
+        order they go on the web page.
+    output_directory : str
+        Where to write the fonts and the web page.
+    directory : str, optional
+        Debug directory. Each style gets its own subdirectory, with
+        checkpoints, like `handwrite --debug-directory`. Temp by default.
+    config : str, optional
+        Path to config file, shared by every style.
+    metadata : dict, optional
+        Metadata of the family. "family" (or "filename") names the family.
+        Each font is named by the family and its style, and saved as
+        "<family>-<style>" (without spaces).
+    workers : int, optional
+        Number of styles built at once (all of them by default).
+    deterministic : bool, default=False
+        Reproducible output, like `handwrite --deterministic`.
+    check : bool, default=True
+        Check every sheet and the tools before converting anything.
+    progress : callable or handwrite.progress.Progress, optional
+        Gets the events of every style, with a "style" detail.
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of potrace and FontForge. The
+        deadline is for the whole family.
+
+    With a "specimen" list of sizes in `metadata`, the specimen PNGs of
+    every style are rendered once all the fonts are built, together in
+    worker processes (see handwrite.specimen.render_specimens).
+
+    Returns
+    -------
+    (list of str, str)
+        Paths to the fonts, in the order of `members`, and to the web page.
+    """
+    from handwrite.cli import run
+    from handwrite.layout import LayoutCache
+    from handwrite.limits import Limits
+    from handwrite.sheettopng import page_count
+    from handwrite.svgtottf import CompiledFeatures, SVGtoTTF
+
+    if not members:
+        raise ValueError("A family needs at least one style")
+    styles = [style for style, sheet in members]
+    if len(set(styles)) != len(styles):
+        raise ValueError("Each style of a family needs its own name")
+    progress = as_progress(progress)
+    limits = (limits or Limits()).start()
+    if config is None:
+        config = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "default.json"
+        )
+    # for the checks and the family page (each style's build reads the file)
+    with open(config) as f:
+        config_data = json.load(f)
+    pages = page_count(config_data.get("glyphs-fancy", []))
+    for style, sheet in members:
+        if pages > len(sheet_list(sheet)):
+            raise ValueError(
+                "The config has glyphs on %d pages, but %s only has %d sheets"
+                % (pages, style, len(sheet_list(sheet)))
+            )
+
+    metadata = dict(metadata or {})
+    specimen = metadata.pop("specimen", None)
+    specimen_width = metadata.pop("specimenwidth", None)
+    family = (
+        metadata.get("family")
+        or metadata.get("filename")
+        or config_data["props"].get("filename", "MyFont")
+    )
+    # each style's sheet version, worked out from its sheet if there's none
+    style_metadata = {
+        style: with_sheet_version(sheet, config_data, metadata)
+        for style, sheet in members
+    }
+    if check:
+        from handwrite.preflight import check_tools, preflight
+
+        problems = []
+        for style, sheet in members:
+            try:
+                preflight(sheet_list(sheet), config, style_metadata[style], tools=False)
+            except PreflightError as e:
+                for problem in e.problems:
+                    problem.message = "%s: %s" % (style, problem.message)
+                problems += e.problems
+        problems += check_tools(dict(metadata, specimen=specimen))
+        if problems:
+            raise PreflightError(problems)
+
+    is_temp = not directory
+    directory = directory or tempfile.mkdtemp()
+    os.makedirs(output_directory, exist_ok=True)
+    # the sheets come from the same template (and usually the same scanner)
+    layout_cache = LayoutCache(os.path.join(directory, "layouts"))
+    features = CompiledFeatures()
+
+    def build(member):
+        style, sheet = member
+        member_metadata = dict(
+            style_metadata[style],
+            family=family,
+            style=style,
+            filename="%s-%s" % (family.replace(" ", ""), style.replace(" ", "")),
+        )
+        if deterministic:
+            member_metadata["deterministic"] = True
+            member_metadata["buildid"] = build_key(sheet, config, member_metadata)
+        characters_dir = os.path.join(directory, style.replace(os.sep, "_"))
+        os.makedirs(characters_dir, exist_ok=True)
+        # the font comes first, even when it was up to date
+        return run(
+            sheet,
+            output_directory,
+            characters_dir,
+            config,
+            member_metadata,
+            layout_cache=layout_cache,
+            progress=member_progress(progress, style),
+            features=features,
+            web_page=False,
+            limits=limits,
+        )[0]
+
+    try:
+        with ThreadPoolExecutor(workers or len(members)) as pool:
+            fonts = list(pool.map(build, members))
+    finally:
+        if is_temp:
+            shutil.rmtree(directory)
+
+    if specimen:
+        from handwrite.specimen import render_specimens
+
+        progress.emit("message", text="Rendering specimens...")
+        render_specimens(fonts, specimen, width=specimen_width, workers=workers)
+
+    converter = SVGtoTTF()
+    converter.config = config_data
+    converter.metadata = metadata
+    page = converter.generate_family_page(
+        output_directory,
+        family,
+        [(style, os.path.basename(font)) for style, font in zip(styles, fonts)],
+        *converter.credits()
+    )
+    return fonts, page
+
+
+def main():
+    import argparse
+    from handwrite.progress import TerminalProgress
+
+    parser = argparse.ArgumentParser(
+        description="Build a font for each style of a family, from one sheet per style"
+    )
+    parser.add_argument("output_directory", help="Directory Path to save the fonts in")
+    parser.add_argument(
+        "members",
+        nargs="+",
+        metavar="STYLE=SHEET",
+        help="Style name and sheet of each style (STYLE=PAGE1,PAGE2 for several pages)",
+    )
+    parser.add_argument(
+        "--family", help='Font Family name ("MyFont" by default)', default=None
+    )
+    parser.add_argument(
+        "--designer", help='Font Designer name ("me" by default)', default=None
+    )
+    parser.add_argument(
+        "--license", help="Font License, like handwrite's --license", default=None
+    )
+    parser.add_argument(
+        "--license-url", help='Font License URL ("" by default)', default=None
+    )
+    parser.add_argument(
+        "--sheet-version",
+        help="Sheet version (worked out from the sheet by default)",
+        default=None,
+    )
+    parser.add_argument("--config", help="Use custom configuration file", default=None)
+    parser.add_argument(
+        "--format",
+        help="Outlines of the fonts, like handwrite's --format",
+        choices=["ttf", "otf", "cff2"],
+        default=None,
+    )
+    parser.add_argument(
+        "--specimen",
+        help="Also render specimen PNGs of each font at these sizes, like handwrite's --specimen",
+        default=None,
+    )
+    parser.add_argument(
+        "--specimen-width",
+        help="Wrap the specimens' text to this many pixels (as wide as the lines by default)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--debug-directory",
+        help="Keep each style's in-progress files in a subdirectory of this path (Temp by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Build this many styles at once (all of them by default)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--deterministic",
+        help="Reproducible output, like handwrite --deterministic",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--skip-preflight",
+        help="Don't check the sheets and the tools before converting",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    try:
+        members = [parse_member(spec) for spec in args.members]
+    except ValueError as e:
+        parser.error(str(e))
+    metadata = {
+        "family": args.family,
+        "designer": args.designer,
+        "license": args.license,
+        "licenseurl": args.license_url,
+        "sheetversion": args.sheet_version,
+    }
+    if args.format:
+        metadata["format"] = args.format
+    if args.specimen:
+        from handwrite.specimen import parse_sizes
+
+        try:
+            metadata["specimen"] = parse_sizes(args.specimen)
+        except ValueError as e:
+            parser.error("--specimen: %s" % e)
+        if args.specimen_width:
+            metadata["specimenwidth"] = args.specimen_width
+    try:
+        fonts, page = build_family(
+            members,
+            args.output_directory,
+            args.debug_directory,
+            args.config,
+            metadata,
+            args.workers,
+            args.deterministic,
+            not args.skip_preflight,
+            TerminalProgress(),
+        )
+    except PreflightError as e:
+        parser.exit(
+            2,
+            "%s: can't convert\n%s\n"
+            % (
+                parser.prog,
+                "\n".join("  - " + problem.message for problem in e.problems),
+            ),
+        )
+    for font in fonts:
+        print(font)
+    print(page)
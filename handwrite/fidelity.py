@@ -0,0 +1,359 @@
+"""Measure how faithfully a built font reproduces its source cells.
+
+Each glyph of the font is filled on a raster of font units (a Canvas), and
+so is its cell's bitmap, placed the way the font builder placed it. The two
+masks are compared (IoU and Hausdorff distance), so a change to tracing or
+placement can be checked against the sheet it came from.
+"""
+
+import cv2
+import numpy as np
+from packaging.version import Version
+from fontTools.pens.basePen import BasePen
+
+from handwrite.glyphstore import open_store
+from handwrite.placement import default_centering, glyph_centering, placements
+
+
+class PolygonPen(BasePen):
+    """fontTools pen that flattens a glyph's outline into polygons.
+
+    Parameters
+    ----------
+    glyphSet : fontTools glyph set
+        Used to draw components.
+    steps : int, default=8
+        Number of line segments per curve segment.
+    """
+
+    def __init__(self, glyphSet=None, steps=8):
+        super().__init__(glyphSet)
+        self.steps = steps
+        self.contours = []
+        self.current = []
+
+    def _moveTo(self, pt):
+        self.current = [pt]
+
+    def _lineTo(self, pt):
+        self.current.append(pt)
+
+    def _curveToOne(self, pt1, pt2, pt3):
+        x0, y0 = self._getCurrentPoint()
+        for i in range(1, self.steps + 1):
+            t = i / self.steps
+            u = 1 - t
+            # Bernstein weights of the four control points
+            a, b, c, d = u * u * u, 3 * u * u * t, 3 * u * t * t, t * t * t
+            x = a * x0 + b * pt1[0] + c * pt2[0] + d * pt3[0]
+            y = a * y0 + b * pt1[1] + c * pt2[1] + d * pt3[1]
+            self.current.append((x, y))
+
+    def _qCurveToOne(self, pt1, pt2):
+        x0, y0 = self._getCurrentPoint()
+        for i in range(1, self.steps + 1):
+            t = i / self.steps
+            u = 1 - t
+            a, b, c = u * u, 2 * u * t, t * t
+            x = a * x0 + b * pt1[0] + c * pt2[0]
+            y = a * y0 + b * pt1[1] + c * pt2[1]
+            self.current.append((x, y))
+
+    def _closePath(self):
+        if len(self.current) > 2:
+            self.contours.append(self.current)
+        self.current = []
+
+    _endPath = _closePath
+
+
+class Canvas:
+    """A raster of font units, the common space glyphs are compared in.
+
+    Parameters
+    ----------
+    left, bottom, right, top : int
+        Area of the canvas, in font units. The default covers the advance
+        width of a glyph, with an extra em on the left for the zero-width
+        glyphs that get shifted there (cartouche middle, underscore).
+    size : int, default=64
+        Pixels per 1000 font units.
+    """
+
+    def __init__(self, left=-1000, bottom=-400, right=1200, top=1200, size=64):
+        self.left, self.bottom, self.right, self.top = left, bottom, right, top
+        self.scale = size / 1000
+        self.shape = (
+            int(round((top - bottom) * self.scale)),
+            int(round((right - left) * self.scale)),
+        )
+
+    def matrix(self, transform=(1, 0, 0, 1, 0, 0)):
+        """2x3 matrix from font units (after a psMat-style `transform`) to pixels."""
+        xx, xy, yx, yy, dx, dy = transform
+        s = self.scale
+        return np.array(
+            [
+                [s * xx, s * yx, s * (dx - self.left)],
+                [-s * xy, -s * yy, s * (self.top - dy)],
+            ]
+        )
+
+    def fill(self, contours, transform=(1, 0, 0, 1, 0, 0)):
+        """Rasterize polygons (even-odd rule) into a boolean mask."""
+        mask = np.zeros(self.shape, np.uint8)
+        matrix = self.matrix(transform)
+        for contour in contours:
+            points = np.asarray(contour, float)
+            pixels = points @ matrix[:, :2].T + matrix[:, 2]
+            # fillPoly puts integer coordinates on pixel centers
+            pixels = np.round((pixels - 0.5) * 16).astype(np.int32)
+            layer = np.zeros(self.shape, np.uint8)
+            cv2.fillPoly(layer, [pixels], 1, lineType=cv2.LINE_8, shift=4)
+            mask ^= layer
+        return mask.astype(bool)
+
+    def warp(self, image, matrix):
+        """Resample a boolean image onto the canvas.
+
+        `matrix` maps continuous image coordinates (pixel edges on integers)
+        to font units.
+        """
+        A = self.matrix()
+        full = np.vstack([A, [0, 0, 1]]) @ np.vstack([matrix, [0, 0, 1]])
+        # warpAffine also puts integer coordinates on pixel centers
+        full[:2, 2] += full[:2, :2] @ [0.5, 0.5] - 0.5
+        warped = cv2.warpAffine(
+            image.astype(np.float32),
+            full[:2],
+            (self.shape[1], self.shape[0]),
+            flags=cv2.INTER_LINEAR,
+        )
+        return warped > 0.5
+
+
+def compose(*transforms):
+    """Compose psMat-style 6-tuples, applied left to right."""
+    result = (1, 0, 0, 1, 0, 0)
+    for t in transforms:
+        a = result
+        result = (
+            a[0] * t[0] + a[1] * t[2],
+            a[0] * t[1] + a[1] * t[3],
+            a[2] * t[0] + a[3] * t[2],
+            a[2] * t[1] + a[3] * t[3],
+            a[4] * t[0] + a[5] * t[2] + t[4],
+            a[4] * t[1] + a[5] * t[3] + t[5],
+        )
+    return result
+
+
+def placement_transform(
+    cp, bbox, version_major, ascent=800, descent=200, centering=None
+):
+    """Where SVGtoTTF puts an imported glyph: its placement, and the shift
+    add_glyphs gives zero-width glyphs.
+
+    Parameters
+    ----------
+    cp : int
+        Codepoint of the glyph (0 if it has none).
+    bbox : tuple of float
+        (left, bottom, right, top) of the imported outline, in font units.
+    version_major : int
+        Major version of the sheet.
+    centering : str, optional
+        The glyph's centering (see handwrite.placement), by default from
+        its codepoint.
+
+    Returns
+    -------
+    tuple
+        psMat-style affine transform.
+    """
+    placement = placements(
+        [bbox], [centering or default_centering(cp)], version_major, ascent, descent
+    )[0]
+    return zero_width_shift(cp, tuple(placement))
+
+
+def zero_width_shift(cp, transform):
+    """Add the shift to the left that add_glyphs gives zero-width combining glyphs."""
+    if cp in (0xF1992, 0x5F):
+        return compose(transform, (1, 0, 0, 1, -1000, 0))
+    return tuple(transform)
+
+
+def source_mask(data):
+    """Read a thresholded cell (the BMP that potrace traced) as a boolean ink mask."""
+    import io
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data)).convert("RGBA")
+    return np.asarray(image)[:, :, 0] < 128
+
+
+def ink_bounds(mask, units_per_pixel, ascent):
+    """(left, bottom, right, top) of the ink in a mask, in imported font units."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return (0, 0, 0, 0)
+    return (
+        cols[0] * units_per_pixel,
+        ascent - (rows[-1] + 1) * units_per_pixel,
+        (cols[-1] + 1) * units_per_pixel,
+        ascent - rows[0] * units_per_pixel,
+    )
+
+
+def glyph_metrics(font_masks, source_masks, units_per_pixel):
+    """IoU and symmetric Hausdorff distance of every pair of masks at once.
+
+    Parameters
+    ----------
+    font_masks, source_masks : numpy.ndarray
+        Boolean arrays of shape (glyphs, height, width).
+    units_per_pixel : float
+        Size of a pixel in font units, to report distances in font units.
+
+    Returns
+    -------
+    iou : numpy.ndarray
+        1 for two empty masks, 0 if only one of them is empty.
+    hausdorff : numpy.ndarray
+        0 for two empty masks, inf if only one of them is empty.
+    """
+    intersection = (font_masks & source_masks).sum(axis=(1, 2))
+    union = (font_masks | source_masks).sum(axis=(1, 2))
+    iou = np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+
+    def distance_to(masks):
+        # distance from every pixel to the nearest ink pixel of each mask
+        return np.stack(
+            [
+                (
+                    cv2.distanceTransform((~mask).astype(np.uint8), cv2.DIST_L2, 5)
+                    if mask.any()
+                    else np.full(mask.shape, np.inf, np.float32)
+                )
+                for mask in masks
+            ]
+        )
+
+    to_source = np.where(font_masks, distance_to(source_masks), 0).max(axis=(1, 2))
+    to_font = np.where(source_masks, distance_to(font_masks), 0).max(axis=(1, 2))
+    hausdorff = np.maximum(to_source, to_font) * units_per_pixel
+    return iou, hausdorff
+
+
+class FidelityReport:
+    """Per-glyph comparison of a built font with its source cells.
+
+    Attributes
+    ----------
+    names : list of str
+        Glyph names, in config order.
+    iou : numpy.ndarray
+        Intersection over union of the ink of each glyph and its cell.
+    hausdorff : numpy.ndarray
+        Largest distance, in font units, from ink in one to ink in the other.
+    """
+
+    def __init__(self, names, iou, hausdorff):
+        self.names = names
+        self.iou = iou
+        self.hausdorff = hausdorff
+
+    def failures(self, min_iou=0.8, max_hausdorff=50):
+        """Names of the glyphs that fall below `min_iou` or above `max_hausdorff`."""
+        bad = (self.iou < min_iou) | (self.hausdorff > max_hausdorff)
+        return [name for name, b in zip(self.names, bad) if b]
+
+    def __str__(self):
+        lines = ["glyph                  IoU  hausdorff"]
+        for name, iou, distance in zip(self.names, self.iou, self.hausdorff):
+            lines.append("{:<20} {:>5.3f} {:>10.1f}".format(name, iou, distance))
+        return "\n".join(lines)
+
+
+def compare_font(font, characters_dir, config, metadata=None, canvas=None):
+    """Rasterize every glyph of a built font and compare it with its source cell.
+
+    Parameters
+    ----------
+    font : str
+        Path to the TTF (or OTF) built from `characters_dir`.
+    characters_dir : str
+        Directory the font was built from, with name.bmp for each glyph in
+        its glyph store.
+    config : str
+        Path to config file.
+    metadata : dict
+        Dictionary containing the metadata (sheetversion, ...)
+    canvas : Canvas, optional
+        Area and resolution of the comparison.
+
+    Returns
+    -------
+    FidelityReport
+    """
+    import json
+    from fontTools.ttLib import TTFont
+
+    metadata = metadata or {}
+    canvas = canvas or Canvas()
+    sheet_version = metadata.get("sheetversion") or "99999999.999999.999999"
+    version_major = Version(sheet_version).major
+    with open(config) as f:
+        config_data = json.load(f)
+    ascent = config_data["props"].get("ascent", 800)
+    descent = config_data["props"].get("descent", 200)
+
+    tt = TTFont(font)
+    glyph_set = tt.getGlyphSet()
+    store = open_store(characters_dir, metadata)
+    names, font_masks, source_masks = [], [], []
+    for glyph_object in config_data["glyphs-fancy"]:
+        if "name" not in glyph_object:
+            continue
+        name = glyph_object["name"]
+        if not store.exists(name, ".bmp"):
+            continue
+        cp = int(glyph_object.get("codepoint", "0"), 16)
+
+        mask = source_mask(store.read(name, ".bmp"))
+        units_per_pixel = (ascent + descent) / mask.shape[0]
+        if "placement" in store.info(name):
+            # where the font builder put it
+            transform = zero_width_shift(cp, store.info(name)["placement"])
+        else:
+            transform = placement_transform(
+                cp,
+                ink_bounds(mask, units_per_pixel, ascent),
+                version_major,
+                ascent,
+                descent,
+                glyph_centering(glyph_object),
+            )
+        # image pixels -> imported font units (how FontForge imports an SVG)
+        imported = np.array([[units_per_pixel, 0, 0], [0, -units_per_pixel, ascent]])
+        xx, xy, yx, yy, dx, dy = transform
+        placed = np.array([[xx, yx, dx], [xy, yy, dy]])
+        source_masks.append(
+            canvas.warp(mask, placed @ np.vstack([imported, [0, 0, 1]]))
+        )
+
+        pen = PolygonPen(glyph_set)
+        if name in glyph_set:
+            glyph_set[name].draw(pen)
+        font_masks.append(canvas.fill(pen.contours))
+        names.append(name)
+
+    store.close()
+    if not names:
+        return FidelityReport([], np.zeros(0), np.zeros(0))
+    iou, hausdorff = glyph_metrics(
+        np.stack(font_masks), np.stack(source_masks), 1 / canvas.scale
+    )
+    return FidelityReport(names, iou, hausdorff)
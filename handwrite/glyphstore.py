@@ -0,0 +1,306 @@
+"""Storage for the intermediate files of each glyph (PNG, BMP, SVG).
+
+Only uses the standard library, because the FontForge script reads from it too.
+"""
+
+import os
+import sys
+import json
+import shutil
+import zipfile
+import warnings
+import tempfile
+import threading
+import contextlib
+
+STORE_FILENAME = "glyphs.zip"
+
+
+def open_store(directory, metadata=None):
+    """Open the glyph store of a working directory.
+
+    Parameters
+    ----------
+    directory : str
+        Working directory of the build (characters_dir).
+    metadata : dict, optional
+        If metadata["glyphstore"] is "zip", the glyphs are kept in one
+        uncompressed zip file, directory/glyphs.zip. Otherwise (and by
+        default) each glyph gets its own directory, directory/name/name.png.
+        Without metadata, a store that already exists in `directory` is used.
+    """
+    kind = (metadata or {}).get("glyphstore")
+    if kind is None and os.path.isfile(os.path.join(directory, STORE_FILENAME)):
+        kind = "zip"
+    if kind == "zip":
+        return ZipStore(os.path.join(directory, STORE_FILENAME))
+    return DirectoryStore(directory)
+
+
+class DirectoryStore:
+    """One directory per glyph: directory/name/name.suffix"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = {}
+        path = os.path.join(directory, "index.json")
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                self.index = json.load(f)
+        self.index_changed = False
+
+    def path(self, name, suffix):
+        return os.path.join(self.directory, name, name + suffix)
+
+    def exists(self, name, suffix):
+        return os.path.isfile(self.path(name, suffix))
+
+    def read(self, name, suffix):
+        with open(self.path(name, suffix), "rb") as f:
+            return f.read()
+
+    def write(self, name, suffix, data):
+        os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+        with open(self.path(name, suffix), "wb") as f:
+            f.write(data)
+
+    def names(self, suffix):
+        """Names of the glyphs that have a file with this suffix, sorted."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory) if self.exists(name, suffix)
+        )
+
+    @contextlib.contextmanager
+    def open_path(self, name, suffix):
+        """Path of a real file with the contents, for tools that need one."""
+        yield self.path(name, suffix)
+
+    def outputs(self, names, suffixes):
+        """Identifiers of stored files, for stage checkpoints."""
+        return [self.path(name, suffix) for name in names for suffix in suffixes]
+
+    def set_info(self, name, **info):
+        """Record metadata about a glyph (cell position, ink bounds...)"""
+        self.index.setdefault(name, {}).update(info)
+        self.index_changed = True
+
+    def info(self, name):
+        return self.index.get(name, {})
+
+    def close(self):
+        if self.index_changed:
+            with open(
+                os.path.join(self.directory, "index.json"), "w", encoding="utf-8"
+            ) as f:
+                json.dump(self.index, f, indent=2, sort_keys=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ZipStore:
+    """All glyphs in one uncompressed zip file, indexed by glyph name.
+
+    Members are named "name/name.suffix", like the directory layout, so
+    unzipping the store (or `export`) gives the same files. Glyph metadata is
+    kept in an "index.json" member. Writes are thread-safe. The file is only
+    a valid zip once the store is closed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the zip file. Created if it doesn't exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rewritten = False
+        self.zip = zipfile.ZipFile(path, "a", zipfile.ZIP_STORED)
+        self.index = {}
+        if "index.json" in self.zip.NameToInfo:
+            self.index = json.loads(self.zip.read("index.json"))
+        self.index_changed = False
+
+    def member(self, name, suffix):
+        return name + "/" + name + suffix
+
+    def exists(self, name, suffix):
+        return self.member(name, suffix) in self.zip.NameToInfo
+
+    def read(self, name, suffix):
+        with self.lock:
+            return self.zip.read(self.member(name, suffix))
+
+    def write(self, name, suffix, data):
+        self.write_member(self.member(name, suffix), data)
+
+    def write_member(self, member, data):
+        with self.lock:
+            if member in self.zip.NameToInfo:
+                # zip files can't replace members; compact on close
+                self.rewritten = True
+            # fixed date, so the same glyphs make the same file
+            info = zipfile.ZipInfo(member, date_time=(1980, 1, 1, 0, 0, 0))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # "Duplicate name"
+                self.zip.writestr(info, data, zipfile.ZIP_STORED)
+
+    def names(self, suffix):
+        """Names of the glyphs that have a file with this suffix, sorted."""
+        names = []
+        for member in self.zip.NameToInfo:
+            name, _, filename = member.partition("/")
+            if filename == name + suffix:
+                names.append(name)
+        return sorted(names)
+
+    @contextlib.contextmanager
+    def open_path(self, name, suffix):
+        """Path of a temporary file with the contents, for tools that need one."""
+        temp = tempfile.mkdtemp()
+        path = os.path.join(temp, name + suffix)
+        try:
+            with open(path, "wb") as f:
+                f.write(self.read(name, suffix))
+            yield path
+        finally:
+            shutil.rmtree(temp)
+
+    def outputs(self, names, suffixes):
+        """Identifiers of stored files ("store.zip#member"), for stage checkpoints."""
+        return [
+            self.path + "#" + self.member(name, suffix)
+            for name in names
+            for suffix in suffixes
+            if self.exists(name, suffix)
+        ]
+
+    def set_info(self, name, **info):
+        """Record metadata about a glyph (cell position, ink bounds...)"""
+        with self.lock:
+            self.index.setdefault(name, {}).update(info)
+            self.index_changed = True
+
+    def info(self, name):
+        return self.index.get(name, {})
+
+    def close(self):
+        if self.zip is None:
+            return
+        if self.index_changed:
+            self.write_member(
+                "index.json", json.dumps(self.index, indent=2, sort_keys=True)
+            )
+        self.zip.close()
+        self.zip = None
+        if self.rewritten:
+            compact(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryStore:
+    """Glyphs kept in memory, for builds that don't need their files afterwards.
+
+    The FontForge script can't read it, so only builds that send it the
+    glyphs on stdin (--stream) can use one. Writes are thread-safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.index = {}
+
+    def exists(self, name, suffix):
+        return (name, suffix) in self.files
+
+    def read(self, name, suffix):
+        return self.files[(name, suffix)]
+
+    def write(self, name, suffix, data):
+        with self.lock:
+            self.files[(name, suffix)] = bytes(data)
+
+    def names(self, suffix):
+        """Names of the glyphs that have a file with this suffix, sorted."""
+        return sorted(name for name, other in list(self.files) if other == suffix)
+
+    @contextlib.contextmanager
+    def open_path(self, name, suffix):
+        """Path of a temporary file with the contents, for tools that need one."""
+        temp = tempfile.mkdtemp()
+        path = os.path.join(temp, name + suffix)
+        try:
+            with open(path, "wb") as f:
+                f.write(self.read(name, suffix))
+            yield path
+        finally:
+            shutil.rmtree(temp)
+
+    def outputs(self, names, suffixes):
+        return []
+
+    def set_info(self, name, **info):
+        """Record metadata about a glyph (cell position, ink bounds...)"""
+        with self.lock:
+            self.index.setdefault(name, {}).update(info)
+
+    def info(self, name):
+        return self.index.get(name, {})
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compact(path):
+    """Rewrite a zip store keeping only the latest copy of each member."""
+    with zipfile.ZipFile(path) as old:
+        latest = {info.filename: info for info in old.infolist()}
+        temp = path + ".tmp"
+        with zipfile.ZipFile(temp, "w", zipfile.ZIP_STORED) as new:
+            for info in latest.values():
+                new.writestr(info, old.read(info))
+    os.replace(temp, path)
+
+
+def read_member(identifier):
+    """Read the contents of a "store.zip#member" identifier."""
+    archive, member = identifier.split("#", 1)
+    with zipfile.ZipFile(archive) as z:
+        return z.read(member)
+
+
+def export(store_path, directory):
+    """Unpack a zip store into the one-directory-per-glyph layout."""
+    with zipfile.ZipFile(store_path) as z:
+        z.extractall(directory)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Unpack a glyph store (glyphs.zip) into one directory per glyph"
+    )
+    parser.add_argument("store", help="Path to glyphs.zip")
+    parser.add_argument("directory", help="Directory to unpack into")
+    args = parser.parse_args()
+    if not zipfile.is_zipfile(args.store):
+        sys.exit("Not a glyph store: " + args.store)
+    export(args.store, args.directory)
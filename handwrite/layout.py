@@ -0,0 +1,170 @@
+"""Cache of where the row boxes are on sheets of a given size.
+
+Sheets scanned on the same scanner, at the same DPI, have their nine row boxes
+in nearly the same places. Instead of searching the whole sheet for contours,
+the row boxes found on the last sheet of the same size are checked against
+the new sheet, and snapped to its black lines. Only if that fails is the sheet
+searched again.
+"""
+
+import os
+import json
+import tempfile
+
+from handwrite.preflight import sheet_major_version
+
+
+def fit_edge(ink, position, span, horizontal, tolerance, outward, min_ink):
+    """Find a black line near `position`, along `span`.
+
+    Parameters
+    ----------
+    ink : numpy.ndarray of bool
+        Thresholded sheet, True where there's ink.
+    position : int
+        Expected row (if `horizontal`) or column of the line's outer edge.
+    span : (int, int)
+        Range of columns (or rows) the line covers.
+    horizontal : bool
+        Whether the line is horizontal.
+    tolerance : int
+        How far from `position` to look, in pixels.
+    outward : int
+        -1 if the outside of the box is above (or left of) the line, 1 if
+        it's below (or right of) it.
+    min_ink : float
+        Fraction of the line that has to be ink.
+
+    Returns
+    -------
+    int or None
+        The outermost row (or column) of the line near `position`, or None
+        if there's no line there.
+    """
+    start, stop = span
+    size = ink.shape[0 if horizontal else 1]
+
+    def line(index):
+        return ink[index, start:stop] if horizontal else ink[start:stop, index]
+
+    # look from the outside in, so we find the line's outer edge
+    for offset in range(outward * tolerance, -outward * tolerance - outward, -outward):
+        index = position + offset
+        if 0 <= index < size and line(index).size and line(index).mean() >= min_ink:
+            break
+    else:
+        return None
+    # cv2.boundingRect goes out to the last pixel of the line, so take in
+    # the bits of a slightly slanted line that stick out past the solid edge
+    for _ in range(tolerance):
+        if not 0 <= index + outward < size or not line(index + outward).any():
+            break
+        index += outward
+    return index
+
+
+def register_rows(gray, boxes, threshold_value=200, tolerance=4, min_ink=0.9):
+    """Snap known row boxes to the black lines of a sheet.
+
+    Parameters
+    ----------
+    gray : numpy.ndarray
+        Grayscale sheet.
+    boxes : list of tuple
+        Row boxes (x, y, w, h) of an earlier sheet.
+    threshold_value : int, default=200
+        Pixels this dark or darker are ink, as in SHEETtoPNG.find_rows.
+    tolerance : int, default=4
+        How far (in pixels) each edge may have moved.
+    min_ink : float, default=0.9
+        Fraction of each edge that has to be ink.
+
+    Returns
+    -------
+    list of tuple or None
+        The row boxes of this sheet, or None if they don't line up.
+    """
+    ink = gray <= threshold_value
+    fitted = []
+    for x, y, w, h in boxes:
+        # leave the corners out, they're rounded by thresholding
+        columns = (x + w // 8, x + w - w // 8)
+        rows = (y + h // 8, y + h - h // 8)
+        top = fit_edge(ink, y, columns, True, tolerance, -1, min_ink)
+        bottom = fit_edge(ink, y + h - 1, columns, True, tolerance, 1, min_ink)
+        left = fit_edge(ink, x, rows, False, tolerance, -1, min_ink)
+        right = fit_edge(ink, x + w - 1, rows, False, tolerance, 1, min_ink)
+        if None in (top, bottom, left, right):
+            return None
+        # like cv2.boundingRect, x + w and y + h are one past the line
+        fitted.append((left, top, right - left + 1, bottom - top + 1))
+    return fitted
+
+
+class LayoutCache:
+    """Row boxes of the last sheet of each size and sheet version.
+
+    Parameters
+    ----------
+    directory : str or None
+        Where to keep the layouts, one small JSON file each. Created if it
+        doesn't exist. With None, they're only kept in memory.
+    tolerance : int, default=4
+        How far (in pixels) a row box's edge may have moved between sheets.
+    """
+
+    def __init__(self, directory, tolerance=4):
+        self.directory = directory
+        self.tolerance = tolerance
+        self.layouts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, gray, metadata):
+        height, width = gray.shape[:2]
+        return os.path.join(
+            self.directory or "",
+            "%dx%d-v%d.json" % (width, height, sheet_major_version(metadata)),
+        )
+
+    def get(self, gray, metadata):
+        """Row boxes stored for sheets like this one, or None."""
+        if self.directory is None:
+            return self.layouts.get(self.path(gray, metadata))
+        try:
+            with open(self.path(gray, metadata), encoding="utf-8") as f:
+                return [tuple(box) for box in json.load(f)["rows"]]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def match(self, gray, metadata, threshold_value=200, rows=9):
+        """Row boxes of this sheet, if the cached ones line up with it.
+
+        Returns
+        -------
+        list of tuple or None
+            (x, y, w, h) of each row box, or None if the sheet has to be
+            searched for them.
+        """
+        boxes = self.get(gray, metadata)
+        if boxes is not None and len(boxes) == rows:
+            boxes = register_rows(gray, boxes, threshold_value, self.tolerance)
+            if boxes is not None:
+                self.hits += 1
+                return boxes
+        self.misses += 1
+        return None
+
+    def put(self, gray, metadata, boxes):
+        """Remember the row boxes found on a sheet."""
+        if self.directory is None:
+            self.layouts[self.path(gray, metadata)] = [
+                tuple(map(int, box)) for box in boxes
+            ]
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(gray, metadata)
+        fd, temp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"rows": [list(map(int, box)) for box in boxes]}, f)
+        os.replace(temp, path)
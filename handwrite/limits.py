@@ -0,0 +1,348 @@
+"""Time and resource limits for the potrace and FontForge runs of a build.
+
+Every potrace and FontForge process a build starts goes through Limits:
+each run gets a timeout, and optionally memory and CPU time limits (on
+POSIX, as rlimits of the process). A run that fails, is killed or takes too
+long raises ToolError (or ToolTimeout) right away, with the end of what the
+tool wrote to stderr, and can be retried a few times. A deadline bounds the
+whole build: no run goes on past it.
+
+So a build that hangs or blows up in a tool fails in a bounded time,
+instead of stalling a worker.
+"""
+
+import os
+import copy
+import time
+import threading
+import subprocess
+
+# Lines of a tool's stderr kept in a ToolError's message
+STDERR_LINES = 20
+
+
+class ToolError(RuntimeError):
+    """A potrace or FontForge run failed.
+
+    Attributes
+    ----------
+    tool : str
+        "potrace" or "fontforge".
+    command : list of str
+    returncode : int or None
+        None if the run timed out.
+    stderr : bytes
+        What the tool wrote to stderr.
+    """
+
+    def __init__(self, tool, command, message, returncode=None, stderr=b""):
+        self.tool = tool
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr or b""
+        lines = (
+            self.stderr.decode("utf-8", "replace").strip().splitlines()[-STDERR_LINES:]
+        )
+        super().__init__(
+            "\n".join(["%s %s" % (tool, message)] + ["  " + line for line in lines])
+        )
+
+
+class ToolTimeout(ToolError):
+    """A potrace or FontForge run took longer than its timeout, or the build's deadline."""
+
+
+class Limits:
+    """How long, and with how much memory and CPU time, tools may run.
+
+    Parameters
+    ----------
+    potrace_timeout : float or None, default=60
+        Seconds a potrace run (one glyph) may take.
+    fontforge_timeout : float or None, default=900
+        Seconds a FontForge run (the whole font, or a shard of it) may take.
+    memory : int, optional
+        Most address space of each tool process, in bytes.
+    cpu : int, optional
+        Most CPU time of each tool process, in seconds.
+    retries : int, default=0
+        Runs that fail or time out are retried this many times. FontForge
+        runs of `handwrite --stream` aren't, since their input is gone.
+    deadline : float, optional
+        Seconds a whole build may take, from start(). No tool runs past it.
+
+    Memory and CPU limits are ignored on Windows.
+    """
+
+    def __init__(
+        self,
+        potrace_timeout=60,
+        fontforge_timeout=900,
+        memory=None,
+        cpu=None,
+        retries=0,
+        deadline=None,
+    ):
+        self.timeouts = {"potrace": potrace_timeout, "fontforge": fontforge_timeout}
+        self.memory = memory
+        self.cpu = cpu
+        self.retries = retries
+        self.deadline = deadline
+        self.ends = None
+
+    def start(self):
+        """A copy of these limits for a build starting now, for its deadline."""
+        limits = copy.copy(self)
+        if self.deadline is not None:
+            limits.ends = time.monotonic() + self.deadline
+        return limits
+
+    def timeout(self, tool, command=None):
+        """Seconds the next run of `tool` may take, or None for no limit.
+
+        Raises
+        ------
+        ToolTimeout
+            If the build's deadline has passed.
+        """
+        timeout = self.timeouts.get(tool)
+        if self.ends is not None:
+            remaining = self.ends - time.monotonic()
+            if remaining <= 0:
+                raise ToolTimeout(
+                    tool, command, "not started, the build's deadline has passed"
+                )
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def preexec(self):
+        """Function setting the rlimits in a tool process, or None."""
+        if os.name != "posix" or (self.memory is None and self.cpu is None):
+            return None
+        # imported here, not in the child: importing between fork and exec
+        # can deadlock
+        import resource
+
+        limits = []
+        if self.memory is not None:
+            limits.append((resource.RLIMIT_AS, (self.memory, self.memory)))
+        if self.cpu is not None:
+            # the soft limit sends SIGXCPU, the hard one a second later SIGKILL
+            limits.append((resource.RLIMIT_CPU, (self.cpu, self.cpu + 1)))
+
+        def limit():
+            for which, value in limits:
+                resource.setrlimit(which, value)
+
+        return limit
+
+    def run(self, tool, command, input=None, env=None):
+        """Run a tool to the end, retrying it if it fails.
+
+        Returns
+        -------
+        bytes
+            Its stdout.
+
+        Raises
+        ------
+        ToolError
+            If the last try exits with an error.
+        ToolTimeout
+            If it times out, or the build's deadline passes.
+        """
+
+        def attempt():
+            timeout = self.timeout(tool, command)
+            try:
+                result = subprocess.run(
+                    command,
+                    input=input,
+                    stdin=subprocess.DEVNULL if input is None else None,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    env=env,
+                    timeout=timeout,
+                    preexec_fn=self.preexec(),
+                )
+            except subprocess.TimeoutExpired as e:
+                raise ToolTimeout(
+                    tool, command, "timed out after %gs" % timeout, stderr=e.stderr
+                )
+            check(tool, command, result.returncode, result.stderr)
+            return result.stdout
+
+        return self.retry(attempt)
+
+    def retry(self, attempt, retries=None):
+        """Call `attempt` until it doesn't raise ToolError, `retries` more times at most.
+
+        `retries` is self.retries by default. Running out of time for the
+        build isn't retried.
+        """
+        retries = self.retries if retries is None else retries
+        while True:
+            try:
+                return attempt()
+            except ToolError:
+                if (
+                    retries <= 0
+                    or self.ends is not None
+                    and time.monotonic() >= self.ends
+                ):
+                    raise
+                retries -= 1
+
+    def popen(self, tool, command, **kwargs):
+        """Start a tool, and kill it when its time is up.
+
+        For runs that stream their input or output. The process' stderr goes
+        to a temp file, for ToolError.
+
+        Returns
+        -------
+        ToolProcess
+            Finish it with its wait().
+        """
+        import tempfile
+
+        timeout = self.timeout(tool, command)
+        stderr = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(
+                command, stderr=stderr, preexec_fn=self.preexec(), **kwargs
+            )
+        except BaseException:
+            stderr.close()
+            raise
+        return ToolProcess(tool, command, process, stderr, timeout)
+
+
+class ToolProcess:
+    """A tool started by Limits.popen().
+
+    Attributes
+    ----------
+    process : subprocess.Popen
+    stdin, stdout
+        The process' pipes, if it has them.
+    """
+
+    def __init__(self, tool, command, process, stderr, timeout):
+        self.tool = tool
+        self.command = command
+        self.process = process
+        self.stdin = process.stdin
+        self.stdout = process.stdout
+        self.stderr = stderr
+        self.timeout = timeout
+        self.timed_out = False
+        self.timer = None
+        if timeout is not None:
+            # killed from a timer rather than in wait(), so whoever's writing
+            # to its stdin isn't stuck when it hangs
+            self.timer = threading.Timer(timeout, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def poll(self):
+        return self.process.poll()
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+
+    def expire(self):
+        if self.process.poll() is None:
+            self.timed_out = True
+            self.process.kill()
+
+    def wait(self):
+        """Wait for the tool to exit.
+
+        Raises
+        ------
+        ToolError
+            If it exited with an error.
+        ToolTimeout
+            If it was killed for taking too long.
+        """
+        returncode = self.process.wait()
+        if self.timer is not None:
+            self.timer.cancel()
+        self.stderr.seek(0)
+        output = self.stderr.read()
+        self.stderr.close()
+        if self.timed_out:
+            raise ToolTimeout(
+                self.tool,
+                self.command,
+                "timed out after %gs" % self.timeout,
+                stderr=output,
+            )
+        check(self.tool, self.command, returncode, output)
+
+
+def check(tool, command, returncode, stderr):
+    """Raise ToolError if a tool exited with an error."""
+    if returncode and returncode < 0:
+        # on POSIX, killed by a signal: SIGXCPU (or SIGKILL) for the CPU limit
+        raise ToolError(
+            tool, command, "killed by signal %d" % -returncode, returncode, stderr
+        )
+    if returncode:
+        raise ToolError(
+            tool, command, "failed with exit status %d" % returncode, returncode, stderr
+        )
+
+
+def add_limit_arguments(parser):
+    """Add the options of Limits to an argparse parser (see limits_from_arguments)."""
+    parser.add_argument(
+        "--potrace-timeout",
+        help="Give up on a glyph if potrace takes more than this many seconds (60 by default)",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--fontforge-timeout",
+        help="Give up if a FontForge run takes more than this many seconds (900 by default)",
+        type=float,
+        default=900,
+    )
+    parser.add_argument(
+        "--memory-limit",
+        help="Most memory each potrace and FontForge process may use, in MiB (no limit by default, ignored on Windows)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--cpu-limit",
+        help="Most CPU time each potrace and FontForge process may use, in seconds (no limit by default, ignored on Windows)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--retries",
+        help="Retry potrace and FontForge runs that fail or time out this many times (0 by default)",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--deadline",
+        help="Give up if the whole build takes more than this many seconds (no limit by default)",
+        type=float,
+        default=None,
+    )
+
+
+def limits_from_arguments(args):
+    """Limits from the options add_limit_arguments added."""
+    return Limits(
+        args.potrace_timeout,
+        args.fontforge_timeout,
+        args.memory_limit * 1024 * 1024 if args.memory_limit else None,
+        args.cpu_limit,
+        args.retries,
+        args.deadline,
+    )
@@ -0,0 +1,430 @@
+"""Fix a few glyphs of a font from a scan of only the rows they're on.
+
+A patch sheet is a scan with any number of a sheet's row boxes on it: the
+rows whose glyphs are being redone, cut out of a new printout or with the
+other rows left out of the scan. Its cells replace those of the same glyphs
+in the debug directory of the build that made the font (`handwrite
+--debug-directory`), and only those glyphs are traced again and reimported
+into the font FontForge saved there. Every other glyph stays as it was.
+"""
+
+import os
+import json
+
+from handwrite.preflight import PreflightError, Problem
+from handwrite.progress import as_progress
+
+ROWS = 9
+COLS = 20
+
+
+def reference_rows(store, glyphs, page=0, cols=COLS):
+    """Where each row was on the sheet of the earlier build.
+
+    Parameters
+    ----------
+    store : handwrite.glyphstore.DirectoryStore or ZipStore
+        Glyph store of the earlier build.
+    glyphs : list of dict
+        The config's "glyphs-fancy" list.
+    page : int, default=0
+        Page of the sheet set.
+
+    Returns
+    -------
+    dict
+        Row number to the vertical center of its cells, as a fraction of the
+        sheet's height. Rows without any glyph recorded with its sheet's size
+        are left out.
+    """
+    from handwrite.sheettopng import page_cells
+
+    centers = {}
+    for cell, name in page_cells(glyphs, page, cols).items():
+        if cell >= ROWS * cols or not store.exists(name, ".png"):
+            continue
+        info = store.info(name)
+        if "sheet" not in info or "cell" not in info:
+            continue
+        left, top, width, height = info["cell"]
+        # the scan areas are centered in their row box, vertically
+        centers.setdefault(cell // cols, []).append(
+            (top + height / 2) / info["sheet"][1]
+        )
+    return {row: sum(values) / len(values) for row, values in centers.items()}
+
+
+def match_rows(boxes, height, reference):
+    """Which row of the sheet each row box of a patch sheet is.
+
+    Each row box goes to the row whose center was at the nearest height on
+    the earlier build's sheet, as a fraction of the page height. So the
+    patch sheet has to be a whole page, like the original, with the row
+    boxes where they were printed.
+
+    Parameters
+    ----------
+    boxes : list of tuple
+        (x, y, w, h) of each row box on the patch sheet, top to bottom.
+    height : int
+        Height of the patch sheet, in pixels.
+    reference : dict
+        From reference_rows.
+
+    Returns
+    -------
+    list of int
+        Row number of each box.
+
+    Raises
+    ------
+    ValueError
+        If a box isn't near any row, or two boxes are near the same one.
+    """
+    if not reference:
+        raise ValueError(
+            "The earlier build didn't record where its rows were; give the rows explicitly"
+        )
+    centers = sorted(reference.items(), key=lambda item: item[1])
+    gaps = [b[1] - a[1] for a, b in zip(centers, centers[1:])]
+    # rows are about evenly spaced: a box has to be closer to a row than
+    # half the distance between two rows
+    tolerance = min(gaps) / 2 if gaps else 0.5
+    rows = []
+    for x, y, w, h in boxes:
+        center = (y + h / 2) / height
+        row, expected = min(centers, key=lambda item: abs(item[1] - center))
+        if abs(expected - center) > tolerance:
+            raise ValueError(
+                "The row box at y=%d isn't where any row of the sheet was; give the rows explicitly"
+                % y
+            )
+        if row in rows:
+            raise ValueError(
+                "Two row boxes are where row %d was; give the rows explicitly"
+                % (row + 1)
+            )
+        rows.append(row)
+    return rows
+
+
+def find_patch_rows(image, threshold_value=200, progress=None):
+    """Find the row boxes of a patch sheet, and straighten it if it's skewed.
+
+    Like SHEETtoPNG does for a whole sheet (see sheettopng.deskew), so the
+    cells of a slightly rotated patch sheet line up with their boxes too.
+
+    Returns
+    -------
+    image : numpy.ndarray
+        The straightened sheet, or `image` itself.
+    boxes : list of tuple
+        (x, y, w, h) of the row boxes on it, top to bottom.
+    """
+    import cv2
+
+    from handwrite.sheettopng import SHEETtoPNG
+
+    cutter = SHEETtoPNG(progress=progress)
+    boxes, contours = cutter.find_rows(
+        None,
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY),
+        threshold_value,
+        ROWS,
+        contours=True,
+        partial=True,
+    )
+    if not contours:
+        return image, boxes
+    return cutter.straighten(None, image, contours)
+
+
+def patch_cells(image, rows, boxes, metadata, cols=COLS):
+    """Cut the cells of the row boxes of a patch sheet.
+
+    Returns
+    -------
+    dict
+        Cell number (on the whole sheet, like detect_characters) to
+        [roi, left, top, width, height], including the cells after the
+        grid that are cut from these rows.
+    """
+    from handwrite.sheettopng import SHEETtoPNG
+
+    cutter = SHEETtoPNG()
+    cells = {}
+    for row, box in zip(rows, boxes):
+        for col, cell in enumerate(cutter.row_cells(image, box, metadata, cols)):
+            cells[row * cols + col] = cell
+    cutter.extra_cells(image, cells, metadata)
+    return cells
+
+
+def patch_font(
+    sheet,
+    directory,
+    output_directory,
+    config=None,
+    metadata=None,
+    rows=None,
+    glyphs=None,
+    page=0,
+    check=True,
+    progress=None,
+    limits=None,
+):
+    """Replace the glyphs on some rows of a sheet, and rebuild the font.
+
+    Parameters
+    ----------
+    sheet : str
+        Path to the patch sheet: a scan with one or more row boxes.
+    directory : str
+        Debug directory of the build to patch (`handwrite --debug-directory`).
+    output_directory : str
+        Where to write the patched font and its web page.
+    config : str, optional
+        Path to config file. Has to be the one of the earlier build.
+    metadata : dict, optional
+        Dictionary containing the metadata (filename, family, ...), like the
+        earlier build's.
+    rows : list of int, optional
+        Row of the sheet (counting from 0) of each row box on the patch
+        sheet, top to bottom. Worked out from where the boxes are on the page
+        by default (see match_rows).
+    glyphs : list of str, optional
+        Only replace these glyphs (names from the config). Every glyph on
+        the patch sheet's rows by default.
+    page : int, default=0
+        Page of the sheet set the rows are from.
+    check : bool, default=True
+        Check that potrace and FontForge are installed first.
+    progress : callable or handwrite.progress.Progress, optional
+        Gets the build's events.
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of potrace and FontForge.
+
+    Returns
+    -------
+    str
+        Path to the font.
+
+    Raises
+    ------
+    handwrite.preflight.PreflightError
+        If no row box is found on the patch sheet, or not as many as `rows`.
+    """
+    import cv2
+
+    from handwrite.checkpoint import Checkpoint
+    from handwrite.glyphstore import open_store
+    from handwrite.limits import Limits
+    from handwrite.pngtosvg import PNGtoSVG
+    from handwrite.preflight import with_sheet_version
+    from handwrite.sheettopng import SHEETtoPNG, page_cells
+    from handwrite.svgtottf import SVGtoTTF
+
+    progress = as_progress(progress)
+    limits = (limits or Limits()).start()
+    metadata = dict(metadata or {})
+    if config is None:
+        config = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "default.json"
+        )
+    with open(config) as f:
+        config_data = json.load(f)
+    metadata = with_sheet_version(sheet, config_data, metadata)
+    filename = metadata.get("filename") or config_data["props"].get("filename")
+    if not os.path.exists(
+        os.path.join(directory, "%s without ligatures.sfd" % filename)
+    ):
+        raise FileNotFoundError(
+            "No font to patch in %s: build it with --debug-directory first" % directory
+        )
+    if check:
+        from handwrite.preflight import check_tools
+
+        problems = check_tools(metadata)
+        if problems:
+            raise PreflightError(problems)
+
+    image = cv2.imread(sheet)
+    if image is None:
+        raise PreflightError([Problem("image", "can't read %s as an image" % sheet)])
+    image, boxes = find_patch_rows(
+        image, config_data.get("threshold_value", 200), progress
+    )
+    if not boxes or rows is not None and len(rows) != len(boxes):
+        expected = len(rows) if rows is not None else 1
+        raise PreflightError(
+            [
+                Problem(
+                    "rows",
+                    "found %d row boxes on the patch sheet, expected %d"
+                    % (len(boxes), expected),
+                    found=len(boxes),
+                    expected=expected,
+                )
+            ]
+        )
+
+    names = page_cells(config_data.get("glyphs-fancy", []), page, COLS)
+    with open_store(directory, metadata) as store:
+        if rows is None:
+            rows = match_rows(
+                boxes,
+                image.shape[0],
+                reference_rows(store, config_data["glyphs-fancy"], page),
+            )
+        cells = patch_cells(image, rows, boxes, metadata)
+        cells = {
+            cell: roi
+            for cell, roi in cells.items()
+            if cell in names and (glyphs is None or names[cell] in glyphs)
+        }
+        if not cells:
+            raise ValueError(
+                "None of the glyphs to patch are on the patch sheet's rows"
+            )
+
+        patched = []
+        cutter = SHEETtoPNG(progress=progress)
+        with progress.stage("sheettopng"):
+            cutter.store_cells(store, cells, config, metadata, page, COLS)
+        tracer = PNGtoSVG(progress, limits)
+        with progress.stage("pngtosvg", len(cells)):
+            for cell in sorted(cells):
+                tracer.convert_glyph(store, names[cell], metadata)
+                progress.glyph("pngtosvg", names[cell])
+                patched.append(names[cell])
+
+    converter = SVGtoTTF(progress, limits)
+    converter.place_glyphs(directory, config, metadata)
+    converter.run_fontforge(directory, config, metadata, patch=patched)
+    os.makedirs(output_directory, exist_ok=True)
+    # the font (and web page) the build wrote are replaced, not written next to
+    return converter.add_ligatures(
+        directory,
+        output_directory,
+        config,
+        metadata,
+        replace=Checkpoint(directory, "ligatures", None).recorded(),
+    )
+
+
+def parse_list(text, convert=str):
+    return [convert(item) for item in text.split(",") if item]
+
+
+def main():
+    import argparse
+    from handwrite.progress import TerminalProgress
+
+    parser = argparse.ArgumentParser(
+        description="Replace the glyphs on some rows of a sheet, from a scan of just those rows"
+    )
+    parser.add_argument("patch_sheet", help="Scan with the row boxes to replace")
+    parser.add_argument(
+        "debug_directory", help="--debug-directory of the build that made the font"
+    )
+    parser.add_argument(
+        "output_directory", help="Directory Path to save the patched font in"
+    )
+    parser.add_argument(
+        "--rows",
+        help="Row of the sheet (1 to 9) of each row box on the patch sheet, top to bottom, "
+        "like 3,7 (worked out from where they are on the page by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--glyphs",
+        help="Only replace these glyphs, like aTok,akesiTok (every glyph on the rows by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--page",
+        help="Page of the sheet set the rows are from (1 by default)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--filename", help="Font File name, like the build's", default=None
+    )
+    parser.add_argument(
+        "--family", help="Font Family name, like the build's", default=None
+    )
+    parser.add_argument(
+        "--designer", help="Font Designer name, like the build's", default=None
+    )
+    parser.add_argument(
+        "--license", help="Font License, like the build's", default=None
+    )
+    parser.add_argument(
+        "--license-url", help="Font License URL, like the build's", default=None
+    )
+    parser.add_argument(
+        "--sheet-version",
+        help="Sheet version, like the build's (worked out from the sheet by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--glyph-store",
+        help='Glyph store of the build ("directory" or "zip"), like its --glyph-store',
+        choices=["directory", "zip"],
+        default=None,
+    )
+    parser.add_argument(
+        "--config", help="Configuration file of the build", default=None
+    )
+    parser.add_argument(
+        "--skip-preflight",
+        help="Don't check the tools before converting",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    try:
+        rows = (
+            None
+            if args.rows is None
+            else [row - 1 for row in parse_list(args.rows, int)]
+        )
+    except ValueError:
+        parser.error("--rows must be numbers separated by commas")
+    if rows is not None and not all(0 <= row < ROWS for row in rows):
+        parser.error("--rows must be between 1 and %d" % ROWS)
+    metadata = {
+        "filename": args.filename,
+        "family": args.family,
+        "designer": args.designer,
+        "license": args.license,
+        "licenseurl": args.license_url,
+        "sheetversion": args.sheet_version,
+    }
+    if args.glyph_store:
+        metadata["glyphstore"] = args.glyph_store
+    try:
+        font = patch_font(
+            args.patch_sheet,
+            args.debug_directory,
+            args.output_directory,
+            args.config,
+            metadata,
+            rows,
+            None if args.glyphs is None else parse_list(args.glyphs),
+            args.page - 1,
+            not args.skip_preflight,
+            TerminalProgress(),
+        )
+    except PreflightError as e:
+        parser.exit(
+            2,
+            "%s: can't patch\n%s\n"
+            % (
+                parser.prog,
+                "\n".join("  - " + problem.message for problem in e.problems),
+            ),
+        )
+    except ValueError as e:
+        parser.exit(2, "%s: can't patch: %s\n" % (parser.prog, e))
+    print(font)
@@ -0,0 +1,239 @@
+import os
+import json
+import queue
+import threading
+import subprocess
+
+import cv2
+
+from handwrite.cells import CellPool
+from handwrite.sheettopng import SHEETtoPNG, page_cells, sheet_size
+from handwrite.pngtosvg import PNGtoSVG
+from handwrite.svgtottf import SVGtoTTF, relay_progress, write_stream_record
+from handwrite.glyphstore import open_store
+from handwrite.limits import Limits, ToolError
+from handwrite.placement import glyph_centering, imported_bounds, placements
+from handwrite.preflight import sheet_list, sheet_major_version
+from handwrite.progress import as_progress
+
+
+class StreamingPipeline:
+    """Run all stages at once, passing each glyph along as soon as it's ready.
+
+    The regular pipeline (`cli.run`) finishes each stage before starting the
+    next one. Here, FontForge is launched first (so its startup overlaps with
+    reading the sheet), cells go through a bounded queue to a pool of trace
+    workers (PNG -> BMP -> SVG) as they're cut, and every traced glyph
+    goes through a second bounded queue to the FontForge script's stdin,
+    which imports it right away. So a build takes about as long as its
+    slowest stage, rather than the sum of all of them.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of trace worker threads. Defaults to the number of CPUs.
+    queue_size : int, default=16
+        Maximum number of glyphs waiting between two stages. Bounds memory
+        when cutting is faster than tracing.
+    layout_cache : handwrite.layout.LayoutCache, optional
+        Passed on to SHEETtoPNG.
+    progress : callable or handwrite.progress.Progress, optional
+        Gets the events of every stage. The stages overlap, so all three
+        start before the first glyph is cut.
+    cell_workers : int, optional
+        Resize and threshold each page's cells in this many processes (see
+        handwrite.cells.CellPool) before they're traced, instead of in the
+        trace workers. Pays off on large scans, with several cores.
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of potrace and FontForge.
+        FontForge is only given its timeout: its input is streamed, so it
+        can't be retried.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        queue_size=16,
+        layout_cache=None,
+        progress=None,
+        cell_workers=None,
+        limits=None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.layout_cache = layout_cache
+        self.progress = as_progress(progress)
+        self.cell_workers = cell_workers
+        self.limits = limits or Limits()
+
+    def convert(self, sheet, output_directory, characters_dir, config, metadata):
+        """Convert a sheet (or a list of pages) to a font in `output_directory`.
+
+        Writes the same files to `characters_dir` as the staged pipeline.
+        Pages are cut one at a time. The paths of the files written to
+        `output_directory` (font first) are left in self.outputs.
+
+        Returns
+        -------
+        str
+            Path to the generated font.
+        """
+        metadata = metadata or {}
+        with open(config) as f:
+            config_data = json.load(f)
+        threshold_value = config_data.get("threshold_value", 200)
+        ascent = config_data["props"].get("ascent", 800)
+        descent = config_data["props"].get("descent", 200)
+        version_major = sheet_major_version(metadata)
+        centering = {
+            glyph["name"]: glyph_centering(glyph)
+            for glyph in config_data.get("glyphs-fancy", [])
+            if "name" in glyph
+        }
+        os.makedirs(characters_dir, exist_ok=True)
+        progress = self.progress
+        reporting = progress.callback is not None
+
+        for stage in ("sheettopng", "pngtosvg", "fontforge"):
+            progress.start(stage)
+        limits = self.limits
+        fontforge = limits.popen(
+            "fontforge",
+            SVGtoTTF().fontforge_command(
+                characters_dir, config, metadata, stream=True, progress=reporting
+            ),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if reporting else None,
+            env=SVGtoTTF().fontforge_env(metadata),
+        )
+        if reporting:
+            relay = threading.Thread(
+                target=relay_progress, args=(fontforge.stdout, progress)
+            )
+            relay.start()
+        store = open_store(characters_dir, metadata)
+        cells = queue.Queue(maxsize=self.queue_size)
+        traced = queue.Queue(maxsize=self.queue_size)
+        errors = []
+
+        def trace():
+            converter = PNGtoSVG(limits=limits)
+            while True:
+                cell = cells.get()
+                if cell is None:
+                    break
+                if errors:
+                    # keep draining, so the producer never blocks on a full queue
+                    continue
+                name, levels = cell
+                try:
+                    if levels is None:
+                        svg = converter.convert_glyph(store, name, metadata)
+                    else:
+                        svg = converter.trace_levels(store, name, levels, metadata)
+                    info = store.info(name)
+                    placement = placements(
+                        [
+                            imported_bounds(
+                                info["ink"], info["trace_height"], ascent, descent
+                            )
+                        ],
+                        [centering.get(name, "none")],
+                        version_major,
+                        ascent,
+                        descent,
+                    )[0].tolist()
+                    store.set_info(name, placement=placement)
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                progress.glyph("pngtosvg", name)
+                traced.put((name, svg, placement))
+
+        def feed():
+            while True:
+                glyph = traced.get()
+                if glyph is None:
+                    break
+                if errors:
+                    continue
+                try:
+                    write_stream_record(fontforge.stdin, *glyph)
+                except OSError as e:
+                    errors.append(e)
+            try:
+                fontforge.stdin.close()
+            except OSError:
+                pass
+
+        tracers = [threading.Thread(target=trace) for _ in range(self.workers)]
+        feeder = threading.Thread(target=feed)
+        for thread in tracers + [feeder]:
+            thread.start()
+
+        # one set of worker processes for every page
+        cell_pool = CellPool(self.cell_workers) if self.cell_workers else None
+        try:
+            converter = SHEETtoPNG(self.layout_cache)
+            for page, path in enumerate(sheet_list(sheet)):
+                if errors:
+                    break
+                characters = converter.detect_characters(
+                    characters_dir, path, threshold_value, metadata
+                )
+                levels = {}
+                if cell_pool is not None:
+                    names = page_cells(config_data.get("glyphs-fancy", []), page)
+                    prepared, stack = cell_pool.levels(characters, names, metadata)
+                    levels = {names[cell]: stack[i] for i, cell in enumerate(prepared)}
+                sheet_shape = sheet_size(characters)
+                for name, image, cell in converter.cells(
+                    characters, config, metadata, page
+                ):
+                    if errors:
+                        break
+                    store.write(name, ".png", cv2.imencode(".png", image)[1].tobytes())
+                    store.set_info(name, page=page, cell=cell, sheet=sheet_shape)
+                    progress.glyph("sheettopng", name)
+                    cells.put((name, levels.get(name)))
+                # let go of this page before reading the next one
+                del characters, levels
+            if not errors:
+                progress.end("sheettopng")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if cell_pool is not None:
+                cell_pool.close()
+            for _ in tracers:
+                cells.put(None)
+            for thread in tracers:
+                thread.join()
+            if not errors:
+                progress.end("pngtosvg")
+            traced.put(None)
+            feeder.join()
+            store.close()
+
+        if errors and fontforge.poll() is None:
+            fontforge.kill()
+        try:
+            fontforge.wait()
+        except ToolError as e:
+            # unless FontForge was killed for another error, its failure is
+            # what broke the pipe to it
+            if not errors or isinstance(errors[0], OSError):
+                errors.insert(0, e)
+        finally:
+            if reporting:
+                relay.join()
+        if errors:
+            raise errors[0]
+        progress.end("fontforge")
+
+        converter = SVGtoTTF(progress, limits)
+        font = converter.add_ligatures(
+            characters_dir, output_directory, config, metadata
+        )
+        self.outputs = converter.outputs
+        return font
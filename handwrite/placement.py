@@ -0,0 +1,190 @@
+"""Where each glyph goes in the em square.
+
+A traced glyph comes in at the size of its whole scan cell. It's shifted
+by the cell's margin, centered if its config entry says so, and scaled so
+the glyph (rather than the cell) is an em tall. All of that is one affine
+transform per glyph, computed here for every glyph at once, from the bounds
+of its traced outline. The font builder only has to apply it.
+"""
+
+import re
+
+import numpy as np
+
+# Sheet metrics before scaling (BS) up so that the glyph is the full em
+# height: (bs_scan_hor_padding, bs_glyph_wh), by major sheet version
+SCAN_METRICS = {
+    2: (50, 700),
+    3: (125, 500),
+}
+
+CENTERING = ("none", "horizontal", "vertical", "both")
+
+
+def default_centering(cp):
+    """How glyphs without a "center" in the config are centered, by codepoint.
+
+    default.json says how every glyph is centered; this only fills in for
+    configs that don't, like ones copied from it before "center" existed.
+    It gives what those configs always got: sitelen pona, middot and colon
+    are centered both ways. So are a, e, n and o; the other letters only
+    horizontally. Cartouches, long pi and te/to aren't centered.
+    """
+    sitelen_pona = (
+        0xF1900 <= cp <= 0xF1988  # pu & ku suli
+        or 0xF19A0 <= cp <= 0xF19A3  # historical
+        or cp in (0xF199C, 0x2E)  # period
+        or cp in (0xF199D, 0x3A)  # colon
+    )
+    if sitelen_pona or cp in (0x61, 0x65, 0x6E, 0x6F):
+        return "both"
+    if 0x61 <= cp <= 0x7A:
+        return "horizontal"
+    return "none"
+
+
+def glyph_centering(glyph_object):
+    """Centering of a glyph of the config's "glyphs-fancy" list."""
+    centering = glyph_object.get("center")
+    if centering is None:
+        return default_centering(int(glyph_object.get("codepoint", "0"), 16))
+    if centering not in CENTERING:
+        raise ValueError(
+            'Glyph %s: "center" should be one of %s, not %r'
+            % (glyph_object.get("name"), ", ".join(CENTERING), centering)
+        )
+    return centering
+
+
+def svg_bounds(svg):
+    """Bounds of the outline in a potrace SVG.
+
+    Parameters
+    ----------
+    svg : bytes
+        Contents of the .svg file.
+
+    Returns
+    -------
+    (list of float or None, float)
+        (left, top, right, bottom) of the outline in the SVG's units (y
+        down, like the cell's pixels), or None if there's no ink, and the
+        height of the SVG.
+    """
+    from fontTools.pens.boundsPen import BoundsPen
+    from fontTools.pens.transformPen import TransformPen
+    from fontTools.svgLib.path import parse_path
+
+    text = svg.decode("utf-8") if isinstance(svg, bytes) else svg
+    height = float(
+        re.search(r'viewBox="[-\d.]+ [-\d.]+ [-\d.]+ ([-\d.]+)"', text).group(1)
+    )
+    group = re.search(
+        r"translate\(([-\d.]+),\s*([-\d.]+)\)\s*scale\(([-\d.]+),\s*([-\d.]+)\)", text
+    )
+    transform = (1, 0, 0, 1, 0, 0)
+    if group:
+        dx, dy, sx, sy = map(float, group.groups())
+        transform = (sx, 0, 0, sy, dx, dy)
+    pen = BoundsPen(None)
+    for d in re.findall(r'\sd="([^"]*)"', text):
+        parse_path(d, TransformPen(pen, transform))
+    if pen.bounds is None:
+        return None, height
+    left, top, right, bottom = pen.bounds
+    return [left, top, right, bottom], height
+
+
+def imported_bounds(ink, height, ascent=800, descent=200):
+    """(left, bottom, right, top) of an outline once imported into the font.
+
+    The SVG is imported at the em's height, with its top at the ascent.
+    An empty outline is (0, 0, 0, 0).
+    """
+    if ink is None:
+        return (0, 0, 0, 0)
+    units = (ascent + descent) / height
+    left, top, right, bottom = ink
+    return (left * units, ascent - bottom * units, right * units, ascent - top * units)
+
+
+def placements(bounds, centering, version_major, ascent=800, descent=200):
+    """The placement transform of each glyph, all at once.
+
+    Parameters
+    ----------
+    bounds : array-like
+        (left, bottom, right, top) of each imported outline (see
+        imported_bounds), shape (glyphs, 4).
+    centering : list of str
+        Centering of each glyph (see CENTERING).
+    version_major : int
+        Major version of the sheet.
+
+    Returns
+    -------
+    numpy.ndarray
+        psMat-style (xx, xy, yx, yy, dx, dy) transform of each glyph,
+        shape (glyphs, 6).
+    """
+    bs_scan_hor_padding, bs_glyph_wh = SCAN_METRICS[2 if version_major < 3 else 3]
+    bounds = np.asarray(bounds, float).reshape(-1, 4)
+    left, bottom, right, top = bounds.T
+    centering = np.asarray(centering)
+    vertical = np.isin(centering, ("vertical", "both"))
+    horizontal = np.isin(centering, ("horizontal", "both"))
+
+    # shift by the left margin, then center in the glyph's safe area
+    dx = -bs_scan_hor_padding + np.where(
+        horizontal,
+        bs_glyph_wh
+        - (right - bs_scan_hor_padding)
+        - (bs_glyph_wh - (right - left)) / 2,
+        0,
+    )
+    dy = np.where(vertical, ascent - top - (ascent + descent - (top - bottom)) / 2, 0)
+    # then scale around the safe area's center, so that's an em tall
+    scale = 1000 / bs_glyph_wh
+    result = np.zeros((len(bounds), 6))
+    result[:, 0] = result[:, 3] = scale
+    result[:, 4] = scale * (dx - bs_glyph_wh / 2) + 500
+    result[:, 5] = scale * (dy - (bs_glyph_wh + bs_scan_hor_padding) / 2) + 500
+    return result
+
+
+def write_placements(store, glyphs, version_major, ascent=800, descent=200):
+    """Record the placement of every traced glyph in the glyph store's index.
+
+    Uses the ink bounds PNGtoSVG recorded when tracing, or reads them from
+    the SVG for glyphs traced before it did.
+
+    Parameters
+    ----------
+    store : handwrite.glyphstore.DirectoryStore or ZipStore
+        Open glyph store.
+    glyphs : list of dict
+        The config's "glyphs-fancy" list.
+    version_major : int
+        Major version of the sheet.
+    """
+    names, bounds, centering = [], [], []
+    for glyph_object in glyphs:
+        name = glyph_object.get("name")
+        if name is None or not store.exists(name, ".svg"):
+            continue
+        info = store.info(name)
+        if "trace_height" not in info:
+            ink, height = svg_bounds(store.read(name, ".svg"))
+            store.set_info(name, ink=ink, trace_height=height)
+            info = store.info(name)
+        names.append(name)
+        bounds.append(
+            imported_bounds(info["ink"], info["trace_height"], ascent, descent)
+        )
+        centering.append(glyph_centering(glyph_object))
+    if not names:
+        return
+    for name, placement in zip(
+        names, placements(bounds, centering, version_major, ascent, descent)
+    ):
+        store.set_info(name, placement=placement.tolist())
@@ -1,36 +1,195 @@
 from PIL import Image, ImageChops
+import numpy as np
+import io
 import os
 import shutil
-import subprocess
 import json
 
+from handwrite.limits import Limits
+from handwrite.placement import svg_bounds
+from handwrite.progress import as_progress
+from handwrite.glyphstore import open_store, DirectoryStore
+
+# Pixels darker than this (in red or green) are ink
+DEFAULT_THRESHOLD = 200
+
+WHITE = np.array([255, 255, 255, 0], np.uint8)
+BLACK = np.array([0, 0, 0, 1], np.uint8)
 
 
 class PotraceNotFound(Exception):
     pass
 
 
+def ink_levels(pixels):
+    """Darkness of each pixel of an RGBA array, as compared to the threshold.
+
+    A pixel is ink if its red or green is below the threshold, so this is
+    the smaller of the two.
+    """
+    return np.minimum(pixels[..., 0], pixels[..., 1])
+
+
+def histograms(levels):
+    """Histogram (256 bins) of each image of a stack of ink levels, at once."""
+    count = len(levels)
+    flat = levels.reshape(count, -1).astype(np.int64) + 256 * np.arange(count)[:, None]
+    return np.bincount(flat.ravel(), minlength=256 * count).reshape(count, 256)
+
+
+def otsu_thresholds(hist):
+    """Otsu's threshold of each histogram.
+
+    Parameters
+    ----------
+    hist : numpy.ndarray
+        One histogram (256 bins), or a stack of them.
+
+    Returns
+    -------
+    numpy.ndarray
+        For each histogram, the threshold (pixels below it are ink) that
+        best separates its two classes of pixels. 256 for histograms with
+        a single level, where there's nothing to separate.
+    """
+    hist = np.atleast_2d(hist).astype(float)
+    p = hist / np.maximum(hist.sum(axis=1, keepdims=True), 1)
+    omega = np.cumsum(p, axis=1)
+    mu = np.cumsum(p * np.arange(256), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu[:, -1:] * omega - mu) ** 2 / (omega * (1 - omega))
+    between = np.nan_to_num(between)
+    return np.where(between.max(axis=1) > 0, between.argmax(axis=1) + 1, 256)
+
+
+def cell_threshold(levels, metadata):
+    """Threshold for one cell, from metadata["threshold"].
+
+    That's a number, or "otsu" for Otsu's threshold of the cell. Otsu's
+    threshold is never above DEFAULT_THRESHOLD, since blank cells have no
+    ink to separate from the paper.
+    """
+    setting = (metadata or {}).get("threshold") or DEFAULT_THRESHOLD
+    if setting == "otsu":
+        return min(int(otsu_thresholds(histograms(levels[None]))[0]), DEFAULT_THRESHOLD)
+    return int(setting)
+
+
 class PNGtoSVG:
-    """Converter class to convert character PNGs to BMPs and SVGs."""
+    """Converter class to convert character PNGs to BMPs and SVGs.
+
+    Parameters
+    ----------
+    progress : callable or handwrite.progress.Progress, optional
+        Gets a "pngtosvg" stage event, and an event for each glyph traced.
+    limits : handwrite.limits.Limits, optional
+        Timeout, resource limits and retries of each potrace run.
+    """
+
+    def __init__(self, progress=None, limits=None):
+        self.progress = as_progress(progress)
+        self.limits = limits or Limits()
 
     def convert(self, metadata, directory):
-        print("PNGtoSVG", end="\r")
         """Call converters on each .png in the provider directory.
 
-        Walk through the custom directory containing all .png files
-        from sheettopng and convert them to png -> bmp -> svg.
+        Go through the glyphs sheettopng wrote in the custom directory (not
+        its debug images) and convert them png -> bmp -> svg. The bounds of
+        each traced outline go in the glyph store's index, for placing it
+        in the font (see handwrite.placement).
+        """
+        store = open_store(directory, metadata)
+        if not isinstance(store, DirectoryStore):
+            self.convert_store(store, metadata)
+            return
+
+        with store:
+            names = list(store.names(".png"))
+            with self.progress.stage("pngtosvg", len(names)):
+                for name in names:
+                    path = store.path(name, "")
+                    self.pngToBmp(path + ".png", metadata)
+                    # self.trim(path + ".bmp")
+                    self.bmpToSvg(path + ".bmp")
+                    with open(path + ".svg", "rb") as f:
+                        self.record_bounds(store, name, f.read())
+                    self.progress.glyph("pngtosvg", name)
+
+    def convert_store(self, store, metadata):
+        """Convert every glyph of a glyph store from PNG to BMP and SVG, in memory."""
+        with store:
+            names = list(store.names(".png"))
+            with self.progress.stage("pngtosvg", len(names)):
+                for name in names:
+                    self.convert_glyph(store, name, metadata)
+                    self.progress.glyph("pngtosvg", name)
+
+    def convert_glyph(self, store, name, metadata):
+        """Threshold and trace one glyph of a glyph store.
+
+        Returns
+        -------
+        bytes
+            The SVG, as also written to the store.
+        """
+        return self.save_svg(
+            store, name, self.trace(self.glyph_bmp(store, name, metadata))
+        )
+
+    def trace_levels(self, store, name, levels, metadata):
+        """Threshold and trace one glyph whose ink levels are already known.
+
+        Like convert_glyph, for cells prepared by handwrite.cells.CellPool.
         """
-        num_characters = 0
-        path = os.walk(directory)
-        for root, dirs, files in path:
-            for f in files:
-                if f.endswith(".png"):
-                    num_characters += 1
-                    print("PNGtoSVG", str(f[0:-4]).ljust(14, " ")[:14], "".join("." for i in range(num_characters//8)), end="\r")
-                    self.pngToBmp(root + "/" + f, metadata)
-                    # self.trim(root + "/" + f[0:-4] + ".bmp")
-                    self.bmpToSvg(root + "/" + f[0:-4] + ".bmp")
-        print("PNGtoSVG                                                                      ")
+        bmp = io.BytesIO()
+        self.threshold_levels(levels, metadata).save(bmp, format="BMP")
+        store.write(name, ".bmp", bmp.getvalue())
+        return self.save_svg(store, name, self.trace(bmp.getvalue()))
+
+    def glyph_bmp(self, store, name, metadata):
+        """Threshold one glyph of a glyph store, and write (and return) its BMP."""
+        img = Image.open(io.BytesIO(store.read(name, ".png")))
+        bmp = io.BytesIO()
+        self.threshold(img, metadata).save(bmp, format="BMP")
+        store.write(name, ".bmp", bmp.getvalue())
+        return bmp.getvalue()
+
+    def save_svg(self, store, name, svg):
+        """Write a glyph's traced SVG to the glyph store, and note its bounds."""
+        store.write(name, ".svg", svg)
+        self.record_bounds(store, name, svg)
+        return svg
+
+    def record_bounds(self, store, name, svg):
+        """Note the bounds of a glyph's traced outline in the glyph store's index."""
+        ink, height = svg_bounds(svg)
+        store.set_info(name, ink=ink, trace_height=height)
+
+    def trace(self, bmp):
+        """Convert a BMP to SVG with potrace, through pipes instead of files.
+
+        Parameters
+        ----------
+        bmp : bytes
+            Contents of the .bmp file.
+
+        Returns
+        -------
+        bytes
+            Contents of the .svg file.
+
+        Raises
+        ------
+        PotraceNotFound
+            Raised if potrace not found in path by shutil.which()
+        handwrite.limits.ToolError
+            If potrace fails, or takes too long (see self.limits).
+        """
+        if shutil.which("potrace") is None:
+            raise PotraceNotFound("Potrace is either not installed or not in path")
+        return self.limits.run(
+            "potrace", ["potrace", "--backend", "svg", "--output", "-"], input=bmp
+        )
 
     def bmpToSvg(self, path):
         """Convert .bmp image to .svg using potrace.
@@ -48,11 +207,16 @@ class PNGtoSVG:
         ------
         PotraceNotFound
             Raised if potrace not found in path by shutil.which()
+        handwrite.limits.ToolError
+            If potrace fails, or takes too long (see self.limits).
         """
         if shutil.which("potrace") is None:
             raise PotraceNotFound("Potrace is either not installed or not in path")
         else:
-            subprocess.run(["potrace", path, "--backend", "svg", "--output", path[0:-4] + ".svg",])
+            self.limits.run(
+                "potrace",
+                ["potrace", path, "--backend", "svg", "--output", path[0:-4] + ".svg"],
+            )
             # note: the --margin parameter doesn't help me here
 
     def pngToBmp(self, path, metadata):
@@ -73,6 +237,10 @@ class PNGtoSVG:
             Raised if potrace not found in path by shutil.which()
         """
 
+        self.threshold(Image.open(path), metadata).save(path[0:-4] + ".bmp")
+
+    def trace_size(self, metadata):
+        """Size (width, height) cells are resized to before tracing, for the sheet version."""
         from packaging.version import Version
         sheet_version = metadata.get("sheetversion") or "99999999.999999.999999"
         if Version(sheet_version) < Version("2.1"):
@@ -103,19 +271,43 @@ class PNGtoSVG:
             # glyph_width  = 576 # really huge, probably
             # glyph_height = 768
 
+        return glyph_width, glyph_height
+
+    def resize(self, img, metadata):
+        """Resize a cell to the sheet version's tracing size, as RGBA."""
+        glyph_width, glyph_height = self.trace_size(metadata)
+        return img.convert("RGBA").resize((glyph_width, glyph_height))
 
-        img = Image.open(path).convert("RGBA").resize((glyph_width, glyph_height))
+    def threshold(self, img, metadata):
+        """Resize a cell to the sheet version's tracing size, and threshold it.
+
+        Parameters
+        ----------
+        img : PIL.Image.Image
+            The cell, as cut from the sheet.
+        metadata : dict
+            Dictionary containing the metadata (sheetversion, threshold, ...)
+
+        Returns
+        -------
+        PIL.Image.Image
+            RGBA image where ink is opaque black and the rest is transparent white.
+        """
+        pixels = np.asarray(self.resize(img, metadata))
+        threshold = cell_threshold(ink_levels(pixels), metadata)
 
         # Threshold image to convert each pixel to either black or white
-        threshold = 200
-        data = []
-        for pix in list(img.getdata()):
-            if pix[0] >= threshold and pix[1] >= threshold and pix[3] >= threshold:
-                data.append((255, 255, 255, 0))
-            else:
-                data.append((0, 0, 0, 1))
-        img.putdata(data)
-        img.save(path[0:-4] + ".bmp")
+        white = (
+            (pixels[..., 0] >= threshold)
+            & (pixels[..., 1] >= threshold)
+            & (pixels[..., 3] >= threshold)
+        )
+        return Image.fromarray(np.where(white[..., None], WHITE, BLACK), "RGBA")
+
+    def threshold_levels(self, levels, metadata):
+        """Threshold a cell from its ink levels (of an opaque cell, at the tracing size)."""
+        white = levels >= cell_threshold(levels, metadata)
+        return Image.fromarray(np.where(white[..., None], WHITE, BLACK), "RGBA")
 
     def trim(self, im_path):
         im = Image.open(im_path)
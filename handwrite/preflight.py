@@ -0,0 +1,497 @@
+"""Quick checks of a sheet (and the tools) before any expensive stage runs.
+
+A bad scan otherwise crashes halfway through SHEETtoPNG, or only shows up
+after potrace and FontForge have run. These checks work on a downscaled
+copy of the sheet and take a fraction of a second.
+"""
+
+import os
+import shutil
+
+# Geometry of each sheet version, in grid units (roughly 0.125cm on the
+# printed page for version 2, 1/6cm for version 3):
+#   row_w, row_h: the row box (black line),
+#   hor_padding, ver_padding: between the row box and the first scan area,
+#   scan_w, scan_h: each glyph's scan area (20 per row),
+#   glyph_w: the visible gray squares, smaller than the scan area to help
+#       with human and scanning errors,
+#   scan_hor_padding: between the scan area and its gray square.
+SHEET_GRIDS = {
+    2: {
+        "row_w": 164,
+        "row_h": 12,
+        "hor_padding": 2,
+        "ver_padding": 1,
+        "scan_w": 8,
+        "scan_h": 10,
+        "glyph_w": 7,
+        "scan_hor_padding": 0.5,
+    },
+    3: {
+        "row_w": 126,
+        "row_h": 12,
+        "hor_padding": 3,
+        "ver_padding": 2,
+        "scan_w": 6,
+        "scan_h": 8,
+        "glyph_w": 4,
+        "scan_hor_padding": 1,
+    },
+}
+# Each sheet version's row box, and width of a glyph's scan area
+ROW_GRIDS = {
+    version: (grid["row_w"], grid["row_h"]) for version, grid in SHEET_GRIDS.items()
+}
+SCAN_WIDTHS = {version: grid["scan_w"] for version, grid in SHEET_GRIDS.items()}
+
+MIN_SIDE = 600  # pixels
+MAX_PIXELS = 200 * 1000 * 1000
+MIN_CELL_WIDTH = 20  # pixels, below that potrace has nothing to trace
+ASPECT_TOLERANCE = 0.1  # measured row aspect vs the sheet version's
+# Sheet version a sheet is taken for when its row boxes look like a major
+# version's. 2.0 sheets have the same layout as 2.1, and are only traced
+# with less detail.
+DETECTED_VERSIONS = {2: "2.1", 3: "3"}
+PREVIEW_SIDE = 1200  # the downscaled copy's long side is at least this
+
+
+class Problem:
+    """One thing wrong with the input.
+
+    Parameters
+    ----------
+    check : str
+        Which check failed: "image", "size", "rows", "aspect" or "tools".
+    message : str
+        What's wrong, and what to do about it.
+    details : dict, optional
+        Measurements behind the message (JSON-serializable).
+    """
+
+    def __init__(self, check, message, **details):
+        self.check = check
+        self.message = message
+        self.details = details
+
+    def as_dict(self):
+        return dict(check=self.check, message=self.message, **self.details)
+
+    def __repr__(self):
+        return "Problem(%r, %r)" % (self.check, self.message)
+
+
+class PreflightError(ValueError):
+    """The sheet can't be converted. `problems` lists everything that's wrong."""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__(
+            "\n".join(
+                "%s: %s" % (problem.check, problem.message) for problem in problems
+            )
+        )
+
+    def as_dict(self):
+        return {"problems": [problem.as_dict() for problem in self.problems]}
+
+
+def sheet_list(sheet):
+    """A sheet path, or a list of them (one per page), as a list."""
+    return [sheet] if isinstance(sheet, str) else list(sheet)
+
+
+def sheet_major_version(metadata=None):
+    """Major version of the sheet layout (2 or 3). Sheets without a version are v3."""
+    from packaging.version import Version
+
+    sheet_version = (metadata or {}).get("sheetversion") or "99999999.999999.999999"
+    return 2 if Version(sheet_version) < Version("3") else 3
+
+
+def sheet_grid(metadata=None):
+    """SHEET_GRIDS entry of the sheet version in `metadata`."""
+    return SHEET_GRIDS[sheet_major_version(metadata)]
+
+
+def row_grid(metadata=None):
+    """(grid_row_w, grid_row_h) of the sheet version in `metadata`."""
+    return ROW_GRIDS[sheet_major_version(metadata)]
+
+
+def row_sides(contour):
+    """Width and height of a row box as it's drawn, the longer side first.
+
+    These are the sides of the contour's minimum-area rectangle. Unlike the
+    bounding box, it doesn't get taller when the sheet is tilted.
+    """
+    import cv2
+
+    _, (width, height), _ = cv2.minAreaRect(contour)
+    return max(width, height), min(width, height)
+
+
+def find_rows(gray, threshold_value=200, rows=9, sides=False):
+    """Find the row boxes of a grayscale sheet, like SHEETtoPNG does.
+
+    Returns
+    -------
+    list of tuple
+        Bounding boxes (x, y, w, h) of the (at most) `rows` biggest four-sided
+        contours, that are at least half as big as the biggest one, top to bottom.
+    list of tuple
+        Only with `sides`: the width and height of each of those row boxes,
+        as drawn (see row_sides).
+    """
+    import cv2
+
+    _, thresh = cv2.threshold(gray, threshold_value, 255, 1)
+    close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    close = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, close_kernel, iterations=2)
+    contours, _ = cv2.findContours(close, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    found = sorted(
+        (
+            (cv2.boundingRect(cnt), cnt)
+            for cnt in contours
+            if len(cv2.approxPolyDP(cnt, 0.01 * cv2.arcLength(cnt, True), True)) == 4
+        ),
+        key=lambda row: row[0][2] * row[0][3],
+        reverse=True,
+    )[:rows]
+    if found:
+        biggest = found[0][0][2] * found[0][0][3]
+        found = [row for row in found if row[0][2] * row[0][3] >= biggest / 2]
+    found.sort(key=lambda row: row[0][1])
+    boxes = [box for box, _ in found]
+    if sides:
+        return boxes, [row_sides(cnt) for _, cnt in found]
+    return boxes
+
+
+def detect_sheet_version(boxes):
+    """Major sheet version whose row boxes have the aspect of `boxes`.
+
+    Rows are 164x12 grid units on version 2 sheets and 126x12 on version 3
+    ones, so the width over height of the row boxes is enough to tell them
+    apart, whatever the resolution of the scan.
+
+    Parameters
+    ----------
+    boxes : list of tuple
+        The width and height of each row box, as drawn (like find_rows
+        returns with `sides`), or row boxes (x, y, w, h) of a straight
+        sheet. On a tilted sheet, the bounding boxes are too tall.
+
+    Returns
+    -------
+    int or None
+        2 or 3, or None if there are no boxes, or they don't look like
+        either version's.
+    """
+    import statistics
+
+    if not boxes:
+        return None
+    aspect = statistics.median(box[-2] / box[-1] for box in boxes)
+    for version, (grid_row_w, grid_row_h) in ROW_GRIDS.items():
+        if abs(aspect / (grid_row_w / grid_row_h) - 1) <= ASPECT_TOLERANCE:
+            return version
+    return None
+
+
+def sheet_version(sheet, threshold_value=200, rows=9):
+    """The sheet version of a sheet, worked out from its row boxes.
+
+    Parameters
+    ----------
+    sheet : str or list or bytes or numpy.ndarray
+        Path to the sheet, or the sheet itself: the file's contents or the
+        pixels (grayscale or BGR). Of a list of pages, the first one is used.
+
+    Returns
+    -------
+    str or None
+        A version for metadata's "sheetversion" (see DETECTED_VERSIONS), or
+        None if the row boxes can't be found, or don't look like any
+        version's.
+    """
+    import cv2
+
+    if isinstance(sheet, list):
+        sheet = sheet[0]
+    if isinstance(sheet, (str, bytes)):
+        preview = read_preview(sheet)[0]
+        if preview is None:
+            return None
+    else:
+        preview = sheet if sheet.ndim == 2 else cv2.cvtColor(sheet, cv2.COLOR_BGR2GRAY)
+        factor = max(preview.shape) / PREVIEW_SIDE
+        if factor >= 2:
+            preview = cv2.resize(
+                preview,
+                (round(preview.shape[1] / factor), round(preview.shape[0] / factor)),
+                interpolation=cv2.INTER_AREA,
+            )
+    _, sides = find_rows(preview, threshold_value, rows, sides=True)
+    version = detect_sheet_version(sides)
+    return None if version is None else DETECTED_VERSIONS[version]
+
+
+def with_sheet_version(sheet, config, metadata=None):
+    """`metadata`, with the "sheetversion" worked out from the sheet if it has none.
+
+    Parameters
+    ----------
+    sheet : str or list or bytes or numpy.ndarray
+        Like sheet_version.
+    config : str or dict
+        Path to the config file, or its contents, for "threshold_value".
+
+    Returns
+    -------
+    dict
+        A copy of `metadata`. Left without a version if it can't be told,
+        in which case the sheet is taken for a version 3 one (and preflight
+        says what's wrong with it).
+    """
+    import json
+
+    metadata = dict(metadata or {})
+    if metadata.get("sheetversion"):
+        return metadata
+    if isinstance(config, str):
+        with open(config) as f:
+            config = json.load(f)
+    version = sheet_version(sheet, config.get("threshold_value", 200))
+    if version is not None:
+        metadata["sheetversion"] = version
+    return metadata
+
+
+def read_preview(sheet):
+    """Decode a downscaled grayscale copy of the sheet (a path, or the file's contents).
+
+    Returns
+    -------
+    (numpy.ndarray or None, (int, int) or None, int)
+        The preview (None if it can't be decoded), the full size (width,
+        height) from the file header, and the downscaling factor.
+    """
+    import io
+
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(
+            io.BytesIO(sheet) if isinstance(sheet, bytes) else sheet
+        ) as header:
+            size = header.size
+    except (OSError, ValueError):
+        return None, None, 1
+    factor = 1
+    for reduced in (2, 4, 8):
+        if max(size) / reduced >= PREVIEW_SIDE:
+            factor = reduced
+    flags = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }
+    if isinstance(sheet, bytes):
+        return cv2.imdecode(np.frombuffer(sheet, np.uint8), flags[factor]), size, factor
+    return cv2.imread(sheet, flags[factor]), size, factor
+
+
+def check_sheet(sheet, metadata=None, threshold_value=200, rows=9):
+    """Check that a sheet looks convertible.
+
+    Parameters
+    ----------
+    sheet : str
+        Path to the sheet.
+    metadata : dict, optional
+        Only "sheetversion" is used.
+    threshold_value : int, default=200
+        Same as the config's "threshold_value".
+    rows : int, default=9
+        Number of rows of the sheet.
+
+    Returns
+    -------
+    (list of Problem, list of tuple)
+        Everything that's wrong (empty if nothing is), and the row boxes
+        (x, y, w, h) in full-size pixels, top to bottom.
+    """
+    if not os.path.isfile(sheet):
+        return [Problem("image", "no such file: " + sheet)], []
+    preview, size, factor = read_preview(sheet)
+    if preview is None:
+        return [Problem("image", "not an image, or in a format OpenCV can't read")], []
+
+    width, height = size
+    if min(width, height) < MIN_SIDE:
+        return [
+            Problem(
+                "size",
+                "the image is %dx%d pixels, scan it at %d pixels or more on each side"
+                % (width, height, MIN_SIDE),
+                width=width,
+                height=height,
+            )
+        ], []
+    if width * height > MAX_PIXELS:
+        return [
+            Problem(
+                "size",
+                "the image is %dx%d pixels, that's too big: scan it at a lower resolution"
+                % (width, height),
+                width=width,
+                height=height,
+            )
+        ], []
+
+    boxes, sides = find_rows(preview, threshold_value, rows, sides=True)
+    boxes = [tuple(value * factor for value in box) for box in boxes]
+    if len(boxes) < rows:
+        return [
+            Problem(
+                "rows",
+                "found %d of the %d row boxes: check that the whole sheet is in "
+                "the scan, and that the black lines around each row are unbroken"
+                % (len(boxes), rows),
+                found=len(boxes),
+                expected=rows,
+            )
+        ], boxes
+
+    problems = []
+    version = sheet_major_version(metadata)
+    grid_row_w, grid_row_h = ROW_GRIDS[version]
+    expected = grid_row_w / grid_row_h
+    # measured along the rows, so a slightly tilted sheet (which is
+    # straightened before it's cut) passes
+    aspects = [w / h for w, h in sides]
+    bad = [
+        number
+        for number, aspect in enumerate(aspects, 1)
+        if abs(aspect / expected - 1) > ASPECT_TOLERANCE
+    ]
+    if bad:
+        message = (
+            "row %s should be %.2f times as wide as it is high for a version %d sheet, not %s"
+            % (
+                ", ".join(str(number) for number in bad),
+                expected,
+                version,
+                ", ".join("%.2f" % aspects[number - 1] for number in bad),
+            )
+        )
+        for other, (other_w, other_h) in ROW_GRIDS.items():
+            if other != version and all(
+                abs(aspect / (other_w / other_h) - 1) <= ASPECT_TOLERANCE
+                for aspect in aspects
+            ):
+                message += (
+                    ". It looks like a version %d sheet: pass --sheet-version %d"
+                    % (
+                        other,
+                        other,
+                    )
+                )
+        problems.append(
+            Problem(
+                "aspect",
+                message,
+                rows=bad,
+                aspects=[round(aspect, 3) for aspect in aspects],
+                expected=round(expected, 3),
+            )
+        )
+
+    cell_width = min(w for w, h in sides) * factor * SCAN_WIDTHS[version] / grid_row_w
+    if cell_width < MIN_CELL_WIDTH:
+        problems.append(
+            Problem(
+                "size",
+                "glyph cells are %.0f pixels wide, scan at a higher resolution so "
+                "they're at least %d" % (cell_width, MIN_CELL_WIDTH),
+                cell_width=round(cell_width, 1),
+            )
+        )
+    return problems, boxes
+
+
+def check_tools(metadata=None):
+    """Check that potrace and FontForge can be found, and uharfbuzz for specimens."""
+    from handwrite.svgtottf import fontforge_executable
+
+    problems = []
+    for tool in ["potrace", fontforge_executable()[0]]:
+        if shutil.which(tool) is None:
+            problems.append(
+                Problem(
+                    "tools",
+                    "%s isn't installed, or isn't in the PATH" % tool,
+                    tool=tool,
+                )
+            )
+    if (metadata or {}).get("specimen"):
+        import importlib.util
+
+        if importlib.util.find_spec("uharfbuzz") is None:
+            problems.append(
+                Problem(
+                    "tools",
+                    "uharfbuzz isn't installed, it's needed for specimens: pip install handwrite[specimen]",
+                    tool="uharfbuzz",
+                )
+            )
+    return problems
+
+
+def preflight(sheet, config, metadata=None, tools=True):
+    """Check the sheet and the tools, before converting anything.
+
+    Parameters
+    ----------
+    sheet : str or list of str
+        Path to the sheet, or to each page of a sheet set.
+    config : str
+        Path to the config file.
+    metadata : dict, optional
+        Only "sheetversion" is used.
+    tools : bool, default=True
+        Also check that potrace and FontForge are installed.
+
+    Returns
+    -------
+    list of tuple
+        The row boxes (x, y, w, h) of the sheet, top to bottom. For a
+        list of sheets, a list of those.
+
+    Raises
+    ------
+    PreflightError
+        With every problem found.
+    """
+    import json
+
+    with open(config) as f:
+        threshold_value = json.load(f).get("threshold_value", 200)
+    problems = []
+    pages = []
+    for path in sheet_list(sheet):
+        page_problems, boxes = check_sheet(path, metadata, threshold_value)
+        if not isinstance(sheet, str):
+            for problem in page_problems:
+                problem.message = "%s: %s" % (os.path.basename(path), problem.message)
+                problem.details["sheet"] = path
+        problems += page_problems
+        pages.append(boxes)
+    if tools:
+        problems += check_tools(metadata)
+    if problems:
+        raise PreflightError(problems)
+    return pages[0] if isinstance(sheet, str) else pages
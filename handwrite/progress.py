@@ -0,0 +1,167 @@
+"""Progress of a build, as events instead of lines on stdout.
+
+Converters take a `progress` callback (or a Progress), and call it with an
+Event when a stage starts or ends, and for each glyph a stage is done with.
+Without one they stay quiet. The CLI renders the events with
+TerminalProgress, the way the converters used to print them.
+"""
+
+import sys
+import time
+import threading
+import contextlib
+
+# How the CLI names each stage
+STAGE_LABELS = {
+    "sheettopng": "SHEETtoPNG",
+    "pngtosvg": "PNGtoSVG",
+    "fontforge": "SVGtoTTF",
+    "ligatures": "ligatures",
+}
+
+
+class Event:
+    """Something that happened during a build.
+
+    Parameters
+    ----------
+    kind : str
+        "start" and "end" of a stage, "glyph" when a stage is done with a
+        glyph, "skip" for a stage whose checkpoint is up to date, "cached"
+        for a build found in the build cache, and "message" for a line of
+        output from FontForge.
+    stage : str, optional
+        "sheettopng", "pngtosvg", "fontforge" or "ligatures".
+    details : dict, optional
+        glyph, done and total for "glyph" events, done and elapsed (in
+        seconds) for "end" events, and so on.
+    """
+
+    def __init__(self, kind, stage=None, **details):
+        self.kind = kind
+        self.stage = stage
+        self.details = details
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["details"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def as_dict(self):
+        return dict(kind=self.kind, stage=self.stage, **self.details)
+
+    def __repr__(self):
+        return "Event(%r, %r, %r)" % (self.kind, self.stage, self.details)
+
+
+class Progress:
+    """Sends events to a callback, and keeps count of the glyphs of each stage.
+
+    Thread-safe, so trace workers can share one.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Called with each Event. If None, events are dropped.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.done = {}
+        self.totals = {}
+        self.started = {}
+
+    def emit(self, kind, stage=None, **details):
+        if self.callback is not None:
+            self.callback(Event(kind, stage, **details))
+
+    def start(self, stage, total=None):
+        with self.lock:
+            self.done[stage] = 0
+            self.totals[stage] = total
+            self.started[stage] = time.perf_counter()
+        self.emit("start", stage, total=total)
+
+    def end(self, stage):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started.get(stage, time.perf_counter())
+            done = self.done.get(stage, 0)
+        self.emit("end", stage, done=done, elapsed=elapsed)
+
+    @contextlib.contextmanager
+    def stage(self, stage, total=None):
+        """Emit "start" and "end" around a stage. No "end" if it fails."""
+        self.start(stage, total)
+        yield self
+        self.end(stage)
+
+    def glyph(self, stage, name):
+        """One more glyph done by `stage`."""
+        with self.lock:
+            self.done[stage] = done = self.done.get(stage, 0) + 1
+            total = self.totals.get(stage)
+            # sent under the lock, so `done` arrives in order
+            self.emit("glyph", stage, glyph=name, done=done, total=total)
+
+
+def as_progress(progress):
+    """A Progress for a callback, a Progress, or None."""
+    if isinstance(progress, Progress):
+        return progress
+    return Progress(progress)
+
+
+class TerminalProgress:
+    """Render events on a terminal, as one line per stage.
+
+    Glyph events redraw the stage's line in place, at most every `interval`
+    seconds, so a fast stage doesn't spend its time writing to the terminal.
+
+    Parameters
+    ----------
+    stream : file, optional
+        Where to write (sys.stdout by default).
+    interval : float, default=0.05
+        Minimum time between two redraws of a stage's line, in seconds.
+    """
+
+    WIDTH = 78
+
+    def __init__(self, stream=None, interval=0.05):
+        self.stream = stream
+        self.interval = interval
+        self.last_draw = 0
+
+    def write(self, text):
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
+
+    def __call__(self, event):
+        label = STAGE_LABELS.get(event.stage, event.stage)
+        if "style" in event.details:
+            # building a family
+            label = "%s %s" % (event.style, label)
+        if event.kind == "start":
+            self.write(label + "\r")
+        elif event.kind == "glyph":
+            now = time.perf_counter()
+            if now - self.last_draw < self.interval and event.done != event.total:
+                return
+            self.last_draw = now
+            line = "%s %s %s" % (
+                label,
+                event.glyph.ljust(14)[:14],
+                "." * (event.done // 8),
+            )
+            self.write(line[: self.WIDTH] + "\r")
+        elif event.kind == "end":
+            self.write(label.ljust(self.WIDTH) + "\n")
+        elif event.kind == "skip":
+            self.write("%s is up to date, skipping\n" % event.stage)
+        elif event.kind == "cached":
+            self.write("Found in cache: %s\n" % event.key)
+        elif event.kind == "message":
+            self.write(event.text.rstrip("\n").ljust(self.WIDTH) + "\n")
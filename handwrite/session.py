@@ -0,0 +1,371 @@
+"""Build fonts from images in memory, over and over, with the setup done once.
+
+`handwrite.converters` reads the sheet from a file and writes the font and
+its web page to a directory. A Session takes the sheet as bytes (or an
+already decoded image) and returns the font as bytes, with everything in
+between kept in memory. Only FontForge still writes a file, the font
+without ligatures, to a temp directory that's removed right after.
+
+What doesn't change between builds is set up once per session: the parsed
+config, the row layout of the sheets, the compiled ligature features, the
+trace threads and the cell worker processes (see handwrite.cells).
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from handwrite.progress import as_progress
+
+
+class BuildResult:
+    """What Session.build returns.
+
+    Attributes
+    ----------
+    font : bytes
+        The TTF.
+    html : str
+        The example web page. It loads the font from `filename`.
+    filename : str
+        File name of the font, like handwrite would save it.
+    stats : dict
+        "glyphs" (number traced), "pages", "font_bytes", and "seconds":
+        how long each stage took.
+    specimens : dict
+        Size to specimen PNG, for the sizes of the metadata's "specimen"
+        (see handwrite.specimen). Empty without one.
+    """
+
+    def __init__(self, font, html, filename, stats, specimens=None):
+        self.font = font
+        self.html = html
+        self.filename = filename
+        self.stats = stats
+        self.specimens = specimens or {}
+
+    def __repr__(self):
+        return "BuildResult(%r, %d bytes)" % (self.filename, len(self.font))
+
+
+def decode_sheet(sheet):
+    """A sheet given as bytes (any format OpenCV reads) or an array, as BGR pixels."""
+    if isinstance(sheet, np.ndarray):
+        image = sheet
+    else:
+        image = cv2.imdecode(np.frombuffer(sheet, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Not an image, or in a format OpenCV can't read")
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    return image
+
+
+def hash_sheet(sheet):
+    """Hash a sheet given as bytes or as an array, like checkpoint.hash_file."""
+    if isinstance(sheet, np.ndarray):
+        digest = hashlib.sha256(str((sheet.shape, sheet.dtype.str)).encode("utf-8"))
+        digest.update(np.ascontiguousarray(sheet).data)
+        return digest.hexdigest()
+    return hashlib.sha256(sheet).hexdigest()
+
+
+class Session:
+    """Convert sheets in memory, reusing what can be reused between builds.
+
+    Parameters
+    ----------
+    config : str, optional
+        Path to config file. handwrite's default.json by default.
+    workers : int, optional
+        Number of trace threads. Defaults to the number of CPUs.
+    cell_workers : int, optional
+        Prepare cells in this many processes (see handwrite.cells). In
+        the trace threads' process by default.
+    check : bool, default=True
+        Check that potrace and FontForge are installed, once.
+    limits : handwrite.limits.Limits, optional
+        Timeouts, resource limits and retries of potrace and FontForge. A
+        deadline applies to each build.
+
+    Raises
+    ------
+    handwrite.preflight.PreflightError
+        If `check` and a tool is missing.
+    """
+
+    def __init__(
+        self, config=None, workers=None, cell_workers=None, check=True, limits=None
+    ):
+        from handwrite.cells import CellPool
+        from handwrite.layout import LayoutCache
+        from handwrite.limits import Limits
+        from handwrite.sheettopng import SHEETtoPNG, page_count
+        from handwrite.svgtottf import CompiledFeatures
+
+        if config is None:
+            config = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "default.json"
+            )
+        self.config = config
+        with open(config, "rb") as f:
+            contents = f.read()
+        self.config_hash = hashlib.sha256(contents).hexdigest()
+        self.config_data = json.loads(contents)
+        self.glyphs = self.config_data.get("glyphs-fancy", [])
+        self.pages = page_count(self.glyphs)
+        if check:
+            from handwrite.preflight import PreflightError, check_tools
+
+            problems = check_tools()
+            if problems:
+                raise PreflightError(problems)
+
+        self.layout_cache = LayoutCache(None)
+        self.features = CompiledFeatures()
+        self.cutter = SHEETtoPNG(self.layout_cache)
+        self.cell_pool = CellPool(cell_workers or 1)
+        self.limits = limits or Limits()
+        self.executor = ThreadPoolExecutor(workers or os.cpu_count() or 1)
+
+    def close(self):
+        self.executor.shutdown()
+        self.cell_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def build_key(self, sheet, metadata):
+        """Like cache.build_key, for sheets in memory.
+
+        A sheet's bytes hash like the file they were read from, so the same
+        build gets the same key either way.
+        """
+        from handwrite import __version__
+        from handwrite.checkpoint import hash_json
+
+        if isinstance(sheet, list):
+            sheet_hash = [hash_sheet(page) for page in sheet]
+        else:
+            sheet_hash = hash_sheet(sheet)
+        return hash_json(
+            {
+                "sheet": sheet_hash,
+                "config": self.config_hash,
+                "metadata": metadata,
+                "handwrite": __version__,
+            }
+        )
+
+    def build(self, sheet, metadata=None, deterministic=False, progress=None):
+        """Build a font from a sheet in memory.
+
+        Parameters
+        ----------
+        sheet : bytes or numpy.ndarray or list
+            The sheet as an image file's contents or as decoded pixels (BGR,
+            like OpenCV's), or a list of those, one per page.
+        metadata : dict, optional
+            Dictionary containing the metadata (filename, family, ...)
+        deterministic : bool, default=False
+            Reproducible output, like `handwrite --deterministic`.
+        progress : callable or handwrite.progress.Progress, optional
+            Gets the build's events.
+
+        Returns
+        -------
+        BuildResult
+
+        Raises
+        ------
+        handwrite.limits.ToolError
+            If potrace or FontForge fails, or runs out of time (see Limits).
+        """
+        from handwrite.glyphstore import MemoryStore
+        from handwrite.pngtosvg import PNGtoSVG
+        from handwrite.placement import write_placements
+        from handwrite.preflight import sheet_major_version, with_sheet_version
+        from handwrite.sheettopng import page_cells, sheet_size
+        from handwrite.svgtottf import (
+            SVGtoTTF,
+            font_extension,
+            relay_progress,
+            write_stream_record,
+        )
+
+        pages = list(sheet) if isinstance(sheet, list) else [sheet]
+        if self.pages > len(pages):
+            raise ValueError(
+                "The config has glyphs on %d pages, but only %d sheets were given"
+                % (self.pages, len(pages))
+            )
+        metadata = with_sheet_version(pages, self.config_data, metadata)
+        if deterministic:
+            metadata["deterministic"] = True
+            metadata["buildid"] = self.build_key(sheet, metadata)
+        progress = as_progress(progress)
+        reporting = progress.callback is not None
+        threshold_value = self.config_data.get("threshold_value", 200)
+        props = self.config_data["props"]
+        seconds = {}
+        store = MemoryStore()
+        limits = self.limits.start()
+        tracer = PNGtoSVG(limits=limits)
+
+        # cut every page, and trace its cells while the next one's cut
+        started = time.perf_counter()
+        traced = []
+        with progress.stage("sheettopng"):
+            for page, image in enumerate(pages):
+                characters = self.cutter.detect_characters(
+                    None, decode_sheet(image), threshold_value, metadata
+                )
+                names = page_cells(self.glyphs, page)
+                sheet_shape = sheet_size(characters)
+                cells, levels = self.cell_pool.levels(characters, names, metadata)
+                for cell, cell_levels in zip(cells, levels):
+                    store.set_info(
+                        names[cell],
+                        page=page,
+                        cell=[float(x) for x in characters[cell][1:5]],
+                        sheet=sheet_shape,
+                    )
+                    traced.append(
+                        self.executor.submit(
+                            tracer.trace_levels,
+                            store,
+                            names[cell],
+                            cell_levels,
+                            metadata,
+                        )
+                    )
+                    progress.glyph("sheettopng", names[cell])
+                del characters, levels
+        seconds["sheettopng"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with progress.stage("pngtosvg", len(traced)):
+            for future in traced:
+                future.result()
+        write_placements(
+            store,
+            self.glyphs,
+            sheet_major_version(metadata),
+            props.get("ascent", 800),
+            props.get("descent", 200),
+        )
+        seconds["pngtosvg"] = time.perf_counter() - started
+
+        converter = SVGtoTTF(progress, limits)
+        converter.metadata = metadata
+        converter.config = json.loads(json.dumps(self.config_data))
+        filename = metadata.get("filename") or props.get("filename")
+        if filename is None:
+            raise NameError("filename not found in config file.")
+        family = metadata.get("family") or filename
+        extension = font_extension(metadata)
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            with progress.stage("fontforge", len(store.names(".svg"))):
+
+                def stream():
+                    fontforge = limits.popen(
+                        "fontforge",
+                        converter.fontforge_command(
+                            directory,
+                            self.config,
+                            metadata,
+                            stream=True,
+                            progress=reporting,
+                        ),
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE if reporting else subprocess.DEVNULL,
+                        env=converter.fontforge_env(metadata),
+                    )
+                    if reporting:
+                        relay = threading.Thread(
+                            target=relay_progress, args=(fontforge.stdout, progress)
+                        )
+                        relay.start()
+                    try:
+                        for glyph in self.glyphs:
+                            name = glyph.get("name")
+                            if name is not None and store.exists(name, ".svg"):
+                                write_stream_record(
+                                    fontforge.stdin,
+                                    name,
+                                    store.read(name, ".svg"),
+                                    store.info(name)["placement"],
+                                )
+                        fontforge.stdin.close()
+                    except OSError:
+                        # FontForge is gone: wait() says why
+                        pass
+                    except BaseException:
+                        fontforge.kill()
+                        raise
+                    finally:
+                        try:
+                            fontforge.wait()
+                        finally:
+                            if reporting:
+                                relay.join()
+
+                # the glyphs are all still in memory, so this can be retried
+                limits.retry(stream)
+            seconds["fontforge"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            progress.start("ligatures")
+            tt = converter.ligature_font(
+                os.path.join(directory, filename + " without ligatures" + extension),
+                converter.ligature_features(),
+                self.features,
+            )
+            font = io.BytesIO()
+            tt.save(font)
+        filename = (
+            filename + extension if not filename.endswith(extension) else filename
+        )
+        html = converter.web_page(filename, family, *converter.credits())
+        progress.end("ligatures")
+        seconds["ligatures"] = time.perf_counter() - started
+
+        specimens = {}
+        if metadata.get("specimen"):
+            from handwrite.specimen import SpecimenFont, render_specimen
+
+            started = time.perf_counter()
+            specimen_font = SpecimenFont(font.getvalue())
+            for size in metadata["specimen"]:
+                specimens[size] = render_specimen(
+                    specimen_font, size, metadata.get("specimenwidth")
+                )
+            seconds["specimen"] = time.perf_counter() - started
+
+        return BuildResult(
+            font.getvalue(),
+            html,
+            filename,
+            {
+                "glyphs": len(traced),
+                "pages": len(pages),
+                "font_bytes": len(font.getvalue()),
+                "seconds": seconds,
+            },
+            specimens,
+        )
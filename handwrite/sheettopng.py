@@ -2,22 +2,258 @@ import os
 import itertools
 import json
 import cv2
-from packaging.version import Version
+
+from handwrite.glyphstore import open_store
+from handwrite.preflight import (
+    PreflightError,
+    Problem,
+    detect_sheet_version,
+    row_sides,
+    sheet_grid,
+    sheet_list,
+)
+from handwrite.progress import as_progress
+
+# Glyphs that span two cells (or stretch across them), and get the part
+# of the scan area outside their gray box trimmed off: (sides, resize)
+# We'll have to do the same thing for long pi
+# and any other character that spans two cells
+TRIMMED_GLYPHS = {
+    "cartoucheStartTok": (["right"], False),
+    "bracketleft": (["right"], False),
+    "cartoucheEndTok": (["left"], False),
+    "bracketright": (["left"], False),
+    "cartoucheMiddleTok": (["right", "left"], True),
+    "underscore": (["right", "left"], True),
+}
+
+
+# Cells after the grid that are copies of a grid cell, for glyphs drawn
+# the same: (extra cell, grid cell). Cell 180, the cartouche middle, is cut
+# from the right cartouche by SHEETtoPNG.extra_cells.
+EXTRA_CELLS = [
+    # add Latin a e n o, necessary for ligatures
+    (181, 0),
+    (182, 9),
+    (183, 148),
+    (184, 68),
+    # add Latin [ _ ] . :, necessary for ligatures
+    (185, 120),
+    (186, 180),
+    (187, 121),
+    (188, 122),
+    (189, 123),
+]
+
+
+# Sheets whose row corners are further than this (a fraction of the row
+# height) from their bounding boxes' are straightened before they're cut
+DESKEW_TOLERANCE = 0.02
+
+
+def page_cells(glyphs, page=0, cols=20):
+    """Map the cells of one page to the names of the glyphs drawn in them.
+
+    A glyph in the config's "glyphs-fancy" list can give its "page" (0 by
+    default), "row" and "col". Glyphs without a "row" and "col" are in the
+    cell numbered like their position in the list, on the first page (the
+    cells after the grid, 180 and up, are the extra glyphs detect_characters
+    cuts out of other cells).
+
+    Parameters
+    ----------
+    glyphs : list of dict
+        The config's "glyphs-fancy" list.
+    page : int, default=0
+        Page number, counting from 0.
+    cols : int, default=20
+        Number of cells in each row of the sheet.
+
+    Returns
+    -------
+    dict
+        Cell number (as returned by detect_characters) to glyph name.
+    """
+    names = {}
+    for index, glyph in enumerate(glyphs):
+        if "name" not in glyph or glyph.get("page", 0) != page:
+            continue
+        if "row" in glyph and "col" in glyph:
+            cell = glyph["row"] * cols + glyph["col"]
+        elif "page" in glyph:
+            raise ValueError("Glyph %s has a page but no row and col" % glyph["name"])
+        else:
+            cell = index
+        if cell in names:
+            raise ValueError(
+                "Glyphs %s and %s are in the same cell (page %d, cell %d)"
+                % (names[cell], glyph["name"], page, cell)
+            )
+        names[cell] = glyph["name"]
+    return names
+
+
+def sheet_size(characters):
+    """[width, height] of the sheet that detect_characters cut `characters` from.
+
+    The cells are numpy views of the sheet, so that's the array they're views of.
+    """
+    import numpy as np
+
+    cells = characters.values() if isinstance(characters, dict) else characters
+    sheet = next(iter(cells))[0]
+    while isinstance(sheet.base, np.ndarray):
+        sheet = sheet.base
+    return [sheet.shape[1], sheet.shape[0]]
+
+
+def row_corners(contour):
+    """Top left, top right, bottom right and bottom left corners of a row box's contour."""
+    import numpy as np
+
+    quad = cv2.approxPolyDP(contour, 0.01 * cv2.arcLength(contour, True), True)
+    points = quad.reshape(-1, 2).astype(np.float64)
+    sums, differences = points.sum(axis=1), points[:, 0] - points[:, 1]
+    return np.array(
+        [
+            points[sums.argmin()],
+            points[differences.argmax()],
+            points[sums.argmax()],
+            points[differences.argmin()],
+        ]
+    )
+
+
+def deskew(image, contours, tolerance=DESKEW_TOLERANCE):
+    """Straighten a skewed sheet, by the corners of its row boxes.
+
+    A sheet photographed at an angle, or scanned a bit rotated, has row
+    boxes that aren't rectangles lined up with the image, so the cells cut
+    from their bounding boxes drift off the gray squares along each row.
+    One perspective warp maps the corners of the top and bottom row boxes
+    to a rectangle, which puts every row box back in line.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        The sheet.
+    contours : list of numpy.ndarray
+        Contours of the row boxes, like find_rows(..., contours=True) returns.
+    tolerance : float, default=DESKEW_TOLERANCE
+        Sheets whose row corners are this close to their bounding boxes'
+        (as a fraction of the row height) are left as they are. So are
+        sheets whose boxes aren't the rows of a known sheet (see
+        preflight.detect_sheet_version): the warp needs the top and bottom
+        rows.
+
+    Returns
+    -------
+    image : numpy.ndarray
+        The straightened sheet, or `image` itself.
+    boxes : list of tuple
+        (x, y, w, h) of the row boxes on it.
+    skew : float
+        How far off the row corners were, as a fraction of the row height.
+    """
+    import numpy as np
+
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    corners = [row_corners(contour) for contour in contours]
+    skew = max(
+        np.abs(
+            quad - [(x, y), (x + w - 1, y), (x + w - 1, y + h - 1), (x, y + h - 1)]
+        ).max()
+        / h
+        for quad, (x, y, w, h) in zip(corners, boxes)
+    )
+    if skew <= tolerance:
+        return image, boxes, skew
+    # the rows' own sizes, not their bounding boxes', which a tilt makes taller
+    if detect_sheet_version([row_sides(contour) for contour in contours]) is None:
+        return image, boxes, skew
+
+    corners.sort(key=lambda quad: quad[:, 1].mean())
+    top, bottom = corners[0], corners[-1]
+    source = np.float32([top[0], top[1], bottom[2], bottom[3]])
+    width = (
+        np.linalg.norm(top[1] - top[0]) + np.linalg.norm(bottom[2] - bottom[3])
+    ) / 2
+    height = (
+        np.linalg.norm(bottom[3] - top[0]) + np.linalg.norm(bottom[2] - top[1])
+    ) / 2
+    left, upper = top[0]
+    target = np.float32(
+        [
+            (left, upper),
+            (left + width, upper),
+            (left + width, upper + height),
+            (left, upper + height),
+        ]
+    )
+    transform = cv2.getPerspectiveTransform(source, target)
+    size = (
+        max(image.shape[1], int(np.ceil(left + width)) + 2),
+        max(image.shape[0], int(np.ceil(upper + height)) + 2),
+    )
+    straight = cv2.warpPerspective(
+        image, transform, size, flags=cv2.INTER_LINEAR, borderValue=(255, 255, 255)
+    )
+    boxes = [
+        cv2.boundingRect(
+            np.round(
+                cv2.perspectiveTransform(contour.astype(np.float32), transform)
+            ).astype(np.int32)
+        )
+        for contour in contours
+    ]
+    return straight, boxes, skew
+
+
+def debug_image(characters_dir, name, image):
+    """Write one of detect_characters' debug images, unless there's nowhere to."""
+    if characters_dir is not None:
+        cv2.imwrite(os.path.join(characters_dir, name + ".png"), image)
+
+
+def page_count(glyphs):
+    """Number of pages (sheets) the glyphs of a config are drawn on."""
+    return (
+        max((glyph.get("page", 0) for glyph in glyphs if "name" in glyph), default=0)
+        + 1
+    )
+
 
 class SHEETtoPNG:
-    """Converter class to convert input sample sheet to character PNGs."""
+    """Converter class to convert input sample sheet to character PNGs.
+
+    Parameters
+    ----------
+    layout_cache : handwrite.layout.LayoutCache, optional
+        Reuse the row boxes found on earlier sheets of the same size, when
+        they line up with this sheet, instead of searching for them.
+    progress : callable or handwrite.progress.Progress, optional
+        Gets a "sheettopng" stage event, and an event for each glyph cut.
+    """
+
+    def __init__(self, layout_cache=None, progress=None):
+        self.layout_cache = layout_cache
+        self.progress = as_progress(progress)
 
     def convert(self, sheet, characters_dir, config, metadata, cols=20, rows=9):
-        print("SHEETtoPNG")
         """Convert a sheet of sample writing input to a custom directory structure of PNGs.
 
         Detect all characters in the sheet as a separate contours and convert each to
         a PNG image in a temp/user provided directory.
 
+        Several sheets (pages) are converted one at a time, and each page's
+        image is released before the next one is read, so memory use doesn't
+        grow with the number of pages.
+
         Parameters
         ----------
-        sheet : str
-            Path to the sheet file to be converted.
+        sheet : str or list of str
+            Path to the sheet file to be converted, or to each page of the
+            sheet set, in order.
         characters_dir : str
             Path to directory to save characters in.
         config: str
@@ -29,17 +265,33 @@ class SHEETtoPNG:
         """
         with open(config) as f:
             threshold_value = json.load(f).get("threshold_value", 200)
-        if os.path.isdir(sheet):
-            raise IsADirectoryError("Sheet parameter should not be a directory.")
-        characters = self.detect_characters(
-            characters_dir, sheet, threshold_value, metadata, cols=cols, rows=rows
-        )
-        self.save_images(
-            characters, # more like cells
-            characters_dir,
-            config,
-            metadata
-        )
+        sheets = sheet_list(sheet)
+        for path in sheets:
+            if os.path.isdir(path):
+                raise IsADirectoryError("Sheet parameter should not be a directory.")
+        os.makedirs(characters_dir, exist_ok=True)
+        with self.progress.stage("sheettopng"), open_store(
+            characters_dir, metadata
+        ) as store:
+            for page, path in enumerate(sheets):
+                characters = self.detect_characters(
+                    characters_dir,
+                    path,
+                    threshold_value,
+                    metadata,
+                    cols=cols,
+                    rows=rows,
+                )
+                self.store_cells(
+                    store,
+                    characters,  # more like cells
+                    config,
+                    metadata,
+                    page,
+                    cols,
+                )
+                # let go of this page before reading the next one
+                del characters
 
     def detect_characters(self, characters_dir, sheet_image, threshold_value, metadata, cols=20, rows=9):
         """Detect contours on the input image and filter them to get only characters.
@@ -51,8 +303,11 @@ class SHEETtoPNG:
 
         Parameters
         ----------
-        sheet_image : str
-            Path to the sheet file to be converted.
+        characters_dir : str or None
+            Where to write the debug images (none without one).
+        sheet_image : str or numpy.ndarray
+            Path to the sheet file to be converted, or the sheet itself,
+            already decoded (BGR).
         threshold_value : int
             Value to adjust thresholding of the image for better contour detection.
         cols : int, default=8
@@ -69,46 +324,40 @@ class SHEETtoPNG:
         # TODO Raise errors and suggest where the problem might be
 
         # Read the image and convert to grayscale
-        image = cv2.imread(sheet_image)
-        cv2.imwrite(os.path.join(characters_dir, "1 image" + ".png"), image)
+        if isinstance(sheet_image, str):
+            image = cv2.imread(sheet_image)
+        else:
+            image = sheet_image
+        debug_image(characters_dir, "1 image", image)
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        cv2.imwrite(os.path.join(characters_dir, "2 grayscale" + ".png"), gray)
-
-        # Threshold and filter the image for better contour detection
-        _, thresh = cv2.threshold(gray, threshold_value, 255, 1)
-        cv2.imwrite(os.path.join(characters_dir, "3 threshold" + ".png"), thresh)
-        close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        close = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, close_kernel, iterations=2)
-        cv2.imwrite(os.path.join(characters_dir, "4 close" + ".png"), close)
-
-        # Search for contours.
-        contours, h = cv2.findContours(
-            close, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
-
-        # Filter contours based on number of sides and then reverse sort by area.
-        contours = sorted(
-            filter(
-                lambda cnt: len(
-                    cv2.approxPolyDP(cnt, 0.01 * cv2.arcLength(cnt, True), True)
-                )
-                == 4,
-                contours,
-            ),
-            key=cv2.contourArea,
-            reverse=True,
-        )
+        debug_image(characters_dir, "2 grayscale", gray)
+
+        row_boxes = None
+        if self.layout_cache is not None:
+            row_boxes = self.layout_cache.match(gray, metadata, threshold_value, rows)
+        if row_boxes is None:
+            row_boxes, contours = self.find_rows(
+                characters_dir, gray, threshold_value, rows, contours=True
+            )
+            straight, row_boxes = self.straighten(characters_dir, image, contours)
+            if straight is not image:
+                # cut everything from the straightened sheet
+                image = straight
+            elif self.layout_cache is not None:
+                # the boxes of a skewed sheet are on the straightened one,
+                # they wouldn't line up with the next sheet
+                self.layout_cache.put(gray, metadata, row_boxes)
 
         # for row in range(rows):
-        #     print(contours[row])
+        #     print(row_boxes[row])
 
-# START OF KELLY ZONE
+        # START OF KELLY ZONE
 
         # output the initial 9 rows as images, for debug purposes
 
         row_images = []
         for row in range(rows):
-            left, top, width, height = cv2.boundingRect(contours[row])
+            left, top, width, height = row_boxes[row]
             roi = image[
                 top : top  + height,
                 left: left + width
@@ -118,69 +367,18 @@ class SHEETtoPNG:
         row_images.sort(key=lambda x: x[2])
 
         # row_dir = os.path.join(characters_dir, "9 rows")
-        row_dir = os.path.join(characters_dir)
-        if not os.path.exists(row_dir):
+        row_dir = characters_dir
+        if row_dir is not None and not os.path.exists(row_dir):
             os.mkdir(row_dir)
         for row in range(rows):
-            cv2.imwrite(os.path.join(row_dir, "row" + str(row+1) + ".png"), row_images[row][0])
-
+            debug_image(row_dir, "row" + str(row + 1), row_images[row][0])
 
         # Since amongst all the contours, the expected case is that the 4 sided contours
         # containing the characters should have the maximum area, so we loop through the first
         # rows*colums contours and add them to final list after cropping.
         characters = []
         for row in range(rows):
-            # Calculate the bounding of the contour and approximate the height
-            # and width for final cropping.
-            row_x, row_y, row_w, row_h = cv2.boundingRect(contours[row])
-
-            sheet_version = metadata.get("sheetversion") or "99999999.999999.999999"
-            if Version(sheet_version) < Version("3"):
-                # SHEET VERSION 2:
-                # The grid unit here is roughly 0.125cm on the printed page, or 0.25cm in the original huge file.
-                # Each row bounding box (black line) is 164*12, 
-                grid_row_w = 164
-                grid_row_h = 12
-                # with 2 hor padding and 1 ver padding on each side.
-                grid_hor_padding = 2
-                grid_ver_padding = 1
-                # There are 20 glyphs per row. Each glyph scan area is 8x10.
-                grid_scan_w = 8
-                grid_scan_h = 10
-                # The visible gray squares are 7x7, to help with human and scanning errors.
-                grid_glyph_w = 7
-                grid_scan_hor_padding = 0.5
-            else:
-                # SHEET VERSION 3:
-                # The grid unit here is roughly 1/6cm on the printed page, or 1/3cm in the original huge file.
-                # Each row bounding box (black line) is 126x12,
-                grid_row_w = 126
-                grid_row_h = 12
-                # with 3 hor padding and 2 ver padding on each side.
-                grid_hor_padding = 3
-                grid_ver_padding = 2
-                # There are 20 glyphs per row. Each glyph scan area is 6x8.
-                grid_scan_w = 6
-                grid_scan_h = 8
-                # The visible gray squares are 4x4, to help with human and scanning errors.
-                grid_glyph_w = 4
-                grid_scan_hor_padding = 1
-
-            # Convert glyph and padding from grid cells into pixels,
-            # using the measured size of each row
-            glyph_w      = grid_scan_w      * row_w/grid_row_w
-            glyph_h      = grid_scan_h      * row_h/grid_row_h
-            left_padding = grid_hor_padding * row_w/grid_row_w
-            top_padding  = grid_ver_padding * row_h/grid_row_h
-
-            for col in range(cols):
-                glyph_top  = row_y + top_padding
-                glyph_left = row_x + left_padding + col*glyph_w
-                roi = image[
-                    int(glyph_top ) : int(glyph_top  + glyph_h),
-                    int(glyph_left) : int(glyph_left + glyph_w)
-                ]
-                characters.append([roi, glyph_left, glyph_top, glyph_w, glyph_h])
+            characters.extend(self.row_cells(image, row_boxes[row], metadata, cols))
 
         # Now we have the characters but since they are all mixed up we need to position them.
         # Sort characters based on 'y' coordinate and group them by number of rows at a time. Then
@@ -192,56 +390,221 @@ class SHEETtoPNG:
                 sorted(characters[cols * k : cols * (k + 1)], key=lambda x: x[1])
             )
 
-        # for the middle portion of the cartouche, grab the leftmost 1px column
-        # of the right cartouche. it'll be automatically stretched to the width
-        # of a glyph when it's converted to BMP, then SVG.
-        left_cartouche  = sorted_characters[120]
-        right_cartouche = sorted_characters[121]
-        glyph_left, glyph_top, glyph_w, glyph_h = right_cartouche[1], right_cartouche[2], right_cartouche[3], right_cartouche[4]
-        roi = image[int(glyph_top ) : int(glyph_top  + glyph_h),
-                    int(glyph_left) : int(glyph_left + 1)]
-        sorted_characters.append([roi, glyph_left, glyph_top, glyph_w, glyph_h])
-
-        # shift the left and right cartouche scan area inward, to match how the gray boxes are shifted
-        # glyph_left = left_cartouche[1] + glyph_w/16
-        glyph_left = left_cartouche[1] + grid_scan_hor_padding * glyph_w/grid_scan_w
-        roi = image[int(glyph_top ) : int(glyph_top  + glyph_h),
-                    int(glyph_left) : int(glyph_left + glyph_w)]
-        sorted_characters[120][0] = roi
-        sorted_characters[120][1] = glyph_left
-
-        glyph_left = right_cartouche[1] - grid_scan_hor_padding * glyph_w/grid_scan_w
-        roi = image[int(glyph_top ) : int(glyph_top  + glyph_h),
-                    int(glyph_left) : int(glyph_left + glyph_w)]
-        sorted_characters[121][0] = roi
-        sorted_characters[121][1] = glyph_left
-
-        # add Latin a e n o, necessary for ligatures
-        a = sorted_characters[0]
-        sorted_characters.append(a)
-        e = sorted_characters[9]
-        sorted_characters.append(e)
-        n = sorted_characters[148]
-        sorted_characters.append(n)
-        o = sorted_characters[68]
-        sorted_characters.append(o)
-
-        # add Latin [ _ ] . :, necessary for ligatures
-        bracketleft  = sorted_characters[120]
-        sorted_characters.append(bracketleft)
-        underscore   = sorted_characters[180]
-        sorted_characters.append(underscore)
-        bracketright = sorted_characters[121]
-        sorted_characters.append(bracketright)
-        period = sorted_characters[122]
-        sorted_characters.append(period)
-        colon  = sorted_characters[123]
-        sorted_characters.append(colon)
-
-
-# END OF KELLY ZONE
-
-        return sorted_characters
+        cells = dict(enumerate(sorted_characters))
+        self.extra_cells(image, cells, metadata)
+
+        # END OF KELLY ZONE
+
+        return [cells[cell] for cell in sorted(cells)]
+
+    def row_cells(self, image, row_box, metadata, cols=20):
+        """Cut the scan areas of one row box, left to right.
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            The sheet.
+        row_box : tuple
+            (x, y, w, h) of the row box, in pixels.
+        cols : int, default=20
+            Number of cells in the row.
+
+        Returns
+        -------
+        list of list
+            [roi, left, top, width, height] of each cell, like detect_characters.
+        """
+        # Calculate the bounding of the contour and approximate the height
+        # and width for final cropping.
+        row_x, row_y, row_w, row_h = row_box
+
+        # SHEET VERSION 2: each row box is 164x12 grid units, with 2 hor
+        # padding and 1 ver padding on each side, and 8x10 glyph scan areas.
+        # SHEET VERSION 3: each row box is 126x12 grid units, with 3 hor
+        # padding and 2 ver padding on each side, and 6x8 glyph scan areas.
+        # (see preflight.SHEET_GRIDS)
+        grid = sheet_grid(metadata)
+        grid_row_w, grid_row_h = grid["row_w"], grid["row_h"]
+        grid_hor_padding, grid_ver_padding = grid["hor_padding"], grid["ver_padding"]
+        grid_scan_w, grid_scan_h = grid["scan_w"], grid["scan_h"]
+
+        # Convert glyph and padding from grid cells into pixels,
+        # using the measured size of each row
+        glyph_w = grid_scan_w * row_w / grid_row_w
+        glyph_h = grid_scan_h * row_h / grid_row_h
+        left_padding = grid_hor_padding * row_w / grid_row_w
+        top_padding = grid_ver_padding * row_h / grid_row_h
+
+        cells = []
+        for col in range(cols):
+            glyph_top = row_y + top_padding
+            glyph_left = row_x + left_padding + col * glyph_w
+            roi = image[
+                int(glyph_top) : int(glyph_top + glyph_h),
+                int(glyph_left) : int(glyph_left + glyph_w),
+            ]
+            cells.append([roi, glyph_left, glyph_top, glyph_w, glyph_h])
+        return cells
+
+    def extra_cells(self, image, cells, metadata):
+        """Add the cells after the grid, and shift the cartouche ends, in place.
+
+        Only what can be cut from the cells present is added, so this also
+        works on the few rows of a patch sheet (see handwrite.patch).
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            The sheet.
+        cells : dict
+            Cell number to [roi, left, top, width, height], as cut by row_cells.
+        """
+        grid = sheet_grid(metadata)
+        grid_scan_w = grid["scan_w"]
+        grid_scan_hor_padding = grid["scan_hor_padding"]
+
+        if 120 in cells and 121 in cells:
+            # for the middle portion of the cartouche, grab the leftmost 1px column
+            # of the right cartouche. it'll be automatically stretched to the width
+            # of a glyph when it's converted to BMP, then SVG.
+            left_cartouche = cells[120]
+            right_cartouche = cells[121]
+            glyph_left, glyph_top, glyph_w, glyph_h = (
+                right_cartouche[1],
+                right_cartouche[2],
+                right_cartouche[3],
+                right_cartouche[4],
+            )
+            roi = image[
+                int(glyph_top) : int(glyph_top + glyph_h),
+                int(glyph_left) : int(glyph_left + 1),
+            ]
+            cells[180] = [roi, glyph_left, glyph_top, glyph_w, glyph_h]
+
+            # shift the left and right cartouche scan area inward, to match how the gray boxes are shifted
+            # glyph_left = left_cartouche[1] + glyph_w/16
+            glyph_left = (
+                left_cartouche[1] + grid_scan_hor_padding * glyph_w / grid_scan_w
+            )
+            roi = image[
+                int(glyph_top) : int(glyph_top + glyph_h),
+                int(glyph_left) : int(glyph_left + glyph_w),
+            ]
+            cells[120][0] = roi
+            cells[120][1] = glyph_left
+
+            glyph_left = (
+                right_cartouche[1] - grid_scan_hor_padding * glyph_w / grid_scan_w
+            )
+            roi = image[
+                int(glyph_top) : int(glyph_top + glyph_h),
+                int(glyph_left) : int(glyph_left + glyph_w),
+            ]
+            cells[121][0] = roi
+            cells[121][1] = glyph_left
+
+        for extra, cell in EXTRA_CELLS:
+            if cell in cells:
+                cells[extra] = cells[cell]
+
+    def straighten(self, characters_dir, image, contours):
+        """Deskew the sheet, telling the progress callback if it was skewed.
+
+        Returns
+        -------
+        image : numpy.ndarray
+            The straightened sheet, or `image` itself.
+        boxes : list of tuple
+            (x, y, w, h) of the row boxes on it.
+        """
+        straight, boxes, skew = deskew(image, contours)
+        if straight is not image:
+            debug_image(characters_dir, "5 deskewed", straight)
+            self.progress.emit(
+                "message",
+                "sheettopng",
+                text="Straightened the sheet, its rows were off by %.0f%% of their height"
+                % (skew * 100),
+            )
+        return straight, boxes
+
+    def find_rows(
+        self,
+        characters_dir,
+        gray,
+        threshold_value,
+        rows=9,
+        contours=False,
+        partial=False,
+    ):
+        """Find the bounding boxes of the row boxes (black lines) of a sheet.
+
+        Parameters
+        ----------
+        characters_dir : str or None
+            Path to directory to save the debug images in (none without one).
+        gray : numpy.ndarray
+            Grayscale sheet.
+        threshold_value : int
+            Value to adjust thresholding of the image for better contour detection.
+        rows : int, default=9
+            Number of rows of the sheet.
+        contours : bool, default=False
+            Also return the contours, for deskew.
+        partial : bool, default=False
+            The sheet has any number of the rows, up to `rows`, like a patch
+            sheet (see handwrite.patch). Only the four-sided contours at least
+            half as big as the biggest one are kept, top to bottom.
+
+        Returns
+        -------
+        list of tuple
+            (x, y, w, h) of the `rows` biggest four-sided contours (and the
+            contours, with `contours`).
+        """
+        # Threshold and filter the image for better contour detection
+        _, thresh = cv2.threshold(gray, threshold_value, 255, 1)
+        debug_image(characters_dir, "3 threshold", thresh)
+        close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        close = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, close_kernel, iterations=2)
+        debug_image(characters_dir, "4 close", close)
+
+        # Search for contours.
+        found, h = cv2.findContours(close, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Filter contours based on number of sides and then reverse sort by area.
+        found = sorted(
+            filter(
+                lambda cnt: len(
+                    cv2.approxPolyDP(cnt, 0.01 * cv2.arcLength(cnt, True), True)
+                )
+                == 4,
+                found,
+            ),
+            key=cv2.contourArea,
+            reverse=True,
+        )
+
+        if partial:
+            found = found[:rows]
+            if found:
+                biggest = cv2.contourArea(found[0])
+                found = [cnt for cnt in found if cv2.contourArea(cnt) >= biggest / 2]
+            found.sort(key=lambda cnt: cv2.boundingRect(cnt)[1])
+        elif len(found) < rows:
+            raise PreflightError(
+                [
+                    Problem(
+                        "rows",
+                        "found %d of the %d row boxes" % (len(found), rows),
+                        found=len(found),
+                        expected=rows,
+                    )
+                ]
+            )
+
+        boxes = [cv2.boundingRect(contour) for contour in found[:rows]]
+        return (boxes, found[:rows]) if contours else boxes
 
     def save_images(self, characters, characters_dir, config, metadata):
         """Create directory for each character and save as PNG.
@@ -263,57 +626,88 @@ class SHEETtoPNG:
         # Create directory for each character and save the png for the characters
         # Structure (single sheet): UserProvidedDir/ord(character)/ord(character).png
         # Structure (multiple sheets): UserProvidedDir/sheet_filename/ord(character)/ord(character).png
+        # (or the same structure inside UserProvidedDir/glyphs.zip, see glyphstore)
+        with open_store(characters_dir, metadata) as store:
+            self.store_cells(store, characters, config, metadata)
+
+    def store_cells(self, store, characters, config, metadata, page=0, cols=20):
+        """Save the cells of one page to a glyph store, as PNGs."""
+        sheet = sheet_size(characters)
+        for name, image, cell in self.cells(characters, config, metadata, page, cols):
+            store.write(name, ".png", cv2.imencode(".png", image)[1].tobytes())
+            store.set_info(name, page=page, cell=cell, sheet=sheet)
+            self.progress.glyph("sheettopng", name)
+
+    def cells(self, characters, config, metadata, page=0, cols=20):
+        """Pair each cell with the name of its glyph, and trim two-cell glyphs.
+
+        This is a generator, so that callers can start working on the first
+        glyphs while later ones are still being cut.
+
+        Parameters
+        ----------
+        characters : list of list or dict
+            Cells as returned by detect_characters, or some of them by cell
+            number.
+        config: str
+            Path to config file.
+        page : int, default=0
+            Which page of the sheet set `characters` were cut from.
+        cols : int, default=20
+            Number of cells in each row of the sheet.
+
+        Yields
+        ------
+        name : str
+            Glyph name from the config's "glyphs-fancy" list.
+        image : numpy.ndarray
+            BGR image of the cell.
+        cell : list of float
+            Left, top, width and height of the cell on the sheet, in pixels.
+        """
+        with open(config) as f:
+            names = page_cells(json.load(f).get("glyphs-fancy", []), page, cols)
             # Kelly note: `characters` is more like `cells`, since not every cell contains a glyph
-        for cellNum, images in enumerate(characters):
-
-            with open(config) as f:
-                glyphList = json.load(f).get("glyphs-fancy", {})
-                curMetadatum = glyphList[cellNum]
-                if len(glyphList) > cellNum:
-                    if 'name' in curMetadatum:
-                        character = os.path.join(characters_dir, curMetadatum['name'])
-                        if not os.path.exists(character):
-                            os.mkdir(character)
-                        # print(character, curMetadatum['name'] + ".png")
-                        cv2.imwrite(
-                            os.path.join(character, curMetadatum['name'] + ".png"),
-                            images[0],
-                        )
-
-        # Trim cartouche characters
-            # We'll have to do the same thing for long pi
-            # and any other character that spans two cells
-        self.pad("right", characters_dir, metadata, "cartoucheStartTok")
-        self.pad("right", characters_dir, metadata, "bracketleft")
-        
-        self.pad("left",  characters_dir, metadata, "cartoucheEndTok")
-        self.pad("left",  characters_dir, metadata, "bracketright")
-
-        self.pad("right", characters_dir, metadata, "cartoucheMiddleTok", True)
-        self.pad("left",  characters_dir, metadata, "cartoucheMiddleTok", True)
-        self.pad("right", characters_dir, metadata, "underscore", True)
-        self.pad("left",  characters_dir, metadata, "underscore", True)
+        cells = (
+            characters.items()
+            if isinstance(characters, dict)
+            else enumerate(characters)
+        )
+        for cellNum, images in cells:
+            if cellNum in names:
+                name = names[cellNum]
+                image = images[0]
+                if name in TRIMMED_GLYPHS:
+                    sides, resize = TRIMMED_GLYPHS[name]
+                    image = self.trim(image, sides, metadata, resize)
+                yield name, image, [float(x) for x in images[1:5]]
+
+    def trim(self, image, sides, metadata, resize=False):
+        """Apply pad_image to a cv2 (BGR) cell image, on each of `sides`."""
+        from PIL import Image
+        import numpy as np
+
+        char_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        for side in sides:
+            char_img = self.pad_image(char_img, side, metadata, resize)
+        return cv2.cvtColor(np.asarray(char_img), cv2.COLOR_RGB2BGR)
 
     def pad(self, side, characters_dir, metadata, char_name, resize=False):
-        from PIL import Image, ImageDraw
+        from PIL import Image
+
         char_img = Image.open(characters_dir + "/" + char_name + "/" + char_name + ".png")
+        char_img = self.pad_image(char_img, side, metadata, resize)
+        char_img.save(characters_dir + "/" + char_name + "/" + char_name + ".png")
+
+    def pad_image(self, char_img, side, metadata, resize=False):
+        from PIL import ImageDraw
 
         # resize the cartouche middle from 1px wide to the standard width (for a given sheet version)
-        sheet_version = metadata.get("sheetversion") or "99999999.999999.999999"
-        if Version(sheet_version) < Version("3"):
-            # SHEET VERSION 2: Each glyph scan area is 8x10.
-            grid_scan_w = 8
-            grid_scan_h = 10
-            # The visible gray squares are 7x7, to help with human and scanning errors.
-            grid_glyph_w = 7
-            grid_scan_hor_padding = 0.5
-        else:
-            # SHEET VERSION 3: Each glyph scan area is 6x18.
-            grid_scan_w = 6
-            grid_scan_h = 8
-            # The visible gray squares are 4x4, to help with human and scanning errors.
-            grid_glyph_w = 4
-            grid_scan_hor_padding = 1
+        grid = sheet_grid(metadata)
+        grid_scan_w, grid_scan_h = grid["scan_w"], grid["scan_h"]
+        # The visible gray squares are smaller than the scan area, to help with human and scanning errors.
+        grid_glyph_w = grid["glyph_w"]
+        grid_scan_hor_padding = grid["scan_hor_padding"]
         if resize:
             char_img = char_img.resize((int(char_img.height * grid_scan_w/grid_scan_h), char_img.height))
 
@@ -338,4 +732,4 @@ class SHEETtoPNG:
                 ),
                 fill="white"
             )
-        char_img.save(characters_dir + "/" + char_name + "/" + char_name + ".png")
\ No newline at end of file
+        return char_img
@@ -0,0 +1,329 @@
+"""Specimen images of built fonts, rendered without a browser.
+
+A specimen is the word list and the example sentence of the font's web page,
+as a grayscale PNG: the text is shaped by HarfBuzz with the font's own GSUB
+(so the words come out as their ligatures, and cartouches are joined up),
+and the outlines are filled with fontTools and OpenCV, anti-aliased.
+
+Needs uharfbuzz (`pip install handwrite[specimen]`).
+"""
+
+import os
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Blank space around the text, and the distance between baselines, in ems
+MARGIN = 0.5
+LINE_HEIGHT = 1.5
+# Font sizes (pixels per em) of a build's specimens when none are given
+DEFAULT_SIZES = (48,)
+
+
+def specimen_text():
+    """Lines of the specimen: the web page's word list, then its example sentence."""
+    from handwrite.svgtottf import SAMPLE_TEXT, WORD_LIST
+
+    lines = [line.strip() for line in WORD_LIST.replace("<br>", "\n").splitlines()]
+    return [line for line in lines if line] + [SAMPLE_TEXT]
+
+
+def specimen_path(font_path, size, output_directory=None):
+    """Where the specimen of a font at a size goes: next to the font, as "MyFont-48.png"."""
+    name = "%s-%d.png" % (os.path.splitext(os.path.basename(font_path))[0], size)
+    return os.path.join(output_directory or os.path.dirname(font_path), name)
+
+
+def parse_sizes(text):
+    """Sizes from a comma separated list, like "48,96"."""
+    try:
+        sizes = [int(size) for size in text.split(",") if size.strip()]
+    except ValueError:
+        sizes = []
+    if not sizes or min(sizes) <= 0:
+        raise ValueError("sizes must be positive whole numbers, like 48,96: %r" % text)
+    return sizes
+
+
+class SpecimenFont:
+    """A font loaded for shaping and drawing.
+
+    Parameters
+    ----------
+    font : str or bytes
+        Path to a TTF or OTF, or its contents.
+    """
+
+    def __init__(self, font):
+        import io
+
+        try:
+            import uharfbuzz as hb
+        except ImportError:
+            raise ImportError(
+                "uharfbuzz is needed to render specimens: pip install handwrite[specimen]"
+            ) from None
+        from fontTools.ttLib import TTFont
+
+        if isinstance(font, str):
+            with open(font, "rb") as f:
+                font = f.read()
+        self.hb = hb
+        self.hb_font = hb.Font(hb.Face(font))
+        self.tt = TTFont(io.BytesIO(font))
+        self.glyph_set = self.tt.getGlyphSet()
+        self.glyph_order = self.tt.getGlyphOrder()
+        self.upem = self.tt["head"].unitsPerEm
+        extents = self.hb_font.get_font_extents("ltr")
+        self.ascender = extents.ascender
+        self.descender = extents.descender
+        self.outlines = {}
+
+    def shape(self, text):
+        """Shape a line of text.
+
+        Returns
+        -------
+        glyphs : list of tuple
+            (glyph name, x, y) of each glyph, in font units from the start
+            of the line.
+        advance : int
+            Width of the line, in font units.
+        """
+        hb = self.hb
+        buf = hb.Buffer()
+        buf.add_str(text)
+        buf.guess_segment_properties()
+        hb.shape(self.hb_font, buf, {"liga": True, "calt": True})
+        glyphs = []
+        x = 0
+        for info, position in zip(buf.glyph_infos, buf.glyph_positions):
+            glyphs.append(
+                (
+                    self.glyph_order[info.codepoint],
+                    x + position.x_offset,
+                    position.y_offset,
+                )
+            )
+            x += position.x_advance
+        return glyphs, x
+
+    def outline(self, name):
+        """Flattened contours of a glyph, in font units (cached)."""
+        if name not in self.outlines:
+            from handwrite.fidelity import PolygonPen
+
+            pen = PolygonPen(self.glyph_set)
+            self.glyph_set[name].draw(pen)
+            self.outlines[name] = [
+                np.asarray(contour, float) for contour in pen.contours
+            ]
+        return self.outlines[name]
+
+    def render(self, lines, size, width=None):
+        """Draw lines of text.
+
+        Parameters
+        ----------
+        lines : list of str
+        size : int
+            Pixels per em.
+        width : int, optional
+            Wrap the lines between words to fit this many pixels. A word
+            wider than that gets a line of its own, and the image is made
+            wide enough for it. By default, each line takes as long as it
+            needs.
+
+        Returns
+        -------
+        numpy.ndarray
+            uint8 grayscale image, dark ink on white.
+        """
+        from handwrite.synthetic import blend_ink
+
+        scale = size / self.upem
+        margin = int(round(MARGIN * size))
+        space = self.shape(" ")[1]
+        rows = []
+        for line in lines:
+            words = [self.shape(word) for word in line.split(" ")]
+            row, x = [], 0
+            for glyphs, advance in words:
+                if (
+                    width is not None
+                    and row
+                    and 2 * margin + (x + advance) * scale > width
+                ):
+                    rows.append((row, x - space))
+                    row, x = [], 0
+                row += [(name, x + gx, gy) for name, gx, gy in glyphs]
+                x += advance + space
+            rows.append((row, x - space))
+
+        line_height = LINE_HEIGHT * size
+        text_height = (len(rows) - 1) * line_height + (
+            self.ascender - self.descender
+        ) * scale
+        longest = max(advance for _, advance in rows) * scale
+        page = np.full(
+            (
+                int(np.ceil(text_height)) + 2 * margin,
+                max(width or 0, int(np.ceil(longest)) + 2 * margin),
+            ),
+            255,
+            np.uint8,
+        )
+        for number, (row, _) in enumerate(rows):
+            baseline = margin + self.ascender * scale + number * line_height
+            for name, x, y in row:
+                contours = self.outline(name)
+                if contours:
+                    # font units are y up, pixels y down
+                    polygons = [
+                        np.column_stack(
+                            (
+                                margin + (contour[:, 0] + x) * scale,
+                                baseline - (contour[:, 1] + y) * scale,
+                            )
+                        )
+                        for contour in contours
+                    ]
+                    blend_ink(page, polygons)
+        return page
+
+
+@functools.lru_cache(maxsize=4)
+def load_font(path, mtime):
+    # in each worker process, a font is loaded once for all its sizes
+    return SpecimenFont(path)
+
+
+def render_specimen(font, size=48, width=None, lines=None):
+    """Draw a font's specimen.
+
+    Parameters
+    ----------
+    font : str, bytes or SpecimenFont
+        Path to a TTF or OTF, its contents, or the font already loaded.
+    size : int, default=48
+        Pixels per em.
+    width : int, optional
+        Wrap the text to fit this many pixels (see SpecimenFont.render).
+    lines : list of str, optional
+        Text to draw instead of the word list and example sentence.
+
+    Returns
+    -------
+    bytes
+        The PNG.
+    """
+    if isinstance(font, str):
+        font = load_font(os.path.abspath(font), os.stat(font).st_mtime_ns)
+    elif not isinstance(font, SpecimenFont):
+        font = SpecimenFont(font)
+    image = font.render(lines or specimen_text(), size, width)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def write_specimen(font_path, size, output_path, width=None):
+    """Render a font's specimen to a PNG file. Returns its path."""
+    png = render_specimen(font_path, size, width)
+    with open(output_path, "wb") as f:
+        f.write(png)
+    return output_path
+
+
+def render_specimens(
+    fonts, sizes=DEFAULT_SIZES, output_directory=None, width=None, workers=None
+):
+    """Render the specimens of several fonts at several sizes, in parallel.
+
+    The fonts' outlines are flattened and filled in Python, which holds the
+    GIL, so each (font, size) is rendered in a worker process. A worker
+    loads each font once, whatever the number of sizes.
+
+    Parameters
+    ----------
+    fonts : list of str
+        Paths to TTFs or OTFs.
+    sizes : list of int, default=(48,)
+        Pixels per em.
+    output_directory : str, optional
+        Where to write the PNGs (see specimen_path). Next to each font by
+        default.
+    width : int, optional
+        Wrap the text to fit this many pixels.
+    workers : int, optional
+        Number of processes. Defaults to the number of CPUs. With 1, or a
+        single specimen, they're rendered in this process.
+
+    Returns
+    -------
+    list of str
+        Paths to the PNGs, font by font, size by size.
+    """
+    if output_directory is not None:
+        os.makedirs(output_directory, exist_ok=True)
+    tasks = [
+        (font, size, specimen_path(font, size, output_directory), width)
+        for font in fonts
+        for size in sizes
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return [write_specimen(*task) for task in tasks]
+    if len(fonts) >= workers:
+        # each font's sizes in one go, so it's loaded once
+        chunks = [tasks[i : i + len(sizes)] for i in range(0, len(tasks), len(sizes))]
+    else:
+        chunks = [[task] for task in tasks]
+    with ProcessPoolExecutor(workers) as pool:
+        for future in [pool.submit(write_specimens_of, chunk) for chunk in chunks]:
+            future.result()
+    return [task[2] for task in tasks]
+
+
+def write_specimens_of(tasks):
+    return [write_specimen(*task) for task in tasks]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Render specimen PNGs of fonts, without a browser"
+    )
+    parser.add_argument("fonts", nargs="+", help="TTF or OTF files")
+    parser.add_argument(
+        "--sizes",
+        help="Font sizes, in pixels per em, comma separated (48 by default)",
+        default="48",
+    )
+    parser.add_argument(
+        "--width",
+        help="Wrap the text to this many pixels (as wide as the lines by default)",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--output-directory",
+        help="Where to write the PNGs (next to each font by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes (one per CPU by default)",
+        type=int,
+        default=None,
+    )
+    args = parser.parse_args()
+    try:
+        sizes = parse_sizes(args.sizes)
+    except ValueError as e:
+        parser.error(str(e))
+    for path in render_specimens(
+        args.fonts, sizes, args.output_directory, args.width, args.workers
+    ):
+        print(path)
@@ -1,13 +1,374 @@
 import sys
 import os
 import json
-import uuid
-import datetime
+
+
+def source_date_epoch():
+    """Timestamp used for deterministic builds (reproducible-builds.org convention)."""
+    return int(os.environ.get("SOURCE_DATE_EPOCH", 0))
+
+
+def load_glyphstore():
+    if __name__ == "__main__":
+        # running as a FontForge script: don't import the whole package
+        import glyphstore
+    else:
+        from handwrite import glyphstore
+    return glyphstore
+
+
+def fontforge_executable():
+    """Command that runs a Python script inside FontForge."""
+    import platform
+
+    if platform.system() == "Windows":
+        return ["ffpython"]
+    return ["fontforge", "-script"]
+
+
+# Outline formats the font can be written in, and their file extensions.
+# FontForge writes TrueType outlines as quadratic curves, converted from
+# potrace's cubic ones; CFF (and CFF2) fonts keep the cubic curves as traced
+FONT_FORMATS = {"ttf": ".ttf", "otf": ".otf", "cff2": ".otf"}
+
+
+def font_format(metadata=None):
+    """The font's outline format ("ttf" by default), from metadata."""
+    format = (metadata or {}).get("format") or "ttf"
+    if format not in FONT_FORMATS:
+        raise ValueError(
+            "Unknown font format %r, not one of %s" % (format, ", ".join(FONT_FORMATS))
+        )
+    return format
+
+
+def font_extension(metadata=None):
+    """File extension of the font, for its format (see font_format)."""
+    return FONT_FORMATS[font_format(metadata)]
+
+
+def finish_cff(tt, format):
+    """Convert a CFF font to CFF2 if asked, and subroutinize its charstrings.
+
+    FontForge doesn't share any outline code between glyphs, so on its own a
+    CFF font is about as big as it gets. Subroutinizing needs cffsubr
+    (`pip install cffsubr`); without it, the charstrings are kept as they are.
+
+    Returns
+    -------
+    bool
+        Whether the charstrings were subroutinized.
+    """
+    if format == "cff2":
+        from fontTools.cffLib.CFFToCFF2 import convertCFFToCFF2  # camelCase!
+
+        convertCFFToCFF2(tt)
+    try:
+        import cffsubr
+    except ImportError:
+        return False
+    cffsubr.subroutinize(tt)
+    return True
+
+
+def shard_path(directory, index):
+    """Partial font saved by a --shard run of the FontForge script."""
+    return os.path.join(directory, ".shard-%d.sfd" % index)
+
+
+# Combining glyphs: the cartouche middle and the underscore (long glyph
+# extension) are zero-width, and drawn over the glyph before them
+COMBINING_GLYPHS = (0xF1992, 0x5F)
+
+# Start of the lines the FontForge script writes to stdout with --progress,
+# one per glyph placed
+PROGRESS_PREFIX = "handwrite-glyph "
+
+
+def relay_progress(lines, progress):
+    """Turn the output of a FontForge script run with --progress into events.
+
+    Parameters
+    ----------
+    lines : iterable of bytes
+        The script's stdout.
+    progress : handwrite.progress.Progress
+        Gets a "fontforge" glyph event for each glyph, and a message event
+        for anything else FontForge prints.
+    """
+    for line in lines:
+        line = line.decode("utf-8", "replace")
+        if line.startswith(PROGRESS_PREFIX):
+            progress.glyph("fontforge", line[len(PROGRESS_PREFIX) :].strip())
+        elif line.strip():
+            progress.emit("message", "fontforge", text=line)
+
+
+# Every word of the sitelen pona word list, for the example web pages
+WORD_LIST = """\
+a akesi ala alasa ale anpa ante anu awen e en esun ijo ike ilo insa jaki jan jelo jo<br>
+kala kalama kama kasi ken kepeken kili kiwen ko kon kule kulupu kute la lape laso lawa len lete li<br>
+lili linja lipu loje lon luka lukin lupa ma mama mani meli mi mije moku moli monsi mu mun musi<br>
+mute nanpa nasa nasin nena ni nimi noka o olin ona open pakala pali palisa pan pana pi pilin pimeja<br>
+pini pipi poka poki pona pu sama seli selo seme sewi sijelo sike sin sina sinpin sitelen sona soweli suli<br>
+suno supa suwi tan taso tawa telo tenpo toki tomo tu unpa uta utala walo wan waso wawa weka wile<br>
+[].:ijklmpst,uw,te to<br>
+kijetesantakalu kin kipisi ku lanpan leko misikeke monsuta n namako soko tonsi<br>
+epiku jasima linluwi majuna meso oko su<br><br>
+"""
+
+# The example sentence under the word list: jan [sama olin namako jaki ala]
+# li sitelen e pu kepeken wawa mute.
+SAMPLE_TEXT = "󱤑󱦐󱥖󱥅󱥸󱤐󱤂󱦑󱤧󱥠󱤉󱥕󱤙󱥵󱤼󱦜"
+
+# Styles apps group into a family by name IDs 1 and 2 alone. Any other style
+# is a family of its own for them, with name IDs 16 and 17 naming the real one
+RIBBI_STYLES = ("Regular", "Italic", "Bold", "Bold Italic")
+
+# OS/2 usWeightClass of the usual weight names
+WEIGHT_CLASSES = {
+    "thin": 100,
+    "extralight": 200,
+    "light": 300,
+    "regular": 400,
+    "medium": 500,
+    "semibold": 600,
+    "bold": 700,
+    "extrabold": 800,
+    "black": 900,
+}
+
+
+def style_names(family, style):
+    """How one style of a family is named, and its OS/2 style bits.
+
+    "Regular", "Italic", "Bold" and "Bold Italic" are named by family and
+    style. Other styles, like "Light" or "hand 2", get "<family> <style>" and
+    "Regular" (or "Italic") for apps that only know those four, and the
+    family and style as typographic names for the others.
+
+    Returns
+    -------
+    dict
+        "family" and "subfamily" (name IDs 1 and 2), "typographic" (name
+        IDs 16 and 17, or None), "weight" (usWeightClass), "italic" and "bold".
+    """
+    words = style.split()
+    italic = any(word.lower() in ("italic", "oblique") for word in words)
+    weight = 400
+    for word in words:
+        weight = WEIGHT_CLASSES.get(word.lower().replace("-", ""), weight)
+    for ribbi in RIBBI_STYLES:
+        if style.lower() == ribbi.lower():
+            return {
+                "family": family,
+                "subfamily": ribbi,
+                "typographic": None,
+                "weight": weight,
+                "italic": italic,
+                "bold": weight == 700,
+            }
+    plain = [word for word in words if word.lower() not in ("italic", "oblique")]
+    return {
+        "family": " ".join([family] + plain),
+        "subfamily": "Italic" if italic else "Regular",
+        "typographic": (family, style),
+        "weight": weight,
+        "italic": italic,
+        "bold": False,
+    }
+
+
+def set_style_bits(tt, names):
+    """Set the OS/2 and head style bits of a fontTools TTFont, from style_names."""
+    tt["OS/2"].usWeightClass = names["weight"]
+    # ITALIC, BOLD and REGULAR
+    selection = tt["OS/2"].fsSelection & ~(1 << 0 | 1 << 5 | 1 << 6)
+    if names["italic"]:
+        selection |= 1 << 0
+    if names["bold"]:
+        selection |= 1 << 5
+    if not names["italic"] and not names["bold"]:
+        selection |= 1 << 6
+    tt["OS/2"].fsSelection = selection
+    tt["head"].macStyle = (1 if names["bold"] else 0) | (2 if names["italic"] else 0)
+
+
+# Tables feaLib replaces when it compiles features
+# (see fontTools.feaLib.builder.Builder.build)
+FEATURE_TABLES = ("GDEF", "GSUB", "GPOS", "BASE")
+
+
+# Ligature subtables are split before they get this big (in bytes, as
+# estimated by ligature_lookup), well under the 64 KiB their offsets can reach
+LIGATURE_SUBTABLE_BYTES = 32768
+
+
+def ligature_lookup(name, ligatures, max_bytes=LIGATURE_SUBTABLE_BYTES):
+    """A ligature lookup in feaLib syntax, grouped by first glyph.
+
+    Each group is one ligature set of the compiled lookup, longest ligature
+    first, so a shorter one never hides a longer one with the same start.
+    When the lookup would outgrow `max_bytes`, it's split into subtables
+    between groups (never inside one), and stored as an extension lookup
+    so the subtables' offsets can't overflow either.
+
+    Parameters
+    ----------
+    name : str
+        Lookup name.
+    ligatures : list of (list of str, str)
+        Components and ligature glyph of each ligature.
+    max_bytes : int, default=LIGATURE_SUBTABLE_BYTES
+
+    Returns
+    -------
+    str
+    """
+    groups = {}
+    for components, glyph in ligatures:
+        groups.setdefault(components[0], []).append((components, glyph))
+    subtables = [[]]
+    size = 6
+    for group in groups.values():
+        group.sort(key=lambda ligature: -len(ligature[0]))
+        # coverage glyph, set offset and count, then each ligature's
+        # offset, glyph, count and components
+        group_size = 6 + sum(6 + 2 * len(components) for components, glyph in group)
+        if subtables[-1] and size + group_size > max_bytes:
+            subtables.append([])
+            size = 6
+        subtables[-1].append(group)
+        size += group_size
+    lines = []
+    for subtable in subtables:
+        if lines:
+            lines.append("  subtable;")
+        for group in subtable:
+            for components, glyph in group:
+                lines.append("  sub " + " ".join(components) + " by " + glyph + ";")
+    extension = " useExtension" if len(subtables) > 1 else ""
+    return "lookup %s%s {\n%s\n} %s;\n" % (name, extension, "\n".join(lines), name)
+
+
+class CompiledFeatures:
+    """OpenType features compiled once, for every font with the same glyph order.
+
+    The styles of a family are built from the same config, so they get the
+    same feature file, and FontForge gives them the same glyph order. feaLib
+    only compiles it for the first font; the others get a copy of the
+    compiled tables. Thread-safe.
+    """
+
+    def __init__(self):
+        import threading
+
+        self.compiled = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+
+    def apply(self, tt, features):
+        """Add `features` (feature file syntax) to a fontTools TTFont."""
+        from fontTools.ttLib.tables.DefaultTable import DefaultTable  # camelCase!
+
+        key = (features, tuple(tt.getGlyphOrder()))
+        with self.lock:
+            compiled = self.compiled.get(key)
+            if compiled is None:
+                from fontTools.feaLib import builder  # camelCase!
+
+                builder.addOpenTypeFeaturesFromString(tt, features)
+                self.compiled[key] = (
+                    {
+                        tag: tt.getTableData(tag) if tag in tt else None
+                        for tag in FEATURE_TABLES
+                    },
+                    tt["OS/2"].usMaxContext if "OS/2" in tt else None,
+                )
+                return
+            self.hits += 1
+        tables, max_context = compiled
+        for tag, data in tables.items():
+            if data is None:
+                if tag in tt:
+                    del tt[tag]
+            else:
+                table = DefaultTable(tag)
+                table.data = data
+                tt[tag] = table
+        if max_context is not None and "OS/2" in tt:
+            tt["OS/2"].usMaxContext = max_context
+
+
+def write_stream_record(stream, name, svg, placement):
+    """Send one glyph, and its placement transform, to the FontForge script in --stream mode."""
+    stream.write(
+        (
+            "%s %d %s\n" % (name, len(svg), " ".join(repr(float(v)) for v in placement))
+        ).encode("utf-8")
+    )
+    stream.write(svg)
+    stream.flush()
+
+
+def streamed_sources(stream):
+    """Read glyphs sent with write_stream_record, until the stream is closed.
+
+    Yields
+    ------
+    (name, context manager that gives the path of a file with the SVG, placement)
+    """
+    import shutil
+    import tempfile
+    import contextlib
+
+    temp = tempfile.mkdtemp()
+
+    @contextlib.contextmanager
+    def source(path, svg):
+        with open(path, "wb") as f:
+            f.write(svg)
+        yield path
+
+    try:
+        while True:
+            header = stream.readline()
+            if not header:
+                break
+            name, length, *placement = header.decode("utf-8").split()
+            svg = stream.read(int(length))
+            yield name, source(os.path.join(temp, "glyph.svg"), svg), [
+                float(v) for v in placement
+            ]
+    finally:
+        shutil.rmtree(temp)
 
 
 class SVGtoTTF:
+    """Converter class to build a font from the glyphs' SVGs.
+
+    Parameters
+    ----------
+    progress : callable or handwrite.progress.Progress, optional
+        Gets "fontforge" and "ligatures" stage events, and an event for
+        each glyph FontForge places.
+    limits : handwrite.limits.Limits, optional
+        Timeout, resource limits and retries of each FontForge run.
+    """
+
+    def __init__(self, progress=None, limits=None):
+        if __name__ != "__main__":
+            # the FontForge script has no use for them (nor the package)
+            from handwrite.limits import Limits
+            from handwrite.progress import as_progress
+
+            progress = as_progress(progress)
+            limits = limits or Limits()
+        self.progress = progress
+        self.limits = limits
+        self.report_progress = False
+
     def convert(self, directory, outdir, config, metadata=None):
-        print("SVGtoTTF")
         """Convert a directory with SVG images to TrueType Font.
 
         Calls a subprocess to the run this script with Fontforge Python
@@ -28,37 +389,262 @@ class SVGtoTTF:
         metadata : dict
             Dictionary containing the metadata (filename, family or style)
         """
+        self.place_glyphs(directory, config, metadata)
+        self.run_fontforge(directory, config, metadata)
+        return self.add_ligatures(directory, outdir, config, metadata)
+
+    def place_glyphs(self, directory, config, metadata=None):
+        """Work out where each glyph goes in the font, for run_fontforge.
+
+        Writes each glyph's placement transform to the glyph store's index
+        (see handwrite.placement.write_placements).
+        """
+        from handwrite.glyphstore import open_store
+        from handwrite.placement import write_placements
+        from handwrite.preflight import sheet_major_version
+
+        with open(config) as f:
+            config_data = json.load(f)
+        props = config_data.get("props", {})
+        with open_store(directory, metadata) as store:
+            write_placements(
+                store,
+                config_data["glyphs-fancy"],
+                sheet_major_version(metadata),
+                props.get("ascent", 800),
+                props.get("descent", 200),
+            )
+
+    def run_fontforge(self, directory, config, metadata=None, shards=1, patch=None):
+        """Build the font without ligatures, in a FontForge subprocess.
+
+        Writes "<filename> without ligatures.ttf" (or .otf, see font_format)
+        and ".sfd" to `directory`.
+        The glyphs have to be placed (see place_glyphs) first.
+
+        With `shards` > 1, the glyphs are imported and placed by that many
+        FontForge processes at once, each saving a partial font, and one
+        more process merges them.
+
+        With `patch`, only those glyphs are reimported, into the font an
+        earlier run saved in `directory`.
+
+        Parameters
+        ----------
+        directory : str
+            Path to directory with SVGs to be converted.
+        config : str
+            Path to config file.
+        metadata : dict
+            Dictionary containing the metadata (filename, family or style)
+        shards : int, default=1
+            Number of FontForge processes importing glyphs.
+        patch : list of str, optional
+            Names of the glyphs to reimport.
+
+        Raises
+        ------
+        handwrite.limits.ToolError
+            If a FontForge run fails, or takes too long (see self.limits).
+        """
         import subprocess
-        import platform
+        import threading
+
+        from handwrite.limits import ToolError
+
+        env = self.fontforge_env(metadata)
+        limits = self.limits
+        # only ask FontForge for progress lines if someone's listening
+        reporting = self.progress.callback is not None
+        total = None
+        if reporting and patch is not None:
+            total = len(patch)
+        elif reporting:
+            with open(config) as f:
+                total = sum(
+                    1 for glyph in json.load(f)["glyphs-fancy"] if "name" in glyph
+                )
+
+        def start(**options):
+            command = self.fontforge_command(
+                directory, config, metadata, progress=reporting, **options
+            )
+            if not reporting:
+                return limits.popen(
+                    "fontforge", command, env=env, stdout=subprocess.DEVNULL
+                )
+            worker = limits.popen("fontforge", command, env=env, stdout=subprocess.PIPE)
+            worker.relay = threading.Thread(
+                target=relay_progress, args=(worker.stdout, self.progress)
+            )
+            worker.relay.start()
+            return worker
+
+        def wait(worker):
+            try:
+                worker.wait()
+            finally:
+                if reporting:
+                    worker.relay.join()
+
+        def run(**options):
+            if reporting:
+                limits.retry(lambda: wait(start(**options)))
+            else:
+                limits.run(
+                    "fontforge",
+                    self.fontforge_command(directory, config, metadata, **options),
+                    env=env,
+                )
+
+        with self.progress.stage("fontforge", total):
+            if shards <= 1 or patch is not None:
+                run(patch=patch)
+                return
+            workers = [start(shard=(index, shards)) for index in range(shards)]
+
+            def restart(index):
+                # in `workers`, so it's stopped too if it's left running
+                workers[index] = start(shard=(index, shards))
+                wait(workers[index])
+
+            try:
+                for index in range(shards):
+                    try:
+                        wait(workers[index])
+                    except ToolError:
+                        if limits.retries <= 0:
+                            raise
+                        # the other shards carry on meanwhile
+                        limits.retry(lambda: restart(index), limits.retries - 1)
+                run(merge=shards)
+            finally:
+                # a shard failed: don't leave the others running
+                for worker in workers:
+                    if worker.poll() is None:
+                        worker.kill()
+                        try:
+                            wait(worker)
+                        except ToolError:
+                            pass
+                for index in range(shards):
+                    if os.path.exists(shard_path(directory, index)):
+                        os.remove(shard_path(directory, index))
+
+    def fontforge_env(self, metadata=None):
+        """Environment for the FontForge subprocess.
+
+        In deterministic mode, FontForge writes SOURCE_DATE_EPOCH (default 0)
+        into the font's timestamps instead of the current time.
+        """
+        if not (metadata or {}).get("deterministic"):
+            return None
+        env = dict(os.environ)
+        env["SOURCE_DATE_EPOCH"] = str(source_date_epoch())
+        return env
+
+    def fontforge_command(
+        self,
+        directory,
+        config,
+        metadata=None,
+        stream=False,
+        shard=None,
+        merge=None,
+        progress=False,
+        patch=None,
+    ):
+        """Build the command line that runs this script in FontForge.
+
+        Parameters
+        ----------
+        directory : str
+            Path to directory with SVGs to be converted.
+        config : str
+            Path to config file.
+        metadata : dict
+            Dictionary containing the metadata (filename, family or style)
+        stream : bool, default=False
+            If True, the script creates every glyph up front, then reads
+            glyphs from stdin and imports each one as soon as it arrives,
+            until stdin is closed. Each glyph is a "name length" line followed
+            by `length` bytes of SVG (see write_stream_record).
+        shard : (int, int), optional
+            (index, count): only import and place one shard of the glyphs,
+            into a partial font (see add_glyphs).
+        merge : int, optional
+            Build the font from `merge` partial fonts.
+        progress : bool, default=False
+            If True, the script writes a line to stdout for each glyph it
+            places (see relay_progress).
+        patch : list of str, optional
+            Open the font an earlier run saved in `directory`, and only
+            reimport these glyphs (see patch_glyphs).
+        """
         from packaging.version import Version
+        metadata = metadata or {}
         sheet_version = metadata.get("sheetversion") or "99999999.999999.999999"
 
-        subprocess.run(
-            (
-                ["ffpython"]
-                if platform.system() == "Windows"
-                else ["fontforge", "-script"]
-            )
+        return (
+            fontforge_executable()
             + [
                 os.path.abspath(__file__),
                 config,
                 directory,
-                outdir,
+                directory,
                 json.dumps(metadata),
                 str(Version(sheet_version).major),
                 str(Version(sheet_version).minor),
-                str(Version(sheet_version).micro)
+                str(Version(sheet_version).micro),
             ]
+            + (["--progress"] if progress else [])
+            + (["--stream"] if stream else [])
+            + (["--shard", "%d/%d" % shard] if shard is not None else [])
+            + (["--merge", str(merge)] if merge is not None else [])
+            + (["--patch", ",".join(patch)] if patch is not None else [])
         )
 
-        self.add_ligatures(directory, outdir, config, metadata)
-
+    def add_ligatures(
+        self,
+        directory,
+        outdir,
+        config,
+        metadata=None,
+        features=None,
+        web_page=True,
+        replace=(),
+    ):
+        """Add the ligature features to the font, and write it to `outdir`.
 
-    def add_ligatures(self, directory, outdir, config, metadata=None):
+        Parameters
+        ----------
+        features : CompiledFeatures, optional
+            Reuse features compiled for another font with the same glyphs.
+        web_page : bool, default=True
+            Also write a web page with examples of the font.
+        replace : iterable of str, optional
+            Files this font may overwrite, like the ones an earlier run of
+            the same build wrote. Any other font already in `outdir` with
+            the same name is kept, and this one is saved as "MyFont (1).ttf".
+
+        With a "specimen" list of sizes in `metadata` (and optionally a
+        "specimenwidth"), also renders specimen PNGs of the font next to
+        it, see handwrite.specimen.
+
+        The paths of every file written (the font, its web page and
+        specimens) are left in self.outputs.
+
+        Returns
+        -------
+        str
+            Path to the font.
+        """
         # Now the font has exported, presumably. 
         # We're back to the `python` environment, not the `ffpython` one, so we can use libraries like fontTools, camelCase.
         import fontTools  # camelCase!
 
+        self.progress.start("ligatures")
+
         # `directory` is the temp directory
 
         self.metadata = json.loads(json.dumps(metadata)) or {}
@@ -72,68 +658,82 @@ class SVGtoTTF:
 
         family = (self.metadata.get("family", None) or filename)
 
-        designer = self.metadata.get("designer", None) or self.config["props"].get("designer", "jan pi toki pona")
-
-        license = self.metadata.get("license", None) or self.config["sfnt_names"].get("License", "All rights reserved")
-        licenseurl = self.metadata.get("licenseurl", None) or self.config["sfnt_names"].get("License URL", "")
-        if license == "ofl":
-            license = "SIL Open Font License, Version 1.1"
-            licenseurl = "https://openfontlicense.org"
-        if license == "cc0":
-            license = "CC0 1.0 Universal"
-            licenseurl = "https://creativecommons.org/publicdomain/zero/1.0/"
+        designer, license, licenseurl = self.credits()
 
         # fontTools: input font file
-        infile = str(directory + os.sep + (filename + " without ligatures.ttf"))
+        extension = font_extension(self.metadata)
+        infile = str(directory + os.sep + (filename + " without ligatures" + extension))
         # sys.stderr.write("\nAdding ligatures to %s\n" % infile)
 
         # fontTools: output font file
-        filename = filename + ".ttf" if not filename.endswith(".ttf") else filename
+        filename = (
+            filename + extension if not filename.endswith(extension) else filename
+        )
         outfile = str(outdir + os.sep + filename)
-        while os.path.exists(outfile):
-            filename = os.path.splitext(filename)[0] + " (1).ttf"
+        replace = {os.path.abspath(path) for path in replace}
+        while os.path.exists(outfile) and os.path.abspath(outfile) not in replace:
+            filename = os.path.splitext(filename)[0] + " (1)" + extension
             outfile = outdir + os.sep + filename
 
-        ligatures_string = "feature liga {\n"
-        list_of_ligs = []
+        ligatures_string = self.ligature_features()
+        # print(ligatures_string)
+        feature_file = open(directory + os.sep + family + ".fea", "w", encoding="utf-8")
+        feature_file.write(ligatures_string)
+        feature_file.close()
+
+        tt = self.ligature_font(infile, ligatures_string, features)
+        self.progress.emit("message", "ligatures", text="Generating %s..." % outfile)
+        tt.save(outfile)
+        self.outputs = [outfile]
+
+        if web_page:
+            self.outputs.append(
+                self.generate_web_page(
+                    outdir, filename, family, designer, license, licenseurl
+                )
+            )
+        if self.metadata.get("specimen"):
+            from handwrite.specimen import render_specimens
+
+            self.progress.emit(
+                "message", "ligatures", text="Rendering specimens of %s..." % outfile
+            )
+            self.outputs += render_specimens(
+                [outfile],
+                self.metadata["specimen"],
+                width=self.metadata.get("specimenwidth"),
+            )
+        self.progress.end("ligatures")
+        return outfile
+
+    def ligature_features(self):
+        """The font's ligature features (feaLib syntax), from self.config."""
+        ligatures = []
         list_of_cartoucheable_glyphs = []
 
         # create ligature lines
-        with open(config) as f:
-            glyphs = json.load(f).get("glyphs-fancy", {})
-            for k in glyphs:
-                if 'ligature' in k:
-                    # create tuples of ligature text, followed by ligature length by tokens
-                    list_of_ligs.append((
-                        "  sub " + k['ligature'] + " by " + k['name'] + ";", 
-                        len(k['ligature'].split(' '))
-                    ))
-                    # # If you make ligatures of the format `p o n a space`, 
-                    # # the spacing is incorrect in every browser on iPhone and iPad, as well as Safari for macOS.
-                    # # (The browser correctly renders the ligature, but incorrectly renders an additional space.)
-                    # # So I just make the space character zero-width instead,
-                    # # which is redundant with `p o n a space` ligatures.
-                    # list_of_ligs.append((
-                    #     "  sub " + k['ligature'] + " space by " + k['name'] + ";", 
-                    #     len(k['ligature'].split(' ')) + 1
-                    # ))
-                    list_of_cartoucheable_glyphs.append(k['name'])
-
-        list_of_ligs.append(("  sub comma space by zerowidth;", 2))
-        list_of_ligs.append(("  sub space space by ideographicspace;", 2))
-        list_of_ligs.append(("  sub exclamation space by ideographicspace;", 2))
-        list_of_ligs.append(("  sub question space by ideographicspace;", 2))
-        list_of_ligs.append(("  sub l i n u w i by linluwiTok;", 6))
-
-        # sort them by number of tokens
-        list_of_ligs.sort(reverse=True, key=lambda x: x[1])
-
-        # add to our cool string
-        for line in list_of_ligs:
-            ligatures_string += line[0] + "\n"
-
-        ligatures_string += "} liga;"
+        glyphs = self.config.get("glyphs-fancy", {})
+        for k in glyphs:
+            if "ligature" in k:
+                ligatures.append((k["ligature"].split(" "), k["name"]))
+                # # If you make ligatures of the format `p o n a space`,
+                # # the spacing is incorrect in every browser on iPhone and iPad, as well as Safari for macOS.
+                # # (The browser correctly renders the ligature, but incorrectly renders an additional space.)
+                # # So I just make the space character zero-width instead,
+                # # which is redundant with `p o n a space` ligatures.
+                list_of_cartoucheable_glyphs.append(k["name"])
+
+        ligatures.append((["comma", "space"], "zerowidth"))
+        ligatures.append((["space", "space"], "ideographicspace"))
+        ligatures.append((["exclamation", "space"], "ideographicspace"))
+        ligatures.append((["question", "space"], "ideographicspace"))
+        ligatures.append((["l", "i", "n", "u", "w", "i"], "linluwiTok"))
+
+        ligatures_string = ligature_lookup("ligatures", ligatures)
         ligatures_string += """
+feature liga {
+  lookup ligatures;
+} liga;
 
 @cartoucheableGlyph = [
   a e i j k l m n o p s t u w
@@ -156,37 +756,94 @@ lookup add_cartouche_middle {
 
 # idk what keyword to use here. liga, calt, ccmp, something else?
 feature calt {
-  # If a glyph follows a cartouche start, add a cartouche middle after the glyph.
-  sub   cartoucheStartTok  [@cartoucheableGlyph]'   lookup add_cartouche_middle;
-
-  # If a glyph follows a cartouche middle, add a cartouche middle after the glyph.
-  sub   cartoucheMiddleTok [@cartoucheableGlyph]'   lookup add_cartouche_middle;
+  # If a glyph follows a cartouche start or a cartouche middle, add a
+  # cartouche middle after the glyph. One rule rather than one for each,
+  # so shapers check each glyph against one subtable, not two.
+  sub   [cartoucheStartTok cartoucheMiddleTok]   @cartoucheableGlyph'   lookup add_cartouche_middle;
 } calt;
 """
-        # print(ligatures_string)
-        feature_file = open(directory + os.sep + family + ".fea", "w", encoding="utf-8")
-        feature_file.write(ligatures_string)
-        feature_file.close()
+        return ligatures_string
 
+    def ligature_font(self, infile, ligatures_string, features=None):
+        """Load the font FontForge made, and add the ligature features to it.
 
+        Parameters
+        ----------
+        infile : str or file
+            The font without ligatures.
+        ligatures_string : str
+            Features, from ligature_features.
+        features : CompiledFeatures, optional
+            Share compiled features with other builds.
+
+        Returns
+        -------
+        fontTools.ttLib.TTFont
+        """
         from fontTools import ttLib  # camelCase!
-        tt = ttLib.TTFont(infile)
-        from fontTools.feaLib import builder  # camelCase!
-        builder.addOpenTypeFeaturesFromString(tt, ligatures_string)
-        sys.stderr.write("\nGenerating %s...\n" % outfile)
-        tt.save(outfile)
+        deterministic = self.metadata.get("deterministic", False)
+        tt = ttLib.TTFont(infile, recalcTimestamp=not deterministic)
+        if deterministic:
+            from fontTools.misc.timeTools import timestampSinceEpoch  # camelCase!
 
-        self.generate_web_page(outdir, filename, family, designer, license, licenseurl)
+            tt["head"].created = tt["head"].modified = timestampSinceEpoch(
+                source_date_epoch()
+            )
+        (features or CompiledFeatures()).apply(tt, ligatures_string)
+        # FontForge guesses these from the style name, and guesses 400 and
+        # regular for anything it doesn't know
+        set_style_bits(tt, style_names(*self.family_style()))
+        format = font_format(self.metadata)
+        if format != "ttf" and not finish_cff(tt, format):
+            self.progress.emit(
+                "message",
+                "ligatures",
+                text="cffsubr isn't installed, not subroutinizing the CFF outlines",
+            )
+        return tt
+
+    def credits(self):
+        """(designer, license, license URL) for the web page, from metadata or config."""
+        designer = self.metadata.get("designer", None) or self.config["props"].get(
+            "designer", "jan pi toki pona"
+        )
+
+        license = self.metadata.get("license", None) or self.config["sfnt_names"].get(
+            "License", "All rights reserved"
+        )
+        licenseurl = self.metadata.get("licenseurl", None) or self.config[
+            "sfnt_names"
+        ].get("License URL", "")
+        if license == "ofl":
+            license = "SIL Open Font License, Version 1.1"
+            licenseurl = "https://openfontlicense.org"
+        if license == "cc0":
+            license = "CC0 1.0 Universal"
+            licenseurl = "https://creativecommons.org/publicdomain/zero/1.0/"
+        return designer, license, licenseurl
 
     def generate_web_page(self, outdir, filename, family, designer, license, licenseurl):
-        example_web_page = open(outdir + os.sep + family.replace(" ", "-") + ".html", "w", encoding="utf-8")
+        path = outdir + os.sep + family.replace(" ", "-") + ".html"
+        example_web_page = open(path, "w", encoding="utf-8")
         example_web_page.write(
-"""
+            self.web_page(filename, family, designer, license, licenseurl)
+        )
+        example_web_page.close()
+        return path
+
+    def web_page(self, filename, family, designer, license, licenseurl):
+        """The example web page of a font, as a string."""
+        return (
+            """
 <meta charset="utf-8" />
 <style type=\"text/css\">
     @font-face {
-        font-family: '""" + family + """';
-        src: url('""" + filename + """')
+        font-family: '"""
+            + family
+            + """';
+        src: url('"""
+            + filename
+            + """')
     }
     body {
         background-color: #334;
@@ -197,7 +854,9 @@ feature calt {
         color: white;
     }
     .tp {
-        font-family: '""" + family + """', 'Chalkboard SE', 'Comic Sans MS', sans-serif;
+        font-family: '"""
+            + family
+            + """', 'Chalkboard SE', 'Comic Sans MS', sans-serif;
     }
     h1, p {
         font-family: "Chalkboard SE", "Comic Sans MS", sans-serif;
@@ -211,7 +870,11 @@ feature calt {
         padding: 1em;
     }
 </style>
-<h1>""" + family + ", tan " + designer + """</h1>
+<h1>"""
+            + family
+            + ", tan "
+            + designer
+            + """</h1>
 
 <!-- Latin test -->
 <!--<h1>jelo <span class="tp">awen e</span></h1>-->
@@ -234,21 +897,20 @@ epiku　jasima　linluwi　majuna　meso　oko　su<br><br>-->
 [<span style="color: red; opacity: .5;">._</span><span style="color: yellow; opacity: .5;">._</span><span style="color: blue; opacity: .5;">._</span>]<br><br>-->
 
 <!-- word list -->
-a akesi ala alasa ale anpa ante anu awen e en esun ijo ike ilo insa jaki jan jelo jo<br>
-kala kalama kama kasi ken kepeken kili kiwen ko kon kule kulupu kute la lape laso lawa len lete li<br>
-lili linja lipu loje lon luka lukin lupa ma mama mani meli mi mije moku moli monsi mu mun musi<br>
-mute nanpa nasa nasin nena ni nimi noka o olin ona open pakala pali palisa pan pana pi pilin pimeja<br>
-pini pipi poka poki pona pu sama seli selo seme sewi sijelo sike sin sina sinpin sitelen sona soweli suli<br>
-suno supa suwi tan taso tawa telo tenpo toki tomo tu unpa uta utala walo wan waso wawa weka wile<br>
-[].:ijklmpst,uw,te to<br>
-kijetesantakalu kin kipisi ku lanpan leko misikeke monsuta n namako soko tonsi<br>
-epiku jasima linluwi majuna meso oko su<br><br>
-</span>
+"""
+            + WORD_LIST
+            + """</span>
 <p class="tp">
 <!-- jan [sama olin namako jaki ala] li sitelen e pu kepeken wawa mute. -->
-󱤑󱦐󱥖󱥅󱥸󱤐󱤂󱦑󱤧󱥠󱤉󱥕󱤙󱥵󱤼󱦜
+"""
+            + SAMPLE_TEXT
+            + """
 </p>
-<p>License: <a href='""" + licenseurl + """'>""" + license + """</a></p>
+<p>License: <a href='"""
+            + licenseurl
+            + """'>"""
+            + license
+            + """</a></p>
 <span class="tp">
 <span style="white-space: break-spaces">
 <!-- telo oko li ken ante e pilin, by jan Ke Tami -->
@@ -338,25 +1000,147 @@ function redrawTextarea(e) {
 </script>
 """
         )
-        example_web_page.close()
+
+    def generate_family_page(
+        self, outdir, family, members, designer, license, licenseurl
+    ):
+        """Output one web page with examples of every style of a family.
+
+        Parameters
+        ----------
+        outdir : str
+            Path to output directory, with the fonts.
+        family : str
+            Family name.
+        members : list of (str, str)
+            Style name and font file name of each style.
+
+        Returns
+        -------
+        str
+            Path to the page.
+        """
+        faces = ""
+        sections = ""
+        for number, (style, filename) in enumerate(members):
+            faces += (
+                """
+    @font-face {
+        font-family: '"""
+                + family
+                + " "
+                + style
+                + """';
+        src: url('"""
+                + filename
+                + """')
+    }
+    .tp"""
+                + str(number)
+                + """ {
+        font-family: '"""
+                + family
+                + " "
+                + style
+                + """', 'Chalkboard SE', 'Comic Sans MS', sans-serif;
+    }"""
+            )
+            sections += (
+                """
+<h2>"""
+                + style
+                + """</h2>
+<p class="tp"""
+                + str(number)
+                + """">
+"""
+                + WORD_LIST
+                + """</p>
+<textarea class="tp"""
+                + str(number)
+                + """">sina ken sitelen wile lon ni</textarea>
+"""
+            )
+        path = outdir + os.sep + family.replace(" ", "-") + ".html"
+        with open(path, "w", encoding="utf-8") as page:
+            page.write(
+                """
+<meta charset="utf-8" />
+<style type=\"text/css\">"""
+                + faces
+                + """
+    body {
+        background-color: #334;
+    }
+    * {
+        font-size: 48px;
+        line-height: 1.5em;
+        color: white;
+    }
+    h1, h2, p {
+        font-family: "Chalkboard SE", "Comic Sans MS", sans-serif;
+    }
+    textarea {
+        font-size: 1em;
+        width: 20em;
+        height: 3em;
+        background-color: #223;
+        color: white;
+        padding: 1em;
+    }
+</style>
+<h1>"""
+                + family
+                + ", tan "
+                + designer
+                + """</h1>
+"""
+                + sections
+                + """
+<p>License: <a href='"""
+                + licenseurl
+                + """'>"""
+                + license
+                + """</a></p>
+"""
+            )
+        return path
+
+    def family_style(self):
+        """(family, style) of the font, from metadata or config."""
+        props = self.config["props"]
+        family = (
+            self.metadata.get("family", None)
+            or self.metadata.get("filename", None)
+            or props.get("filename", "Example")
+        )
+        style = self.metadata.get("style", None) or props.get("style", "Regular")
+        return family, style
 
     def set_properties(self):
         """Set metadata of the font from config."""
+        import uuid
+        import datetime
+
         props = self.config["props"]
         sfnt_names = self.config["sfnt_names"]
         lang = props.get("lang", "English (US)")
-        fontname = self.metadata.get("filename", None) or props.get(
-            "filename", "Example"
-        )
-        family = self.metadata.get("family", None) or fontname
-        style = props.get("style", "Regular")
+        family, style = self.family_style()
+        names = style_names(family, style)
         designer = self.metadata.get("designer", None) or props.get("designer", "jan pi toki pona")
         license = self.metadata.get("license", None) or sfnt_names.get("License", "All rights reserved")
         licenseurl = self.metadata.get("licenseurl", None) or sfnt_names.get("License URL", "")
-
-        self.font.familyname = fontname
-        self.font.fontname = fontname + "-" + style
-        self.font.fullname = fontname + " " + style
+        deterministic = self.metadata.get("deterministic", False)
+        if deterministic:
+            year = datetime.datetime.fromtimestamp(
+                source_date_epoch(), datetime.timezone.utc
+            ).year
+        else:
+            year = datetime.datetime.now().year
+
+        self.font.familyname = names["family"]
+        self.font.fontname = family.replace(" ", "") + "-" + style.replace(" ", "")
+        self.font.fullname = family + " " + style
         self.font.encoding = props.get("encoding", "UnicodeFull")
 
         for k, v in props.items():
@@ -369,12 +1153,20 @@ function redrawTextarea(e) {
         # if i can't find a string ID, i can use a numeric ID instead:
         # https://learn.microsoft.com/en-us/typography/opentype/otspec140/name#name-ids
         if self.config.get("sfnt_names", None):
-            self.config["sfnt_names"]["Family"] = family
+            self.config["sfnt_names"]["Family"] = names["family"]
             self.config["sfnt_names"]["Fullname"] = family + " " + style
-            self.config["sfnt_names"]["PostScriptName"] = family.replace(" ", "-") + "-" + style
-            self.config["sfnt_names"]["SubFamily"] = style
+            self.config["sfnt_names"]["PostScriptName"] = (
+                family.replace(" ", "-") + "-" + style.replace(" ", "")
+            )
+            self.config["sfnt_names"]["SubFamily"] = names["subfamily"]
+            if names["typographic"]:
+                # name IDs 16 and 17
+                self.config["sfnt_names"]["Preferred Family"] = family
+                self.config["sfnt_names"]["Preferred Styles"] = style
             self.config["sfnt_names"]["Designer"] = designer
-            self.config["sfnt_names"]["Copyright"] = "(C) Copyright " + designer + ", " + str(datetime.datetime.now().year)
+            self.config["sfnt_names"]["Copyright"] = (
+                "(C) Copyright " + designer + ", " + str(year)
+            )
             self.config["sfnt_names"]["License"] = license
             self.config["sfnt_names"]["License URL"] = licenseurl
             if license == "ofl":
@@ -384,13 +1176,27 @@ function redrawTextarea(e) {
                 self.config["sfnt_names"]["License"] = "CC0 1.0 Universal"
                 self.config["sfnt_names"]["License URL"] = "https://creativecommons.org/publicdomain/zero/1.0/"
 
-
-        self.config["sfnt_names"]["UniqueID"] = family + " " + str(uuid.uuid4())
+        if deterministic:
+            # same inputs, same ID
+            unique_id = uuid.uuid5(uuid.NAMESPACE_OID, self.metadata.get("buildid", ""))
+        else:
+            unique_id = uuid.uuid4()
+        self.config["sfnt_names"]["UniqueID"] = family + " " + str(unique_id)
 
         for k, v in self.config.get("sfnt_names", {}).items():
             self.font.appendSFNTName(str(lang), k, v)
 
-    def add_glyphs(self, directory, metadata, version_major, version_minor, version_patch):
+    def add_glyphs(
+        self,
+        directory,
+        metadata,
+        version_major,
+        version_minor,
+        version_patch,
+        stream=None,
+        shard=None,
+        merge=None,
+    ):
         """Read and add SVG images as glyphs to the font.
 
         Walks through the provided directory and uses each ord(character).svg file
@@ -401,13 +1207,25 @@ function redrawTextarea(e) {
         ----------
         directory : str
             Path to directory with SVGs to be converted.
+        stream : binary file, optional
+            Read the glyphs' SVGs from this stream (stdin, in --stream mode)
+            as they get traced, instead of from the glyph store. Every glyph in
+            the config is created first, in config order, so the font comes
+            out the same whatever order they arrive in.
+        shard : (int, int), optional
+            (index, count): only import and place every count-th glyph of the
+            config, starting at index, and skip the rest of the font setup.
+            The partial font is merged by a `merge` run.
+        merge : int, optional
+            Instead of importing SVGs, copy the glyphs placed by `merge`
+            shard runs (see shard_path) into this font.
         """
 
         # print("Note: If you leave a glyph blank, you'll get a FontForge error like \"I'm")
         # print("      sorry this file is too complex for me to understand (or is erroneous)\".")
         # print("      It's fine, the font still works!")
 
-        import psMat
+        glyphs = {}
         for glyph_object in self.config["glyphs-fancy"]:
             if 'name' in glyph_object:
                 name = glyph_object['name']
@@ -421,92 +1239,31 @@ function redrawTextarea(e) {
                     g = self.font.createChar(-1, name)
                 else:
                     g = self.font.createChar(cp, name)
-                # Get outlines
-                src = "{}/{}.svg".format(name, name)
-                src = directory + os.sep + src
-
-                # importOutlines() will print FontForge errors for blank glyphs.
-                # Prepend what glyph they refer to.
-                print("", end=("\r" + name.ljust(9, " ") + " - "))
-                g.importOutlines(src, ("removeoverlap", "correctdir"))
-                g.removeOverlap()
-
-                if version_major <3:
-                    # SHEET VERSION 2 metrics, before scaling (BS) up so that the glyph is the full em height
-                    bs_scan_hor_padding = 50
-                    bs_glyph_wh = 700
-                else:
-                    # SHEET VERSION 3 metrics, before scaling (BS) up so that the glyph is the full em height
-                    bs_scan_hor_padding = 125
-                    bs_glyph_wh = 500
-
-                # shift by the left margin. (i'm not actually sure why this is necessary, but it looks wrong without it)
-                # (like, why don't i have to shift it vertically??)
-                g.transform(psMat.translate(
-                    -bs_scan_hor_padding, 
-                    0
-                ))
-
-                # Vertically center sitelen pona, middot, colon
-                # Todo: just center everything *except* certain glyphs
-                    # do NOT center a-z, cartouches, long pi, te/to
-                if (    
-                    0xf1900 <= cp <= 0xf1988 or      # pu & ku suli
-                    0xf19a0 <= cp <= 0xf19a3 or      # historical
-                    cp == 0xf199c or cp == 0x2e or   # period
-                    cp == 0xf199d or cp == 0x3a or   # colon
-                    cp == 0x61 or                    # a
-                    cp == 0x65 or                    # e
-                    cp == 0x6e or                    # n
-                    cp == 0x6f                       # o
-                ):
-                    bottom = g.boundingBox()[1]
-                    top    = g.boundingBox()[3]
-                    g.transform(psMat.translate(
-                        0, 
-                        self.font.ascent - top - (self.font.ascent + self.font.descent - (top - bottom)) / 2
-                    ))
-                    x = 1
-
-                # Horizontally center sitelen pona, middot, colon, letters
-                # Todo: just center everything *except* certain glyphs
-                    # do NOT center cartouches, long pi, te/to
-                if (
-                    0xf1900 <= cp <= 0xf1988 or      # pu & ku suli
-                    0xf19a0 <= cp <= 0xf19a3 or      # historical
-                    cp == 0xf199c or cp == 0x2e or   # period
-                    cp == 0xf199d or cp == 0x3a or   # colon
-                    0x61 <= cp <= 0x7a               # aeijklmnopstuw
-                ):
-                    left  = g.boundingBox()[0]
-                    right = g.boundingBox()[2]
-                    width = right - left
-                    g.transform(psMat.translate(
-                        bs_glyph_wh - right - (bs_glyph_wh - width) / 2, 
-                        0
-                    ))
-                    x = 1
-
-                # Scale everything up so that the glyphs are 1em tall, instead of the cartouches
-                # The scaling center is the baseline, far left
-                g.transform(psMat.translate(
-                    -bs_glyph_wh / 2, # 700/2
-                    -(bs_glyph_wh + bs_scan_hor_padding) / 2  # (700+50)/2
-                ))
-                g.transform(psMat.scale(1 / bs_glyph_wh * 1000)) # divide by the SAFE area height; multiply by the SCAN area height
-                g.transform(psMat.translate(
-                    500, 
-                    500
-                ))
-
-
-
-                # print(g.width, g.vwidth)
-                g.width = 1000
-                g.vwidth = 1000
+                glyphs[name] = (g, cp)
+
+        if merge is not None:
+            sources = ()
+            self.merge_shards(directory, glyphs, merge)
+        elif stream is not None:
+            sources = streamed_sources(stream)
+        else:
+            names = list(glyphs)
+            if shard is not None:
+                index, count = shard
+                names = names[index::count]
+            store = load_glyphstore().open_store(directory, self.metadata)
+            sources = (
+                (name, store.open_path(name, ".svg"), store.info(name)["placement"])
+                for name in names
+            )
+        for name, source, placement in sources:
+            if name in glyphs:
+                g, cp = glyphs[name]
+                self.import_glyph(g, source, placement)
 
-        # get rid of stray metrics
-        print("\r                                                ")
+        if shard is not None:
+            # the merge run does the rest
+            return
 
         # originally 800x1000, minus 50 margin on each side for scanning margin
         # ...though the vertical situation might be more complicated?
@@ -532,10 +1289,8 @@ function redrawTextarea(e) {
             #       "bottom", int(g.boundingBox()[1]), "top",   int(g.boundingBox()[3]))
 
         # combining cartouche extension (the middle of the cartouche)
-        self.font[0xf1992].width = 0
-        self.font[0xf1992].transform(psMat.translate(-1000, 0))
-        self.font[0x5f].width = 0
-        self.font[0x5f].transform(psMat.translate(-1000, 0))
+        for cp in COMBINING_GLYPHS:
+            self.shift_combining(self.font[cp])
 
         # later i should move these into default.json
         # spaces
@@ -580,8 +1335,68 @@ function redrawTextarea(e) {
         sp_end_of_reverse_long_glyph = self.font.createChar(0xf199b)
         sp_end_of_reverse_long_glyph.width = 0
 
+    def import_glyph(self, g, source, placement):
+        """Import a glyph's SVG into FontForge glyph `g`, and place it."""
+        # Get outlines
+        with source as src:
+            # the "removeoverlap" flag already removes overlaps
+            g.importOutlines(src, ("removeoverlap", "correctdir"))
+
+        # one transform, worked out from the outline's bounds before
+        # FontForge started (see handwrite.placement)
+        g.transform(tuple(placement))
+
+        # print(g.width, g.vwidth)
+        g.width = 1000
+        g.vwidth = 1000
+        if self.report_progress:
+            sys.stdout.write(PROGRESS_PREFIX + g.glyphname + "\n")
+            sys.stdout.flush()
+
+    def shift_combining(self, g):
+        """Make a combining glyph zero-width, drawn over the glyph before it."""
+        import psMat
+
+        g.width = 0
+        g.transform(psMat.translate(-1000, 0))
+
+    def patch_glyphs(self, directory, names):
+        """Reimport some glyphs of the font built earlier (self.font), from the glyph store.
+
+        Every other glyph, and the font's names and properties, stay as they were.
+        """
+        import fontforge
+
+        store = load_glyphstore().open_store(directory, self.metadata)
+        for name in names:
+            g = self.font[name]
+            g.foreground = fontforge.layer()
+            self.import_glyph(
+                g, store.open_path(name, ".svg"), store.info(name)["placement"]
+            )
+            if g.unicode in COMBINING_GLYPHS:
+                self.shift_combining(g)
+
+    def merge_shards(self, directory, glyphs, count):
+        """Copy the glyphs placed by `count` --shard runs into this font.
+
+        Every glyph was already created here in config order, so names,
+        encodings and glyph order are the same as in a serial build.
+        """
+        import fontforge
+
+        names = list(glyphs)
+        for index in range(count):
+            shard = fontforge.open(shard_path(directory, index))
+            for name in names[index::count]:
+                g, cp = glyphs[name]
+                g.foreground = shard[name].foreground
+                g.width = 1000
+                g.vwidth = 1000
+            shard.close()
+
     def generate_font_file(self, filename, outdir, config_file, directory):
-        """Output TTF file.
+        """Output TTF (or OTF, see font_format) file.
 
         Additionally checks for multiple outputs and duplicates.
 
@@ -601,7 +1416,7 @@ function redrawTextarea(e) {
             directory
             + os.sep
             # + (filename + ".ttf" if not filename.endswith(".ttf") else filename)
-            + (filename + " without ligatures.ttf")
+            + (filename + " without ligatures" + font_extension(self.metadata))
         )
 
         # while os.path.exists(outfile):
@@ -612,7 +1427,21 @@ function redrawTextarea(e) {
         self.font.generate(outfile)
         self.font.save(outfile[0:-4] + ".sfd")
 
-    def convert_main(self, config_file, directory, outdir, metadata, v_major, v_minor, v_patch):
+    def convert_main(
+        self,
+        config_file,
+        directory,
+        outdir,
+        metadata,
+        v_major,
+        v_minor,
+        v_patch,
+        stream=False,
+        shard=None,
+        merge=None,
+        progress=False,
+        patch=None,
+    ):
         try:
             self.font = fontforge.font()
         except:
@@ -622,19 +1451,64 @@ function redrawTextarea(e) {
         with open(config_file) as f:
             self.config = json.load(f)
         self.metadata = json.loads(metadata) or {}
+        self.report_progress = progress
+        filename = self.metadata.get("filename", None) or self.config["props"].get(
+            "filename", None
+        )
+
+        if patch is not None:
+            # start from the font saved by the earlier build
+            self.font = fontforge.open(
+                os.path.join(directory, str(filename) + " without ligatures.sfd")
+            )
+            self.patch_glyphs(directory, patch)
+            self.generate_font_file(str(filename), outdir, config_file, directory)
+            return
 
         self.font = fontforge.font()
         self.set_properties()
-        self.add_glyphs(directory, metadata, int(v_major), int(v_minor), int(v_patch))
-
-        # Generate font and save as a .ttf file
-        filename = self.metadata.get("filename", None) or self.config["props"].get(
-            "filename", None
+        self.add_glyphs(
+            directory,
+            metadata,
+            int(v_major),
+            int(v_minor),
+            int(v_patch),
+            stream=sys.stdin.buffer if stream else None,
+            shard=shard,
+            merge=merge,
         )
+        if shard is not None:
+            self.font.save(shard_path(directory, shard[0]))
+            return
+
+        # Generate font and save as a .ttf (or .otf) file
         self.generate_font_file(str(filename), outdir, config_file, directory)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 8:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    options = [option for option in sys.argv[8:] if option != "--progress"]
+    if len(sys.argv) < 8 or not (
+        options in ([], ["--stream"])
+        or len(options) == 2
+        and options[0] in ("--shard", "--merge", "--patch")
+    ):
         raise ValueError("Incorrect call to SVGtoTTF")
-    SVGtoTTF().convert_main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], sys.argv[7])
+    SVGtoTTF().convert_main(
+        sys.argv[1],
+        sys.argv[2],
+        sys.argv[3],
+        sys.argv[4],
+        sys.argv[5],
+        sys.argv[6],
+        sys.argv[7],
+        stream=options == ["--stream"],
+        shard=(
+            tuple(int(n) for n in options[1].split("/"))
+            if options[:1] == ["--shard"]
+            else None
+        ),
+        merge=int(options[1]) if options[:1] == ["--merge"] else None,
+        progress="--progress" in sys.argv[8:],
+        patch=options[1].split(",") if options[:1] == ["--patch"] else None,
+    )
@@ -0,0 +1,238 @@
+"""Try several ink thresholds on a sheet, without building a font for each.
+
+The sheet is decoded and cut into cells once. Every cell is resized like
+PNGtoSVG does, and the thresholds are all applied to the stack of cells at
+once, so a sweep costs about as much as one SHEETtoPNG run.
+"""
+
+import os
+import json
+
+import cv2
+import numpy as np
+
+from handwrite.cells import CellPool
+from handwrite.pngtosvg import DEFAULT_THRESHOLD, histograms, otsu_thresholds
+from handwrite.preflight import sheet_list, with_sheet_version
+from handwrite.sheettopng import SHEETtoPNG, page_cells
+
+DEFAULT_THRESHOLDS = [150, 175, 200, 225]
+
+
+def sheet_levels(sheet, config, metadata=None, workers=1):
+    """Cut a sheet into cells and return their ink levels.
+
+    Parameters
+    ----------
+    sheet : str or list of str
+        Path to the sheet, or to each page of a sheet set.
+    config : str
+        Path to config file.
+    metadata : dict, optional
+        Dictionary containing the metadata (sheetversion, ...)
+    workers : int, default=1
+        Prepare the cells in this many processes (see handwrite.cells).
+
+    Returns
+    -------
+    names : list of str
+        Glyph names, in the order they were cut.
+    levels : numpy.ndarray
+        uint8 array (cells, height, width): the ink level (see
+        pngtosvg.ink_levels) of each cell, at PNGtoSVG's tracing size.
+    """
+    with open(config) as f:
+        config_data = json.load(f)
+    metadata = with_sheet_version(sheet, config_data, metadata)
+    threshold_value = config_data.get("threshold_value", 200)
+    converter = SHEETtoPNG()
+    names, levels = [], []
+    with CellPool(workers) as pool:
+        for page, path in enumerate(sheet_list(sheet)):
+            # no debug images
+            characters = converter.detect_characters(
+                None, path, threshold_value, metadata
+            )
+            page_names = page_cells(config_data.get("glyphs-fancy", []), page)
+            cells, page_levels = pool.levels(characters, page_names, metadata)
+            names += [page_names[cell] for cell in cells]
+            levels.append(page_levels)
+            del characters
+    return names, np.concatenate(levels)
+
+
+def contour_counts(masks):
+    """Number of outlines (including holes) potrace would find in each mask."""
+    return np.array(
+        [
+            len(
+                cv2.findContours(
+                    mask.astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE
+                )[0]
+            )
+            for mask in masks
+        ]
+    )
+
+
+class SweepReport:
+    """Ink coverage and contour counts of each cell, at each threshold.
+
+    Attributes
+    ----------
+    names : list of str
+        Glyph names.
+    labels : list of str
+        One per threshold tried: the number, "otsu" for the sheet's Otsu
+        threshold, and "otsu per cell".
+    thresholds : numpy.ndarray
+        int array (thresholds, cells) of the threshold each cell got.
+    coverage : numpy.ndarray
+        Fraction of each cell that's ink, shaped like `thresholds`.
+    contours : numpy.ndarray
+        Number of outlines in each cell, shaped like `thresholds`.
+    """
+
+    def __init__(self, names, labels, thresholds, coverage, contours):
+        self.names = names
+        self.labels = labels
+        self.thresholds = thresholds
+        self.coverage = coverage
+        self.contours = contours
+
+    def summary(self):
+        """One dict per threshold: mean coverage, total contours, blank cells."""
+        return [
+            {
+                "threshold": label,
+                "coverage": float(coverage.mean()) if coverage.size else 0.0,
+                "contours": int(contours.sum()),
+                "blank": int((coverage == 0).sum()),
+            }
+            for label, coverage, contours in zip(
+                self.labels, self.coverage, self.contours
+            )
+        ]
+
+    def as_dict(self):
+        return {
+            "summary": self.summary(),
+            "cells": {
+                name: {
+                    label: {
+                        "threshold": int(self.thresholds[row, cell]),
+                        "coverage": round(float(self.coverage[row, cell]), 4),
+                        "contours": int(self.contours[row, cell]),
+                    }
+                    for row, label in enumerate(self.labels)
+                }
+                for cell, name in enumerate(self.names)
+            },
+        }
+
+    def __str__(self):
+        lines = ["threshold      coverage  contours  blank"]
+        for row in self.summary():
+            lines.append(
+                "{threshold:<13} {coverage:>9.3f} {contours:>9} {blank:>6}".format(
+                    **row
+                )
+            )
+        return "\n".join(lines)
+
+
+def sweep(sheet, config, thresholds=None, metadata=None, workers=1):
+    """Apply several thresholds to every cell of a sheet.
+
+    Parameters
+    ----------
+    sheet : str or list of str
+        Path to the sheet, or to each page of a sheet set.
+    config : str
+        Path to config file.
+    thresholds : list of int, optional
+        Thresholds to try (DEFAULT_THRESHOLDS by default). The sheet's Otsu
+        threshold, and each cell's own (see pngtosvg.cell_threshold), are
+        always tried too.
+    metadata : dict, optional
+        Dictionary containing the metadata (sheetversion, ...)
+    workers : int, default=1
+        Prepare the cells in this many processes.
+
+    Returns
+    -------
+    SweepReport
+    """
+    names, levels = sheet_levels(sheet, config, metadata, workers)
+    thresholds = list(thresholds or DEFAULT_THRESHOLDS)
+    hist = histograms(levels)
+    sheet_otsu = int(otsu_thresholds(hist.sum(axis=0))[0])
+    per_cell = np.minimum(otsu_thresholds(hist), DEFAULT_THRESHOLD)
+
+    labels = [str(t) for t in thresholds] + ["otsu", "otsu per cell"]
+    chosen = np.array(
+        [np.full(len(names), t) for t in thresholds + [sheet_otsu]] + [per_cell]
+    )
+    # ink is below the threshold, so a cell's coverage at t is its
+    # histogram summed up to t - 1
+    below = np.concatenate(
+        [np.zeros((len(names), 1), hist.dtype), np.cumsum(hist, axis=1)], axis=1
+    )
+    coverage = np.take_along_axis(below, chosen.T, axis=1).T / levels[0].size
+    # every mask of every cell, in one go
+    masks = levels[None] < chosen[:, :, None, None]
+    contours = np.array([contour_counts(row) for row in masks])
+    return SweepReport(names, labels, chosen, coverage, contours)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Show how much of each cell is ink, at several thresholds"
+    )
+    parser.add_argument(
+        "sheet", nargs="+", help="Path to sample sheet (or one per page)"
+    )
+    parser.add_argument(
+        "--thresholds",
+        help="Comma separated thresholds to try (%s by default)"
+        % ",".join(map(str, DEFAULT_THRESHOLDS)),
+        default=None,
+    )
+    parser.add_argument("--config", help="Use custom configuration file", default=None)
+    parser.add_argument(
+        "--sheet-version",
+        help="Sheet version (worked out from the sheet by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--json", help="Print per-cell results as JSON", action="store_true"
+    )
+    parser.add_argument(
+        "--workers",
+        help="Prepare the cells in this many processes (1 by default)",
+        type=int,
+        default=1,
+    )
+    args = parser.parse_args()
+
+    if args.config is None:
+        args.config = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), "default.json"
+        )
+    thresholds = None
+    if args.thresholds:
+        thresholds = [int(t) for t in args.thresholds.split(",")]
+    sheet = args.sheet[0] if len(args.sheet) == 1 else args.sheet
+    report = sweep(
+        sheet,
+        args.config,
+        thresholds,
+        {"sheetversion": args.sheet_version},
+        args.workers,
+    )
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        print(report)
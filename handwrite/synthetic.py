@@ -0,0 +1,463 @@
+"""Filled-in sheets, made up, for benchmarks and tests.
+
+Draws the row boxes and gray squares of a sheet version with the geometry
+detect_characters cuts by (preflight.SHEET_GRIDS), and fills the cells of
+the config's glyphs, either with the glyphs of an existing font (a font
+handwrite made has the same glyph names as the config, other fonts are
+looked up by codepoint) or with random strokes. It can then rotate the page,
+add noise and JPEG artifacts, like a scan.
+
+There's no header, labels or license text, only what handwrite reads.
+
+A sheet depends only on the options and its seed (and page), so a corpus of
+thousands of sheets can be made again anywhere, rather than stored.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from handwrite.preflight import SHEET_GRIDS, sheet_major_version
+from handwrite.sheettopng import page_cells, page_count
+
+# Size of a grid unit on the printed page, by major sheet version
+GRID_UNIT_CM = {
+    2: 0.125,
+    3: 1 / 6,
+}
+# Distance between the tops of two row boxes, in grid units (the labels
+# go in between on real sheets)
+ROW_PITCH = {
+    2: 22,
+    3: 15,
+}
+PAGE_INCHES = (8.5, 11)  # US Letter
+ROWS = 9
+COLS = 20
+
+PAPER = 250
+INK = 30
+GRAY_SQUARE = 215  # lighter than the default threshold_value, so it's not ink
+ROW_LINE = 0.2  # grid units
+GRAY_LINE = 0.08  # grid units
+
+
+def smooth(points, iterations=2):
+    """Round the corners of a polyline (Chaikin's algorithm)."""
+    for _ in range(iterations):
+        start, stop = points[:-1], points[1:]
+        middle = np.empty((2 * len(start), 2))
+        middle[0::2] = 0.75 * start + 0.25 * stop
+        middle[1::2] = 0.25 * start + 0.75 * stop
+        points = np.vstack([points[:1], middle, points[-1:]])
+    return points
+
+
+def blend_ink(page, polygons=(), strokes=(), width=1.0, supersample=4):
+    """Draw anti-aliased ink on a grayscale page, in place.
+
+    Parameters
+    ----------
+    page : numpy.ndarray
+        uint8 page.
+    polygons : list of numpy.ndarray
+        Filled with the even-odd rule, in page pixels.
+    strokes : list of numpy.ndarray
+        Open polylines, in page pixels.
+    width : float, default=1.0
+        Stroke width, in pixels.
+    supersample : int, default=4
+        The ink is drawn this many times bigger, then scaled down.
+    """
+    shapes = list(polygons) + list(strokes)
+    if not shapes:
+        return
+    points = np.vstack(shapes)
+    left, top = np.floor(points.min(axis=0) - width).astype(int)
+    right, bottom = np.ceil(points.max(axis=0) + width).astype(int) + 1
+    left, top = max(left, 0), max(top, 0)
+    right, bottom = min(right, page.shape[1]), min(bottom, page.shape[0])
+    if right <= left or bottom <= top:
+        return
+    shape = ((bottom - top) * supersample, (right - left) * supersample)
+
+    def scaled(shape_points):
+        # pixel edges on integers, like the fidelity canvas
+        return np.round(((shape_points - (left, top)) * supersample - 0.5) * 16).astype(
+            np.int32
+        )
+
+    mask = np.zeros(shape, np.uint8)
+    for polygon in polygons:
+        layer = np.zeros(shape, np.uint8)
+        cv2.fillPoly(layer, [scaled(polygon)], 1, lineType=cv2.LINE_8, shift=4)
+        mask ^= layer
+    for stroke in strokes:
+        cv2.polylines(
+            mask,
+            [scaled(stroke)],
+            False,
+            1,
+            thickness=max(1, int(round(width * supersample))),
+            lineType=cv2.LINE_8,
+            shift=4,
+        )
+    alpha = cv2.resize(
+        mask.astype(np.float32),
+        (right - left, bottom - top),
+        interpolation=cv2.INTER_AREA,
+    )
+    region = page[top:bottom, left:right]
+    region[...] = np.round(region * (1 - alpha) + INK * alpha).astype(np.uint8)
+
+
+def font_outlines(font, glyphs):
+    """Flattened outlines of the glyphs of a font that a config's glyphs map to.
+
+    A config glyph maps to the font's glyph of the same name, or else to the
+    one at its codepoint.
+
+    Parameters
+    ----------
+    font : str
+        Path to a TTF or OTF.
+    glyphs : list of dict
+        The config's "glyphs-fancy" list.
+
+    Returns
+    -------
+    outlines : dict
+        Config glyph name to (list of contours in font units, advance width).
+        Glyphs the font doesn't have (or that are empty) are left out.
+    em : (float, float)
+        Units per em and the (negative) descender.
+    """
+    from fontTools.ttLib import TTFont
+
+    from handwrite.fidelity import PolygonPen
+
+    tt = TTFont(font)
+    glyph_set = tt.getGlyphSet()
+    cmap = tt.getBestCmap() or {}
+    outlines = {}
+    for glyph_object in glyphs:
+        name = glyph_object.get("name")
+        if name is None:
+            continue
+        font_name = (
+            name
+            if name in glyph_set
+            else cmap.get(int(glyph_object.get("codepoint", "0"), 16))
+        )
+        if font_name is None:
+            continue
+        pen = PolygonPen(glyph_set)
+        glyph_set[font_name].draw(pen)
+        if pen.contours:
+            outlines[name] = (
+                [np.asarray(c, float) for c in pen.contours],
+                glyph_set[font_name].width,
+            )
+    upm = tt["head"].unitsPerEm
+    descender = tt["OS/2"].sTypoDescender if "OS/2" in tt else -0.2 * upm
+    tt.close()
+    return outlines, (upm, descender)
+
+
+class SyntheticSheets:
+    """Make up filled-in sheets.
+
+    Parameters
+    ----------
+    config : str, optional
+        Path to config file. The config's glyphs say which cells are
+        filled, and on how many pages.
+    font : str, optional
+        Draw the glyphs of this TTF/OTF. Random strokes by default. Glyphs
+        the font doesn't have are left blank.
+    metadata : dict, optional
+        Dictionary containing the metadata; only "sheetversion" is used.
+    dpi : int, default=300
+        Resolution of the "scan".
+    rotation : float, default=0
+        Rotate each page by a random angle of up to this many degrees,
+        either way.
+    noise : float, default=0
+        Standard deviation of the gaussian noise added to each pixel, in
+        gray levels.
+    blank : float, default=0
+        Fraction of the cells (picked at random) left blank.
+    jpeg_quality : int, optional
+        Compress as a JPEG of this quality (0 to 100). Lossless by default.
+    """
+
+    def __init__(
+        self,
+        config=None,
+        font=None,
+        metadata=None,
+        dpi=300,
+        rotation=0.0,
+        noise=0.0,
+        blank=0.0,
+        jpeg_quality=None,
+    ):
+        import json
+
+        if config is None:
+            config = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "default.json"
+            )
+        with open(config) as f:
+            self.glyphs = json.load(f).get("glyphs-fancy", [])
+        self.pages = page_count(self.glyphs)
+        self.version = sheet_major_version(metadata)
+        self.grid = SHEET_GRIDS[self.version]
+        self.dpi = dpi
+        self.rotation = rotation
+        self.noise = noise
+        self.blank = blank
+        self.jpeg_quality = jpeg_quality
+        self.outlines = font_outlines(font, self.glyphs) if font else None
+        # pixels per grid unit
+        self.unit = dpi * GRID_UNIT_CM[self.version] / 2.54
+        self.size = (int(round(PAGE_INCHES[0] * dpi)), int(round(PAGE_INCHES[1] * dpi)))
+
+    def row_boxes(self):
+        """(x, y, w, h) of each row box, in pixels, before rotation.
+
+        That's what detect_characters should find on an unrotated sheet.
+        """
+        grid = self.grid
+        width, height = grid["row_w"] * self.unit, grid["row_h"] * self.unit
+        pitch = ROW_PITCH[self.version] * self.unit
+        left = int(round((self.size[0] - width) / 2))
+        top = (self.size[1] - (ROWS - 1) * pitch - height) / 2
+        return [
+            (left, int(round(top + row * pitch)), int(round(width)), int(round(height)))
+            for row in range(ROWS)
+        ]
+
+    def squares(self):
+        """(left, top, side) of each cell's gray square, in (float) pixels."""
+        grid = self.grid
+        squares = []
+        for x, y, w, h in self.row_boxes():
+            unit_w, unit_h = w / grid["row_w"], h / grid["row_h"]
+            for col in range(COLS):
+                # like detect_characters: the scan area, then the gray square
+                # centered in it
+                scan_left = x + (grid["hor_padding"] + col * grid["scan_w"]) * unit_w
+                scan_top = y + grid["ver_padding"] * unit_h
+                side = grid["glyph_w"] * unit_w
+                squares.append(
+                    [
+                        scan_left + (grid["scan_w"] * unit_w - side) / 2,
+                        scan_top + (grid["scan_h"] * unit_h - side) / 2,
+                        side,
+                    ]
+                )
+        # the cartouche ends' gray boxes are shifted inward
+        shift = grid["scan_hor_padding"] * self.unit
+        squares[120][0] += shift
+        squares[121][0] -= shift
+        return squares
+
+    def glyph_ink(self, name, square, rng):
+        """Polygons, strokes and stroke width of one glyph, in pixels."""
+        left, top, side = square
+        if self.outlines is None:
+            strokes = []
+            for _ in range(rng.integers(1, 4)):
+                points = rng.uniform(0.1, 0.9, (rng.integers(2, 6), 2)) * side + (
+                    left,
+                    top,
+                )
+                strokes.append(smooth(points))
+            return [], strokes, side * rng.uniform(0.03, 0.07)
+        outlines, (upm, descender) = self.outlines
+        if name not in outlines:
+            return [], [], 0
+        contours, advance = outlines[name]
+        # the em square fills the gray square, centered on the advance width
+        scale = side / upm
+        offset = np.array(
+            [left + (upm - advance) / 2 * scale, top + (upm + descender) * scale]
+        )
+        return [offset + contour * (scale, -scale) for contour in contours], [], 0
+
+    def draw(self, seed=0, page=0):
+        """A clean sheet, before noise and compression, as a grayscale array."""
+        image = np.full(self.size[::-1], PAPER, np.uint8)
+        row_line = max(1, int(round(ROW_LINE * self.unit)))
+        gray_line = max(1, int(round(GRAY_LINE * self.unit)))
+        for x, y, w, h in self.row_boxes():
+            # the line's outer edge is the box, like cv2.boundingRect finds it
+            image[y : y + h, x : x + w] = INK
+            image[y + row_line : y + h - row_line, x + row_line : x + w - row_line] = (
+                PAPER
+            )
+        squares = self.squares()
+        for left, top, side in squares:
+            cv2.rectangle(
+                image,
+                (int(round(left)), int(round(top))),
+                (int(round(left + side)), int(round(top + side))),
+                GRAY_SQUARE,
+                gray_line,
+            )
+        names = page_cells(self.glyphs, page, COLS)
+        for cell, square in enumerate(squares):
+            if cell not in names:
+                continue
+            # each cell has its own random numbers, so blanking one doesn't
+            # change what's drawn in the others
+            rng = np.random.default_rng([seed, page, cell])
+            if rng.random() < self.blank:
+                continue
+            polygons, strokes, width = self.glyph_ink(names[cell], square, rng)
+            blend_ink(image, polygons, strokes, width)
+        return image
+
+    def render(self, seed=0, page=0):
+        """A sheet, as a BGR array (like cv2.imread returns).
+
+        Parameters
+        ----------
+        seed : int, default=0
+            The same seed (and options) always makes the same sheet.
+        page : int, default=0
+            Page of the sheet set, counting from 0.
+        """
+        image = self.scan(self.draw(seed, page), seed, page)
+        if self.jpeg_quality is not None:
+            image = cv2.imdecode(self.compress(image), cv2.IMREAD_GRAYSCALE)
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    def encode(self, seed=0, page=0):
+        """A sheet as the contents of an image file: JPEG with `jpeg_quality`, PNG without."""
+        image = cv2.cvtColor(
+            self.scan(self.draw(seed, page), seed, page), cv2.COLOR_GRAY2BGR
+        )
+        if self.jpeg_quality is not None:
+            return self.compress(image).tobytes()
+        return cv2.imencode(".png", image)[1].tobytes()
+
+    def extension(self):
+        return ".jpg" if self.jpeg_quality is not None else ".png"
+
+    def scan(self, image, seed, page):
+        """Rotate a clean sheet and add noise."""
+        # a different stream than the cells', from the same seed
+        rng = np.random.default_rng([seed, page])
+        angle = rng.uniform(-self.rotation, self.rotation) if self.rotation else 0
+        if angle:
+            height, width = image.shape
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+            image = cv2.warpAffine(
+                image,
+                matrix,
+                (width, height),
+                flags=cv2.INTER_LINEAR,
+                borderValue=PAPER,
+            )
+        if self.noise:
+            noisy = (
+                image + rng.standard_normal(image.shape, dtype=np.float32) * self.noise
+            )
+            image = np.clip(np.round(noisy), 0, 255).astype(np.uint8)
+        return image
+
+    def compress(self, image):
+        return cv2.imencode(
+            ".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)]
+        )[1]
+
+    def write(self, directory, count, seed=0):
+        """Write `count` sheets (or sheet sets) to a directory.
+
+        Sheet n is made with seed `seed + n`, and is saved as
+        sheet-NNNNN.png (or .jpg), or sheet-NNNNN-pP.png for each page of a
+        sheet set.
+
+        Returns
+        -------
+        list of str
+            Paths of the sheets written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for n in range(count):
+            for page in range(self.pages):
+                name = "sheet-%05d" % n
+                if self.pages > 1:
+                    name += "-p%d" % (page + 1)
+                path = os.path.join(directory, name + self.extension())
+                with open(path, "wb") as f:
+                    f.write(self.encode(seed + n, page))
+                paths.append(path)
+        return paths
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Make up filled-in sheets, for benchmarks and tests"
+    )
+    parser.add_argument("output_directory", help="Directory to write the sheets to")
+    parser.add_argument(
+        "--count", help="Number of sheets (1 by default)", type=int, default=1
+    )
+    parser.add_argument(
+        "--seed", help="Seed of the first sheet (0 by default)", type=int, default=0
+    )
+    parser.add_argument("--config", help="Use custom configuration file", default=None)
+    parser.add_argument("--sheet-version", help="Sheet version", default=None)
+    parser.add_argument(
+        "--font",
+        help="Draw the glyphs of this font (random strokes by default)",
+        default=None,
+    )
+    parser.add_argument(
+        "--dpi", help="Resolution (300 by default)", type=int, default=300
+    )
+    parser.add_argument(
+        "--rotation",
+        help="Rotate by up to this many degrees (0 by default)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--noise",
+        help="Gaussian noise, in gray levels (0 by default)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--blank",
+        help="Fraction of the cells left blank (0 by default)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        help="Save as JPEG of this quality (PNG by default)",
+        type=int,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    sheets = SyntheticSheets(
+        args.config,
+        args.font,
+        {"sheetversion": args.sheet_version},
+        args.dpi,
+        args.rotation,
+        args.noise,
+        args.blank,
+        args.jpeg_quality,
+    )
+    for path in sheets.write(args.output_directory, args.count, args.seed):
+        print(path)
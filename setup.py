@@ -15,6 +15,8 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     install_requires=["opencv-python", "Pillow"],
     extras_require={
+        "otf": ["cffsubr"],
+        "specimen": ["uharfbuzz"],
         "dev": [
             "pre-commit",
             "black",
@@ -23,10 +25,19 @@ setuptools.setup(
             "pymdown-extensions==8.2",
             "mkdocstrings>=0.16.1",
             "pytkdocs[numpy-style]",
-        ]
+        ],
     },
     entry_points={
-        "console_scripts": ["handwrite = handwrite.cli:main"],
+        "console_scripts": [
+            "handwrite = handwrite.cli:main",
+            "handwrite-export-glyphs = handwrite.glyphstore:main",
+            "handwrite-sweep = handwrite.sweep:main",
+            "handwrite-family = handwrite.family:main",
+            "handwrite-synthetic = handwrite.synthetic:main",
+            "handwrite-patch = handwrite.patch:main",
+            "handwrite-batch = handwrite.batch:main",
+            "handwrite-specimen = handwrite.specimen:main",
+        ],
     },
     include_package_data=True,
     classifiers=[
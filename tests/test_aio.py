@@ -0,0 +1,102 @@
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+from handwrite.aio import AsyncConverter, run_all, run_process
+
+
+class TestAsyncHelpers(unittest.TestCase):
+    def test_run_process(self):
+        stdout = asyncio.run(run_process(["cat"], b"abc"))
+        self.assertEqual(stdout, b"abc")
+        lines = []
+        asyncio.run(
+            run_process(
+                [sys.executable, "-c", "print(1); print(2)"], lines=lines.append
+            )
+        )
+        self.assertEqual([line.strip() for line in lines], [b"1", b"2"])
+
+    def test_cancel_kills_process(self):
+        pids = []
+
+        async def cancel_after_start():
+            task = asyncio.ensure_future(
+                run_process(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import os, time; print(os.getpid(), flush=True); time.sleep(30)",
+                    ],
+                    lines=lambda line: pids.append(int(line)),
+                )
+            )
+            while not pids:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_after_start())
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pids[0], 0)
+
+    def test_run_all_cancels_the_rest(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fail():
+            raise ValueError("no")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run_all([slow(), fail()]))
+        self.assertEqual(cancelled, [True])
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestAsyncConverter(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.sheet = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "sheettopng",
+            "sitelen-pona-pi-jan-Watesa.png",
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_concurrent_builds(self):
+        converter = AsyncConverter(potrace_limit=4, fontforge_limit=1)
+
+        async def build_two():
+            return await asyncio.gather(
+                *(
+                    converter.convert(
+                        self.sheet,
+                        os.path.join(self.temp, name),
+                        metadata={"filename": name, "sheetversion": "2"},
+                    )
+                    for name in ("One", "Two")
+                )
+            )
+
+        try:
+            fonts = asyncio.run(build_two())
+        finally:
+            converter.close()
+        for font in fonts:
+            self.assertTrue(os.path.exists(font))
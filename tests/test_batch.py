@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest import mock
+
+from handwrite.batch import WorkQueue, Worker
+
+
+def fake_build(job, output_directory, limits=None, progress=None):
+    """Stands in for a build: writes the sheet's contents as the font, and logs the job."""
+    with open(job["sheet"]) as f:
+        sheet = f.read()
+    if sheet == "broken":
+        raise ValueError("unreadable sheet")
+    with open(os.path.join(job["log"], "%s-%d" % (job["id"], os.getpid())), "w"):
+        pass
+    progress.emit("message", text="building")
+    time.sleep(0.05)
+    with open(
+        os.path.join(output_directory, job["metadata"]["filename"] + ".ttf"), "w"
+    ) as f:
+        f.write(sheet.upper())
+
+
+def work(directory, name):
+    Worker(WorkQueue(directory), name, heartbeat=0.2, build=fake_build).run(
+        True, poll=0.05
+    )
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue_directory = os.path.join(self.directory, "queue")
+        self.log = os.path.join(self.directory, "log")
+        os.makedirs(self.log)
+        self.queue = WorkQueue(self.queue_directory, lease_timeout=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def submit(self, text, job_id=None):
+        path = os.path.join(self.directory, "sheet-%s.txt" % text)
+        with open(path, "w") as f:
+            f.write(text)
+        job_id = self.queue.submit(path, {"filename": text}, job_id=job_id)
+        # so fake_build knows where to log, on every worker
+        pending = self.queue.path("pending", job_id + ".json")
+        with open(pending) as f:
+            job = json.load(f)
+        job["log"] = self.log
+        with open(pending, "w") as f:
+            json.dump(job, f)
+        return job_id
+
+    def record(self, state, job_id):
+        with open(self.queue.path(state, job_id + ".json")) as f:
+            return json.load(f)
+
+    def test_submit(self):
+        job_id = self.submit("abc")
+        job = self.record("pending", job_id)
+        # the sheet is copied into the queue
+        self.assertTrue(job["sheet"].startswith(os.path.join("sheets", job_id)))
+        with open(self.queue.resolve(job)["sheet"]) as f:
+            self.assertEqual(f.read(), "abc")
+        with self.assertRaises(ValueError):
+            self.submit("abc", job_id)
+        with self.assertRaises(ValueError):
+            self.submit("abc", "../escape")
+
+    def test_workers(self):
+        jobs = [self.submit("job%d" % number) for number in range(12)]
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(
+                target=work, args=(self.queue_directory, "worker%d" % number)
+            )
+            for number in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+        # each job built exactly once
+        self.assertEqual(
+            sorted(name.rsplit("-", 1)[0] for name in os.listdir(self.log)),
+            sorted(jobs),
+        )
+        for number, job_id in enumerate(jobs):
+            record = self.record("done", job_id)
+            self.assertEqual(record["attempts"], 1)
+            with open(os.path.join(self.queue_directory, record["outputs"][0])) as f:
+                self.assertEqual(f.read(), "JOB%d" % number)
+        status = self.queue.status()
+        self.assertEqual(
+            {
+                state: status[state]
+                for state in ("pending", "running", "done", "failed")
+            },
+            {"pending": 0, "running": 0, "done": 12, "failed": 0},
+        )
+
+    def test_reclaim(self):
+        job_id = self.submit("abc")
+        lease = self.queue.claim("crashed")
+        self.assertEqual(lease.job_id, job_id)
+        self.assertIsNone(self.queue.claim("other"))
+        # not abandoned yet
+        self.assertEqual(self.queue.reap(), [])
+        past = self.queue.now() - 10
+        os.utime(lease.path, (past, past))
+        self.assertEqual(self.queue.reap(), [job_id])
+
+        events = []
+        worker = Worker(
+            self.queue, "other", heartbeat=0.2, build=fake_build, progress=events.append
+        )
+        self.assertEqual(worker.run(True, poll=0.05), 1)
+        record = self.record("done", job_id)
+        self.assertEqual(record["attempts"], 2)
+        self.assertEqual(record["worker"], "other")
+        self.assertTrue(all(event.job == job_id for event in events))
+        self.assertEqual(events[-1].kind, "job")
+        # the crashed worker's result, if it ever comes back, is dropped
+        self.assertFalse(self.queue.finish(lease, "done", {}))
+
+    def test_interrupted_reclaim(self):
+        job_id = self.submit("abc", "alice.v2")
+        lease = self.queue.claim("crashed")
+        # a reaper that died between taking the job and putting it back
+        token = self.queue.path("tmp", "%s.0123abcd.reclaim" % job_id)
+        os.rename(self.queue.path("running", job_id + ".json"), token)
+        os.remove(lease.path)
+        past = self.queue.now() - 10
+        os.utime(token, (past, past))
+        self.assertEqual(self.queue.reap(), [job_id])
+        self.assertEqual(self.record("pending", job_id)["id"], job_id)
+
+    def test_reaped_while_finishing(self):
+        job_id = self.submit("abc")
+        lease = self.queue.claim("slow")
+        past = self.queue.now() - 10
+        for path in (lease.path, self.queue.path("running", job_id + ".json")):
+            os.utime(path, (past, past))
+        job_token = self.queue.job_token
+
+        def reap_first(job_id, suffix):
+            if suffix == ".finish":
+                # another host reaps the job once its lease is gone, before
+                # the worker moves it out of running/
+                self.assertEqual(self.queue.reap(), [job_id])
+            return job_token(job_id, suffix)
+
+        with mock.patch.object(self.queue, "job_token", reap_first):
+            self.assertFalse(self.queue.finish(lease, "done", {}))
+        # only the reaper went on with it
+        self.assertEqual(self.queue.jobs("pending"), [job_id])
+        self.assertFalse(self.queue.finished(job_id))
+        self.assertEqual(os.listdir(self.queue.path("output")), [])
+
+    def test_heartbeat_under_the_queues_lease_timeout(self):
+        # the queue already exists, with a 2 second lease timeout
+        queue = WorkQueue(self.queue_directory, lease_timeout=60)
+        with self.assertRaises(ValueError):
+            Worker(queue, heartbeat=5)
+        Worker(queue, heartbeat=1)
+
+    def test_lost_lease(self):
+        self.submit("abc")
+        lease = self.queue.claim("slow")
+
+        def build(job, output_directory, limits=None, progress=None):
+            # meanwhile, the job is taken for abandoned and given to another worker
+            past = self.queue.now() - 10
+            os.utime(lease.path, (past, past))
+            self.queue.reap()
+            self.queue.claim("other")
+            fake_build(job, output_directory, limits, progress)
+
+        self.assertIsNone(
+            Worker(self.queue, "slow", heartbeat=0.2, build=build).work(lease)
+        )
+        self.assertEqual(os.listdir(self.queue.path("output")), [])
+        self.assertEqual(self.queue.status()["running"], 1)
+        self.assertEqual(self.queue.status()["leases"][0]["worker"], "other")
+
+    def test_failure(self):
+        job_id = self.submit("broken")
+        Worker(self.queue, heartbeat=0.2, build=fake_build).run(True, poll=0.05)
+        record = self.record("failed", job_id)
+        self.assertEqual(record["error"], "ValueError: unreadable sheet")
+        self.assertEqual(record["outputs"], [])
+
+    def test_max_attempts(self):
+        job_id = self.submit("abc")
+        for _ in range(2):
+            lease = self.queue.claim("crashed")
+            past = self.queue.now() - 10
+            os.utime(lease.path, (past, past))
+            self.queue.reap()
+        Worker(self.queue, heartbeat=0.2, max_attempts=2, build=fake_build).run(
+            True, poll=0.05
+        )
+        record = self.record("failed", job_id)
+        self.assertEqual(record["error"], "Gave up after 2 attempts")
+        self.assertEqual(os.listdir(self.log), [])
@@ -0,0 +1,118 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from handwrite.cache import BuildCache, build_key
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.cache = BuildCache(os.path.join(self.temp, "cache"), max_bytes=100)
+        self.font = os.path.join(self.temp, "MyFont.ttf")
+        with open(self.font, "wb") as f:
+            f.write(b"x" * 40)
+        self.sheet_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "sheettopng",
+            "two-squares.png",
+        )
+        self.config = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "config_data",
+            "default.json",
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_build_key(self):
+        key = build_key(self.sheet_path, self.config, {"filename": "A"})
+        self.assertEqual(
+            key, build_key(self.sheet_path, self.config, {"filename": "A"})
+        )
+        self.assertNotEqual(
+            key, build_key(self.sheet_path, self.config, {"filename": "B"})
+        )
+
+    def test_miss_then_hit(self):
+        outdir = os.path.join(self.temp, "out")
+        self.assertIsNone(self.cache.get("key", outdir))
+        self.cache.put("key", [self.font])
+        outputs = self.cache.get("key", outdir)
+        self.assertEqual(outputs, [os.path.join(outdir, "MyFont.ttf")])
+        with open(outputs[0], "rb") as f:
+            self.assertEqual(f.read(), b"x" * 40)
+
+    def test_eviction(self):
+        for i, key in enumerate(["first", "second", "third"]):
+            self.cache.put(key, [self.font])
+            # make the order of use unambiguous
+            os.utime(os.path.join(self.cache.directory, key), (i, i))
+        self.assertIsNotNone(self.cache.get("third", os.path.join(self.temp, "out")))
+        self.cache.put("fourth", [self.font])
+        entries = sorted(os.listdir(self.cache.directory))
+        self.assertEqual(entries, ["fourth", "third"])
+
+    def test_staging_directories(self):
+        crashed = os.path.join(self.cache.directory, ".tmp-crashed")
+        staging = os.path.join(self.cache.directory, ".tmp-staging")
+        for path in (crashed, staging):
+            os.makedirs(path)
+            shutil.copy(self.font, path)
+        old = time.time() - 2 * 3600
+        os.utime(crashed, (old, old))
+        self.cache.put("first", [self.font])
+        # left by a crashed build: removed
+        self.assertFalse(os.path.exists(crashed))
+        # still being written: counts against the size limit
+        self.cache.put("second", [self.font])
+        self.assertEqual(
+            sorted(os.listdir(self.cache.directory)), [".tmp-staging", "second"]
+        )
+
+    def test_converters_cache_what_the_build_wrote(self):
+        from handwrite.cli import converters
+
+        cache_dir = os.path.join(self.temp, "cache")
+        outdir = os.path.join(self.temp, "out")
+
+        def run(sheet, output_directory, characters_dir, config, metadata, *args, **kw):
+            # another build writes to the same directory meanwhile
+            with open(os.path.join(output_directory, "Other.ttf"), "w") as f:
+                f.write("other")
+            outputs = []
+            for name in ("MyFont.ttf", "MyFont.html"):
+                path = os.path.join(output_directory, name)
+                if os.path.exists(path) and name == "MyFont.ttf":
+                    path = os.path.join(output_directory, "MyFont (1).ttf")
+                with open(path, "w") as f:
+                    f.write(name)
+                outputs.append(path)
+            return outputs
+
+        def build(metadata):
+            with mock.patch("handwrite.cli.run", run):
+                converters(
+                    self.sheet_path,
+                    outdir,
+                    config=self.config,
+                    metadata=dict(metadata, sheetversion="2"),
+                    cache_dir=cache_dir,
+                    check=False,
+                )
+
+        build({"filename": "MyFont"})
+        (entry,) = os.listdir(cache_dir)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(cache_dir, entry))),
+            ["MyFont.html", "MyFont.ttf"],
+        )
+        # a font saved next to another one with its name isn't cached
+        build({"filename": "MyFont", "designer": "someone else"})
+        self.assertEqual(os.listdir(cache_dir), [entry])
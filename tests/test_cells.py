@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from handwrite.cells import (
+    CellPool,
+    SharedArray,
+    cell_levels,
+    cell_rects,
+    has_shared_memory,
+)
+from handwrite.sheettopng import SHEETtoPNG
+
+
+def fake_characters(sheet, rects):
+    return [
+        [sheet[top : top + height, left : left + width], left, top, width, height]
+        for top, left, height, width in rects
+    ]
+
+
+class TestCells(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.sheet = rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+        self.rects = [
+            (10, 20, 50, 40),
+            (100, 0, 50, 40),
+            (200, 300, 50, 1),
+            (0, 360, 60, 40),
+        ]
+        self.characters = fake_characters(self.sheet, self.rects)
+        self.names = {0: "aTok", 1: "eTok", 2: "cartoucheMiddleTok", 3: "bracketleft"}
+        self.metadata = {"sheetversion": "2"}
+
+    def test_cell_rects(self):
+        sheet, rects = cell_rects(self.characters)
+        self.assertIs(sheet, self.sheet)
+        self.assertEqual(rects.tolist(), [list(rect) for rect in self.rects])
+
+    @unittest.skipUnless(has_shared_memory(), "shared memory is new in Python 3.8")
+    def test_shared_array(self):
+        with SharedArray.copy_of(self.sheet) as shared:
+            attached = SharedArray(*shared.spec()[1:], name=shared.spec()[0])
+            self.assertTrue((attached.array == self.sheet).all())
+            attached.array[0, 0] = 7
+            self.assertEqual(shared.array[0, 0].tolist(), [7, 7, 7])
+            attached.close()
+
+    def test_workers_match_one_process(self):
+        serial, levels = CellPool(1).levels(self.characters, self.names, self.metadata)
+        with CellPool(2, chunks_per_worker=1) as pool:
+            cells, parallel = pool.levels(self.characters, self.names, self.metadata)
+        self.assertEqual(cells, serial)
+        self.assertTrue((parallel == levels).all())
+        self.assertEqual(levels.shape, (4, 125, 100))
+        # trimmed glyphs are trimmed like SHEETtoPNG does
+        trimmed = SHEETtoPNG().trim(self.characters[3][0], ["right"], self.metadata)
+        self.assertTrue((levels[3] == cell_levels(trimmed, "x", self.metadata)).all())
+
+    def test_unnamed_cells_are_skipped(self):
+        with CellPool(2) as pool:
+            cells, levels = pool.levels(self.characters, {1: "eTok"}, self.metadata)
+        self.assertEqual(cells, [1])
+        self.assertEqual(len(levels), 1)
+
+    def test_workers_are_kept(self):
+        pool = CellPool(2)
+        first = pool.levels(self.characters, self.names, self.metadata)[1]
+        executor = pool.executor
+        second = pool.levels(self.characters, self.names, self.metadata)[1]
+        # the same processes, for a sheet in new shared memory
+        self.assertIs(pool.executor, executor)
+        self.assertTrue((first == second).all())
+        pool.close()
+        self.assertIsNone(pool.executor)
+
+    def test_without_shared_memory(self):
+        serial = CellPool(1).levels(self.characters, self.names, self.metadata)[1]
+        pool = CellPool(2)
+        with mock.patch("handwrite.cells.has_shared_memory", return_value=False):
+            levels = pool.levels(self.characters, self.names, self.metadata)[1]
+        # prepared in this process, like with one worker
+        self.assertIsNone(pool.executor)
+        self.assertTrue((levels == serial).all())
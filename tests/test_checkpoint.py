@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from handwrite.checkpoint import Checkpoint
+
+SHEET = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "test_data",
+    "sheettopng",
+    "sitelen-pona-pi-jan-Watesa.png",
+)
+CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "handwrite",
+    "default.json",
+)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "out.txt")
+        with open(self.output, "w") as f:
+            f.write("glyphs")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_not_current_without_manifest(self):
+        checkpoint = Checkpoint(self.directory, "stage", {"sheet": "abc"})
+        self.assertFalse(checkpoint.is_current())
+
+    def test_current_after_record(self):
+        Checkpoint(self.directory, "stage", {"sheet": "abc"}).record([self.output])
+        checkpoint = Checkpoint(self.directory, "stage", {"sheet": "abc"})
+        self.assertTrue(checkpoint.is_current())
+        self.assertEqual(list(checkpoint.outputs), ["out.txt"])
+
+    def test_changed_inputs(self):
+        Checkpoint(self.directory, "stage", {"sheet": "abc"}).record([self.output])
+        checkpoint = Checkpoint(self.directory, "stage", {"sheet": "def"})
+        self.assertFalse(checkpoint.is_current())
+
+    def test_changed_outputs(self):
+        first = Checkpoint(self.directory, "stage", {"sheet": "abc"})
+        first.record([self.output])
+        with open(self.output, "w") as f:
+            f.write("edited by hand")
+        second = Checkpoint(self.directory, "stage", {"sheet": "abc"})
+        self.assertFalse(second.is_current())
+        os.remove(self.output)
+        self.assertFalse(second.is_current())
+
+    def test_digest_follows_outputs(self):
+        first = Checkpoint(self.directory, "stage", {})
+        first.record([self.output])
+        with open(self.output, "w") as f:
+            f.write("new glyphs")
+        second = Checkpoint(self.directory, "stage", {})
+        second.record([self.output])
+        self.assertNotEqual(first.digest(), second.digest())
+
+    def test_recorded(self):
+        checkpoint = Checkpoint(self.directory, "stage", {})
+        self.assertEqual(checkpoint.recorded(), [])
+        checkpoint.record([self.output])
+        with open(self.output, "w") as f:
+            f.write("edited by hand")
+        # whether or not it's current
+        self.assertEqual(
+            Checkpoint(self.directory, "stage", {}).recorded(), [self.output]
+        )
+
+    def test_invalidate(self):
+        checkpoint = Checkpoint(self.directory, "stage", {})
+        checkpoint.record([self.output])
+        checkpoint.invalidate()
+        self.assertFalse(checkpoint.is_current())
+
+
+class TestTempDirectory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_removed_when_the_build_fails(self):
+        from handwrite.cli import converters
+
+        def run(*args, **kwargs):
+            raise KeyboardInterrupt
+
+        output = os.path.join(self.directory, "output")
+        with mock.patch("tempfile.tempdir", self.directory), mock.patch(
+            "handwrite.cli.run", run
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                converters(SHEET, output, metadata={"sheetversion": "2"}, check=False)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestRerun(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.debug = os.path.join(self.directory, "debug")
+        self.output = os.path.join(self.directory, "output")
+        os.makedirs(self.debug)
+        os.makedirs(self.output)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_build(self, force=()):
+        from handwrite.cli import run
+
+        metadata = {"filename": "MyFont", "sheetversion": "2"}
+        return run(SHEET, self.output, self.debug, CONFIG, metadata, force)
+
+    def test_web_page_is_an_output(self):
+        outputs = self.run_build()
+        page = os.path.join(self.output, "MyFont.html")
+        self.assertEqual(outputs, [os.path.join(self.output, "MyFont.ttf"), page])
+        self.assertIn(
+            os.path.relpath(page, self.debug),
+            Checkpoint(self.debug, "ligatures", None).load()["outputs"],
+        )
+        os.remove(page)
+        # the ligatures stage is redone for the page, and replaces its font
+        self.assertEqual(self.run_build(), outputs)
+        self.assertEqual(sorted(os.listdir(self.output)), ["MyFont.html", "MyFont.ttf"])
+        # up to date: what the last run wrote, font first
+        self.assertEqual(self.run_build(), outputs)
+        self.assertEqual(self.run_build(force=["ligatures"]), outputs)
+        self.assertEqual(sorted(os.listdir(self.output)), ["MyFont.html", "MyFont.ttf"])
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from handwrite.family import build_family, parse_member
+from handwrite.svgtottf import CompiledFeatures, SVGtoTTF, style_names
+
+FEATURES = "feature liga {\n  sub a b by ab;\n} liga;\n"
+
+
+def make_font():
+    glyphs = [".notdef", "a", "b", "ab"]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyphs)
+    builder.setupCharacterMap({ord("a"): "a", ord("b"): "b"})
+    builder.setupGlyf({name: TTGlyphPen(None).glyph() for name in glyphs})
+    builder.setupHorizontalMetrics({name: (500, 0) for name in glyphs})
+    builder.setupHorizontalHeader()
+    builder.setupOS2()
+    builder.setupPost()
+    return builder.font
+
+
+class TestCompiledFeatures(unittest.TestCase):
+    def test_same_tables_as_compiling(self):
+        from io import BytesIO
+        from fontTools.feaLib import builder
+
+        expected = make_font()
+        builder.addOpenTypeFeaturesFromString(expected, FEATURES)
+        features = CompiledFeatures()
+        fonts = [make_font(), make_font()]
+        for font in fonts:
+            features.apply(font, FEATURES)
+        self.assertEqual(features.hits, 1)
+        for font in [expected] + fonts:
+            data = BytesIO()
+            font.save(data)
+            font.data = data.getvalue()
+        self.assertEqual(fonts[0].data, expected.data)
+        self.assertEqual(fonts[1].data, expected.data)
+
+
+class TestStyles(unittest.TestCase):
+    def test_style_names(self):
+        bold = style_names("My Hand", "bold")
+        self.assertEqual((bold["family"], bold["subfamily"]), ("My Hand", "Bold"))
+        self.assertIsNone(bold["typographic"])
+        self.assertEqual((bold["weight"], bold["bold"]), (700, True))
+        light = style_names("My Hand", "Light Italic")
+        self.assertEqual(
+            (light["family"], light["subfamily"]), ("My Hand Light", "Italic")
+        )
+        self.assertEqual(light["typographic"], ("My Hand", "Light Italic"))
+        self.assertEqual((light["weight"], light["bold"]), (300, False))
+        hand = style_names("My Hand", "hand 2")
+        self.assertEqual(
+            (hand["family"], hand["subfamily"]), ("My Hand hand 2", "Regular")
+        )
+        self.assertEqual(hand["weight"], 400)
+
+    def test_style_bits(self):
+        from io import BytesIO
+
+        data = BytesIO()
+        make_font().save(data)
+        converter = SVGtoTTF()
+        converter.config = {"props": {"filename": "MyHand"}}
+        for style, weight, selection, mac_style in (
+            ("Regular", 400, 1 << 6, 0),
+            ("Bold", 700, 1 << 5, 1),
+            ("Bold Italic", 700, 1 << 5 | 1, 3),
+            ("Light", 300, 1 << 6, 0),
+        ):
+            converter.metadata = {"family": "My Hand", "style": style}
+            data.seek(0)
+            tt = converter.ligature_font(data, FEATURES)
+            self.assertEqual(tt["OS/2"].usWeightClass, weight)
+            self.assertEqual(tt["OS/2"].fsSelection & 0b1100001, selection)
+            self.assertEqual(tt["head"].macStyle, mac_style)
+
+
+class TestFamily(unittest.TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_parse_member(self):
+        self.assertEqual(parse_member("Bold=bold.png"), ("Bold", "bold.png"))
+        self.assertEqual(
+            parse_member("Hand 2=a.png,b.png"), ("Hand 2", ["a.png", "b.png"])
+        )
+        with self.assertRaises(ValueError):
+            parse_member("bold.png")
+
+    def test_build_family(self):
+        calls = []
+
+        def run(sheet, output_directory, characters_dir, config, metadata, **options):
+            calls.append((sheet, metadata, options))
+            return [os.path.join(output_directory, metadata["filename"] + ".ttf")]
+
+        with mock.patch("handwrite.cli.run", run):
+            fonts, page = build_family(
+                [("Regular", "regular.png"), ("Bold", "bold.png")],
+                self.output,
+                metadata={"family": "My Hand"},
+                check=False,
+            )
+        self.assertEqual(
+            [os.path.basename(font) for font in fonts],
+            ["MyHand-Regular.ttf", "MyHand-Bold.ttf"],
+        )
+        self.assertEqual(
+            sorted(metadata["style"] for _, metadata, _ in calls), ["Bold", "Regular"]
+        )
+        # everything but the sheet is shared
+        self.assertIs(calls[0][2]["features"], calls[1][2]["features"])
+        self.assertIs(calls[0][2]["layout_cache"], calls[1][2]["layout_cache"])
+        self.assertFalse(calls[0][2]["web_page"])
+        with open(page, encoding="utf-8") as f:
+            html = f.read()
+        self.assertIn("url('MyHand-Bold.ttf')", html)
+        self.assertIn("<h2>Regular</h2>", html)
+
+    def test_duplicate_styles(self):
+        with self.assertRaises(ValueError):
+            build_family(
+                [("Bold", "a.png"), ("Bold", "b.png")], self.output, check=False
+            )
@@ -0,0 +1,163 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from handwrite.fidelity import (
+    Canvas,
+    compare_font,
+    glyph_metrics,
+    ink_bounds,
+    placement_transform,
+)
+
+
+class TestFidelity(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, "config.json")
+        with open(self.config, "w") as f:
+            json.dump(
+                {
+                    "props": {"ascent": 800, "descent": 200},
+                    "glyphs-fancy": [
+                        {"codepoint": "0xf1900", "name": "aTok"},
+                        {"codepoint": "0xf1901", "name": "akesiTok"},
+                        {},
+                    ],
+                },
+                f,
+            )
+        # a 200x250 sheet version 2 cell, with a square of ink
+        self.mask = np.zeros((250, 200), bool)
+        self.mask[60:140, 70:150] = True
+        for name in ["aTok", "akesiTok"]:
+            os.mkdir(os.path.join(self.directory, name))
+            pixels = np.where(self.mask, 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(
+                os.path.join(self.directory, name, name + ".bmp")
+            )
+        self.metadata = {"sheetversion": "2"}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build_font(self, squares):
+        """Font with one square glyph per name: {name: (left, bottom, right, top)}"""
+        path = os.path.join(self.directory, "font.ttf")
+        builder = FontBuilder(1000, isTTF=True)
+        builder.setupGlyphOrder([".notdef"] + list(squares))
+        builder.setupCharacterMap({})
+        glyphs = {".notdef": TTGlyphPen(None).glyph()}
+        for name, (left, bottom, right, top) in squares.items():
+            pen = TTGlyphPen(None)
+            pen.moveTo((left, bottom))
+            pen.lineTo((left, top))
+            pen.lineTo((right, top))
+            pen.lineTo((right, bottom))
+            pen.closePath()
+            glyphs[name] = pen.glyph()
+        builder.setupGlyf(glyphs)
+        builder.setupHorizontalMetrics(
+            {name: (1000, getattr(glyphs[name], "xMin", 0)) for name in glyphs}
+        )
+        builder.setupHorizontalHeader(ascent=800, descent=-200)
+        builder.setupPost()
+        builder.save(path)
+        return path
+
+    def placed_square(self, mask=None):
+        bbox = ink_bounds(self.mask if mask is None else mask, 4, 800)
+        t = placement_transform(0xF1900, bbox, 2)
+        (left, bottom), (right, top) = [
+            (round(t[0] * x + t[2] * y + t[4]), round(t[1] * x + t[3] * y + t[5]))
+            for x, y in [bbox[:2], bbox[2:]]
+        ]
+        return left, bottom, right, top
+
+    def test_placement_centers_sitelen_pona(self):
+        left, bottom, right, top = self.placed_square()
+        self.assertAlmostEqual((left + right) / 2, 500, delta=1)
+        # wherever it was drawn in the cell
+        moved = np.roll(self.mask, (40, -30), axis=(0, 1))
+        self.assertEqual(self.placed_square(moved), (left, bottom, right, top))
+
+    def test_compare_font(self):
+        good = self.placed_square()
+        left, bottom, right, top = good
+        font = self.build_font(
+            {"aTok": good, "akesiTok": (left + 300, bottom, right + 300, top)}
+        )
+        report = compare_font(font, self.directory, self.config, self.metadata)
+        self.assertEqual(report.names, ["aTok", "akesiTok"])
+        self.assertGreater(report.iou[0], 0.9)
+        self.assertLess(report.hausdorff[0], 30)
+        self.assertLess(report.iou[1], 0.5)
+        self.assertEqual(report.failures(), ["akesiTok"])
+
+    def test_glyph_metrics(self):
+        a = np.zeros((3, 20, 20), bool)
+        b = np.zeros((3, 20, 20), bool)
+        a[0, 5:10, 5:10] = b[0, 5:10, 5:10] = True
+        a[1, 0:10, 0:10] = True
+        b[1, 0:10, 5:10] = True
+        iou, hausdorff = glyph_metrics(a, b, 10)
+        self.assertEqual(iou[0], 1)
+        self.assertEqual(hausdorff[0], 0)
+        self.assertAlmostEqual(iou[1], 0.5)
+        self.assertAlmostEqual(hausdorff[1], 50, delta=1)
+        # two blank glyphs are a perfect match
+        self.assertEqual(iou[2], 1)
+        self.assertEqual(hausdorff[2], 0)
+
+    def test_canvas_fill(self):
+        canvas = Canvas(0, 0, 1000, 1000, size=10)
+        mask = canvas.fill([[(0, 0), (500, 0), (500, 500), (0, 500)]])
+        # edges can land on either side of a pixel
+        self.assertTrue(mask[5:, :5].all())
+        self.assertFalse(mask[:4].any() or mask[:, 6:].any())
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestBuiltFontFidelity(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.characters_dir = os.path.join(self.temp, "characters")
+        self.sheet_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "sheettopng",
+            "sitelen-pona-pi-jan-Watesa.png",
+        )
+        self.config = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "handwrite",
+            "default.json",
+        )
+        self.metadata = {"filename": "CustomFont", "sheetversion": "2"}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_glyphs_match_cells(self):
+        from handwrite import converters
+
+        converters(
+            self.sheet_path, self.temp, self.characters_dir, self.config, self.metadata
+        )
+        report = compare_font(
+            os.path.join(self.temp, "CustomFont.ttf"),
+            self.characters_dir,
+            self.config,
+            self.metadata,
+        )
+        self.assertEqual(report.failures(min_iou=0.7, max_hausdorff=100), [])
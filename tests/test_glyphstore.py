@@ -0,0 +1,91 @@
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from handwrite.glyphstore import (
+    STORE_FILENAME,
+    DirectoryStore,
+    MemoryStore,
+    ZipStore,
+    export,
+    open_store,
+    read_member,
+)
+
+
+class TestGlyphStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_open_store(self):
+        self.assertIsInstance(open_store(self.directory), DirectoryStore)
+        store = open_store(self.directory, {"glyphstore": "zip"})
+        self.assertIsInstance(store, ZipStore)
+        store.close()
+        # an existing zip store is picked up without metadata
+        self.assertIsInstance(open_store(self.directory), ZipStore)
+
+    def check_round_trip(self, metadata):
+        with open_store(self.directory, metadata) as store:
+            store.write("aTok", ".png", b"png")
+            store.write("aTok", ".svg", b"svg")
+            store.write("eTok", ".png", b"png2")
+            store.set_info("aTok", cell=[1.0, 2.0, 3.0, 4.0])
+        with open_store(self.directory, metadata) as store:
+            self.assertEqual(store.read("aTok", ".svg"), b"svg")
+            self.assertEqual(store.names(".png"), ["aTok", "eTok"])
+            self.assertEqual(store.names(".svg"), ["aTok"])
+            self.assertFalse(store.exists("eTok", ".svg"))
+            self.assertEqual(store.info("aTok"), {"cell": [1.0, 2.0, 3.0, 4.0]})
+            with store.open_path("aTok", ".png") as path:
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), b"png")
+
+    def test_directory_round_trip(self):
+        self.check_round_trip({"glyphstore": "directory"})
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.directory, "aTok", "aTok.svg"))
+        )
+
+    def test_zip_round_trip(self):
+        self.check_round_trip({"glyphstore": "zip"})
+        self.assertEqual(os.listdir(self.directory), [STORE_FILENAME])
+
+    def test_memory_store(self):
+        with MemoryStore() as store:
+            store.write("aTok", ".svg", b"svg")
+            store.write("eTok", ".png", b"png")
+            store.set_info("aTok", ink=None)
+            self.assertEqual(store.read("aTok", ".svg"), b"svg")
+            self.assertEqual(store.names(".svg"), ["aTok"])
+            self.assertEqual(store.info("aTok"), {"ink": None})
+            with store.open_path("eTok", ".png") as path:
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), b"png")
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_zip_rewrite_compacts(self):
+        path = os.path.join(self.directory, STORE_FILENAME)
+        with ZipStore(path) as store:
+            store.write("aTok", ".svg", b"old")
+        with ZipStore(path) as store:
+            store.write("aTok", ".svg", b"new")
+        with zipfile.ZipFile(path) as z:
+            self.assertEqual(z.namelist(), ["aTok/aTok.svg"])
+        self.assertEqual(read_member(path + "#aTok/aTok.svg"), b"new")
+
+    def test_zip_outputs_and_export(self):
+        path = os.path.join(self.directory, STORE_FILENAME)
+        with ZipStore(path) as store:
+            store.write("aTok", ".png", b"png")
+            outputs = store.outputs(["aTok", "eTok"], [".png", ".svg"])
+        self.assertEqual(outputs, [path + "#aTok/aTok.png"])
+        target = os.path.join(self.directory, "exported")
+        export(path, target)
+        with open(os.path.join(target, "aTok", "aTok.png"), "rb") as f:
+            self.assertEqual(f.read(), b"png")
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from handwrite.layout import LayoutCache, register_rows
+from handwrite.sheettopng import SHEETtoPNG
+
+SHEET = os.path.join(
+    "tests", "test_data", "sheettopng", "sitelen-pona-pi-jan-Watesa.png"
+)
+
+
+def draw_sheet(offset=(0, 0)):
+    """White page with three row boxes, drawn with 3px black lines."""
+    gray = np.full((1300, 1000), 255, np.uint8)
+    dx, dy = offset
+    for top in (100, 500, 900):
+        cv2.rectangle(gray, (50 + dx, top + dy), (949 + dx, top + 99 + dy), 0, 3)
+    return gray
+
+
+class TestRegisterRows(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.boxes = SHEETtoPNG().find_rows(self.directory, draw_sheet(), 200, rows=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertBoxesClose(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(sorted(first), sorted(second)):
+            self.assertLessEqual(max(abs(np.subtract(a, b))), 1, (a, b))
+
+    def test_same_sheet(self):
+        self.assertBoxesClose(register_rows(draw_sheet(), self.boxes), self.boxes)
+
+    def test_same_as_find_rows(self):
+        gray = cv2.imread(SHEET, cv2.IMREAD_GRAYSCALE)
+        boxes = SHEETtoPNG().find_rows(self.directory, gray, 200)
+        self.assertEqual(register_rows(gray, boxes), boxes)
+
+    def test_follows_small_shifts(self):
+        gray = draw_sheet(offset=(3, -2))
+        expected = SHEETtoPNG().find_rows(self.directory, gray, 200, rows=3)
+        self.assertBoxesClose(register_rows(gray, self.boxes), expected)
+
+    def test_rejects_other_layouts(self):
+        self.assertIsNone(register_rows(draw_sheet(offset=(0, 20)), self.boxes))
+        self.assertIsNone(
+            register_rows(np.full((1300, 1000), 255, np.uint8), self.boxes)
+        )
+
+
+class TestLayoutCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = LayoutCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_keyed_by_size_and_version(self):
+        gray = draw_sheet()
+        self.cache.put(gray, {"sheetversion": "2"}, [(1, 2, 3, 4)])
+        self.assertEqual(self.cache.get(gray, {"sheetversion": "2.1"}), [(1, 2, 3, 4)])
+        self.assertIsNone(self.cache.get(gray, {"sheetversion": "3"}))
+        self.assertIsNone(self.cache.get(gray[:1000], {"sheetversion": "2"}))
+
+    def test_match(self):
+        boxes = SHEETtoPNG().find_rows(self.directory, draw_sheet(), 200, rows=3)
+        self.assertIsNone(self.cache.match(draw_sheet(), {}, rows=3))
+        self.cache.put(draw_sheet(), {}, boxes)
+        self.assertIsNotNone(self.cache.match(draw_sheet(offset=(1, 1)), {}, rows=3))
+        self.assertIsNone(self.cache.match(draw_sheet(offset=(0, 20)), {}, rows=3))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_in_memory(self):
+        cache = LayoutCache(None)
+        cache.put(draw_sheet(), {}, [(1, 2, 3, 4)])
+        self.assertEqual(cache.get(draw_sheet(), {}), [(1, 2, 3, 4)])
+        self.assertIsNone(LayoutCache(None).get(draw_sheet(), {}))
+
+    def test_detect_characters_skips_search(self):
+        metadata = {"sheetversion": "2"}
+        converter = SHEETtoPNG(self.cache)
+        first = converter.detect_characters(self.directory, SHEET, 200, metadata)
+        with mock.patch.object(converter, "find_rows") as find_rows:
+            second = converter.detect_characters(self.directory, SHEET, 200, metadata)
+        find_rows.assert_not_called()
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(first, second):
+            self.assertLessEqual(abs(a[1] - b[1]), 1)
+            self.assertLessEqual(abs(a[2] - b[2]), 1)
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+from handwrite.limits import Limits, ToolError, ToolTimeout
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+class TestLimits(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        output = Limits().run(
+            "potrace",
+            python("import sys; sys.stdout.write(sys.stdin.read().upper())"),
+            b"svg",
+        )
+        self.assertEqual(output, b"SVG")
+
+    def test_failure(self):
+        code = "import sys; sys.stderr.write('line\\n' * 30 + 'out of memory\\n'); sys.exit(3)"
+        with self.assertRaises(ToolError) as caught:
+            Limits().run("fontforge", python(code))
+        self.assertEqual(caught.exception.returncode, 3)
+        self.assertIn("fontforge failed with exit status 3", str(caught.exception))
+        # the end of stderr is in the message
+        self.assertIn("out of memory", str(caught.exception))
+        self.assertLess(str(caught.exception).count("line"), 30)
+
+    def test_timeout(self):
+        started = time.monotonic()
+        with self.assertRaises(ToolTimeout):
+            Limits(potrace_timeout=0.5).run(
+                "potrace", python("import time; time.sleep(30)")
+            )
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_retries(self):
+        counter = os.path.join(self.directory, "tries")
+        # fails the first time, works the second
+        code = (
+            "import os, sys; path = %r; tries = os.path.exists(path); open(path, 'a').close(); "
+            "sys.exit(0 if tries else 1)" % counter
+        )
+        with self.assertRaises(ToolError):
+            Limits().run("potrace", python(code))
+        os.remove(counter)
+        Limits(retries=1).run("potrace", python(code))
+
+    def test_deadline(self):
+        limits = Limits(potrace_timeout=None, deadline=0.5).start()
+        started = time.monotonic()
+        with self.assertRaises(ToolTimeout):
+            limits.run("potrace", python("import time; time.sleep(30)"))
+        self.assertLess(time.monotonic() - started, 10)
+        with self.assertRaises(ToolTimeout):
+            limits.timeout("potrace")
+        # a deadline only counts from start()
+        self.assertIsNone(Limits(potrace_timeout=None, deadline=0).timeout("potrace"))
+
+    def test_stuck_on_stdin(self):
+        import subprocess
+
+        process = Limits(fontforge_timeout=0.5).popen(
+            "fontforge", python("import time; time.sleep(30)"), stdin=subprocess.PIPE
+        )
+        started = time.monotonic()
+        with self.assertRaises(OSError):
+            # writes block once the pipe is full, until the timer kills it
+            while True:
+                process.stdin.write(b"x" * 65536)
+                process.stdin.flush()
+        with self.assertRaises(ToolTimeout):
+            process.wait()
+        self.assertLess(time.monotonic() - started, 10)
+
+    @unittest.skipUnless(os.name == "posix", "rlimits are POSIX only")
+    def test_memory_limit(self):
+        code = "x = bytearray(1024 * 1024 * 1024)"
+        with self.assertRaises(ToolError):
+            Limits(memory=256 * 1024 * 1024).run("potrace", python(code))
+        Limits().run("potrace", python("x = bytearray(1024 * 1024)"))
+
+    @unittest.skipUnless(os.name == "posix", "rlimits are POSIX only")
+    def test_cpu_limit(self):
+        with self.assertRaises(ToolError) as caught:
+            Limits(cpu=1).run("potrace", python("while True: pass"))
+        self.assertLess(caught.exception.returncode, 0)
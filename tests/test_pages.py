@@ -0,0 +1,59 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from handwrite.glyphstore import open_store
+from handwrite.sheettopng import SHEETtoPNG, page_cells, page_count
+
+SHEET = os.path.join("tests", "test_data", "sheettopng", "two-squares.png")
+
+
+class TestPageCells(unittest.TestCase):
+    def test_legacy_layout(self):
+        glyphs = [{"name": "aTok"}, {}, {"name": "alaTok"}]
+        self.assertEqual(page_cells(glyphs), {0: "aTok", 2: "alaTok"})
+        self.assertEqual(page_cells(glyphs, page=1), {})
+        self.assertEqual(page_count(glyphs), 1)
+
+    def test_pages_rows_and_cols(self):
+        glyphs = [
+            {"name": "aTok"},
+            {"name": "extra", "page": 2, "row": 1, "col": 3},
+            {"name": "other", "row": 8, "col": 19},
+        ]
+        self.assertEqual(page_cells(glyphs, page=0), {0: "aTok", 179: "other"})
+        self.assertEqual(page_cells(glyphs, page=2), {23: "extra"})
+        self.assertEqual(page_count(glyphs), 3)
+
+    def test_conflicts(self):
+        with self.assertRaises(ValueError):
+            page_cells([{"name": "aTok"}, {"name": "b", "row": 0, "col": 0}])
+        with self.assertRaises(ValueError):
+            page_cells([{"name": "b", "page": 1}], page=1)
+
+
+class TestMultiPageSheet(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, "config.json")
+        glyphs = [{"name": "first"}, {"name": "second", "page": 1, "row": 0, "col": 1}]
+        with open(self.config, "w") as f:
+            json.dump({"glyphs-fancy": glyphs}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_convert_pages(self):
+        characters_dir = os.path.join(self.directory, "cells")
+        metadata = {"sheetversion": "2", "glyphstore": "zip"}
+        SHEETtoPNG().convert([SHEET, SHEET], characters_dir, self.config, metadata)
+        with open_store(characters_dir) as store:
+            self.assertEqual(store.names(".png"), ["first", "second"])
+            self.assertEqual(store.info("first")["page"], 0)
+            self.assertEqual(store.info("second")["page"], 1)
+            # second cell of its row
+            self.assertGreater(
+                store.info("second")["cell"][0], store.info("first")["cell"][0]
+            )
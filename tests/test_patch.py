@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from handwrite import converters
+from handwrite.glyphstore import open_store
+from handwrite.patch import (
+    find_patch_rows,
+    match_rows,
+    patch_cells,
+    patch_font,
+    reference_rows,
+)
+from handwrite.preflight import PreflightError
+from handwrite.sheettopng import SHEETtoPNG
+from handwrite.synthetic import SyntheticSheets
+
+CONFIG = os.path.join("handwrite", "default.json")
+METADATA = {"sheetversion": "3"}
+
+
+def only_rows(sheets, image, rows):
+    """Paint over every row box of a synthetic sheet but `rows`."""
+    for row, (x, y, w, h) in enumerate(sheets.row_boxes()):
+        if row not in rows:
+            image[y - 4 : y + h + 4, x - 4 : x + w + 4] = 250
+    return image
+
+
+class TestPatchSheets(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sheets = SyntheticSheets(metadata=METADATA, dpi=150)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cells_like_a_whole_sheet(self):
+        image = self.sheets.render()
+        whole = SHEETtoPNG().detect_characters(None, image, 200, METADATA)
+        boxes = self.sheets.row_boxes()
+        cells = patch_cells(image, [0, 6], [boxes[0], boxes[6]], METADATA)
+        # rows 0 and 6, the cartouche middle, and the copies of a, e, [, _, ], . and :
+        self.assertEqual(
+            sorted(cells),
+            list(range(20))
+            + list(range(120, 140))
+            + [180, 181, 182, 185, 186, 187, 188, 189],
+        )
+        for cell, (roi, *rect) in cells.items():
+            self.assertEqual(rect, whole[cell][1:])
+            self.assertEqual(roi.shape, whole[cell][0].shape)
+
+    def test_rotated_patch_sheet(self):
+        image = only_rows(self.sheets, self.sheets.render(), [2, 5])
+        straight_image, straight_boxes = find_patch_rows(image)
+        self.assertIs(straight_image, image)
+        straight = patch_cells(image, [2, 5], straight_boxes, METADATA)
+        height, width = image.shape[:2]
+        rotated = cv2.warpAffine(
+            image,
+            cv2.getRotationMatrix2D((width / 2, height / 2), 1, 1.0),
+            (width, height),
+            borderValue=(255, 255, 255),
+        )
+        messages = []
+        rotated, boxes = find_patch_rows(rotated, progress=messages.append)
+        self.assertIn("Straightened", messages[0].text)
+        cells = patch_cells(rotated, [2, 5], boxes, METADATA)
+        self.assertEqual(sorted(cells), sorted(straight))
+        # each cell is cut where it is on the straight patch sheet, up to the
+        # blur of resampling
+        differences = [
+            np.abs(
+                cv2.resize(cells[cell][0], straight[cell][0].shape[1::-1]).astype(int)
+                - straight[cell][0]
+            ).mean()
+            for cell in cells
+        ]
+        self.assertLess(np.mean(differences), 6)
+
+    def test_reference_rows(self):
+        path = os.path.join(self.directory, "sheet.png")
+        cv2.imwrite(path, self.sheets.render())
+        characters_dir = os.path.join(self.directory, "cells")
+        SHEETtoPNG().convert(path, characters_dir, CONFIG, METADATA)
+        with open(CONFIG) as f:
+            glyphs = json.load(f)["glyphs-fancy"]
+        with open_store(characters_dir, METADATA) as store:
+            reference = reference_rows(store, glyphs)
+        self.assertEqual(sorted(reference), list(range(9)))
+        height = self.sheets.size[1]
+        for row, (x, y, w, h) in enumerate(self.sheets.row_boxes()):
+            self.assertAlmostEqual(
+                reference[row], (y + h / 2) / height, delta=2 / height
+            )
+
+    def test_match_rows(self):
+        reference = {row: 0.1 + row * 0.1 for row in range(9)}
+        boxes = [(0, 280, 100, 40), (0, 580, 100, 40)]
+        self.assertEqual(match_rows(boxes, 1000, reference), [2, 5])
+        with self.assertRaises(ValueError):
+            # two boxes where row 2 was
+            match_rows([(0, 280, 100, 40), (0, 290, 100, 40)], 1000, reference)
+        with self.assertRaises(ValueError):
+            # nowhere near a row
+            match_rows([(0, 980, 100, 10)], 1000, {0: 0.1, 1: 0.2})
+        with self.assertRaises(ValueError):
+            match_rows(boxes, 1000, {})
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestPatchFont(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sheets = SyntheticSheets(metadata=METADATA, dpi=150)
+        self.debug = os.path.join(self.directory, "debug")
+        self.output = os.path.join(self.directory, "output")
+        os.makedirs(self.output)
+        sheet = os.path.join(self.directory, "sheet.png")
+        cv2.imwrite(sheet, self.sheets.render(seed=0))
+        converters(sheet, self.output, self.debug, metadata=METADATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def pngs(self):
+        with open_store(self.debug, METADATA) as store:
+            return {name: store.read(name, ".png") for name in store.names(".png")}
+
+    def test_patch_rows(self):
+        path = os.path.join(self.directory, "patch.png")
+        cv2.imwrite(path, only_rows(self.sheets, self.sheets.render(seed=1), [2, 5]))
+        before = self.pngs()
+        font = patch_font(path, self.debug, self.output, metadata=METADATA)
+        # the build's font is replaced
+        self.assertEqual(font, os.path.join(self.output, "MyFont.ttf"))
+        self.assertEqual(sorted(os.listdir(self.output)), ["MyFont.html", "MyFont.ttf"])
+        after = self.pngs()
+        changed = {name for name in before if before[name] != after[name]}
+        self.assertEqual(len(changed), 40)
+        self.assertIn("liliTok", changed)
+        self.assertNotIn("aTok", changed)
+
+    def test_explicit_rows_and_glyphs(self):
+        path = os.path.join(self.directory, "patch.png")
+        cv2.imwrite(path, only_rows(self.sheets, self.sheets.render(seed=1), [0]))
+        before = self.pngs()
+        patch_font(
+            path, self.debug, self.output, metadata=METADATA, rows=[0], glyphs=["aTok"]
+        )
+        after = self.pngs()
+        self.assertEqual(
+            {name for name in before if before[name] != after[name]}, {"aTok"}
+        )
+        with self.assertRaises(PreflightError):
+            patch_font(path, self.debug, self.output, metadata=METADATA, rows=[0, 1])
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from handwrite.pipeline import StreamingPipeline
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestStreamingPipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.characters_dir = tempfile.mkdtemp(dir=self.temp)
+        self.sheet_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "sheettopng",
+            "sitelen-pona-pi-jan-Watesa.png",
+        )
+        self.config = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "handwrite",
+            "default.json",
+        )
+        self.metadata = {"filename": "CustomFont", "sheetversion": "2"}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_convert(self):
+        StreamingPipeline(workers=2, queue_size=4).convert(
+            self.sheet_path, self.temp, self.characters_dir, self.config, self.metadata
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.temp, "CustomFont.ttf")))
+        self.assertTrue(
+            os.path.exists(os.path.join(self.characters_dir, "aTok", "aTok.svg"))
+        )
@@ -0,0 +1,104 @@
+import io
+import os
+import re
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from handwrite.glyphstore import open_store
+from handwrite.placement import (
+    CENTERING,
+    glyph_centering,
+    imported_bounds,
+    placements,
+    svg_bounds,
+    write_placements,
+)
+from handwrite.svgtottf import streamed_sources, write_stream_record
+
+# what potrace writes for a 200x250 cell with a 100x150 pixel rectangle of ink
+SVG = b"""<?xml version="1.0" standalone="no"?>
+<svg version="1.0" xmlns="http://www.w3.org/2000/svg"
+ width="200.000000pt" height="250.000000pt" viewBox="0 0 200.000000 250.000000"
+ preserveAspectRatio="xMidYMid meet">
+<g transform="translate(0.000000,250.000000) scale(0.100000,-0.100000)"
+fill="#000000" stroke="none">
+<path d="M500 1250 l0 -1000 1000 0 c0 500 0 1000 0 1500
+l-1000 0 z"/>
+</g>
+</svg>
+"""
+
+
+def apply(transform, x, y):
+    xx, xy, yx, yy, dx, dy = transform
+    return (xx * x + yx * y + dx, xy * x + yy * y + dy)
+
+
+class TestPlacement(unittest.TestCase):
+    def test_svg_bounds(self):
+        ink, height = svg_bounds(SVG)
+        self.assertEqual(height, 250)
+        np.testing.assert_allclose(ink, [50, 75, 150, 225])
+        self.assertEqual(svg_bounds(re.sub(rb"<path[^>]*>", b"", SVG))[0], None)
+
+    def test_centering(self):
+        self.assertEqual(glyph_centering({"codepoint": "0xf1900"}), "both")
+        self.assertEqual(glyph_centering({"codepoint": "0x62"}), "horizontal")
+        self.assertEqual(glyph_centering({"codepoint": "0xf1990"}), "none")
+        self.assertEqual(
+            glyph_centering({"codepoint": "0xf1990", "center": "vertical"}), "vertical"
+        )
+        with self.assertRaises(ValueError):
+            glyph_centering({"name": "x", "center": "middle"})
+
+    def test_default_config_declares_centering(self):
+        with open(os.path.join("handwrite", "default.json")) as f:
+            glyphs = [
+                glyph for glyph in json.load(f)["glyphs-fancy"] if "name" in glyph
+            ]
+        for glyph in glyphs:
+            self.assertIn(glyph.get("center"), CENTERING, glyph["name"])
+        # the same as configs without it get
+        self.assertEqual(
+            [glyph["center"] for glyph in glyphs],
+            [glyph_centering(dict(glyph, center=None)) for glyph in glyphs],
+        )
+
+    def test_centered_glyph_fills_the_em(self):
+        # version 3: the glyph's safe area is 500 units, which becomes the em
+        bounds = (200, 100, 400, 400)
+        both, none = placements([bounds, bounds], ["both", "none"], 3)
+        left, bottom = apply(both, 200, 100)
+        right, top = apply(both, 400, 400)
+        self.assertAlmostEqual((left + right) / 2, 500)
+        # centered on the em box (300) before the safe area is scaled up
+        self.assertAlmostEqual((bottom + top) / 2, 2 * (300 - 312.5) + 500)
+        self.assertAlmostEqual(right - left, 400)
+        # not centered: the left margin ends up at 0, and the bottom of the
+        # safe area (half a margin above the baseline) at the baseline
+        np.testing.assert_allclose(apply(none, 125, 62.5), (0, 0))
+
+    def test_write_placements(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        glyphs = [{"codepoint": "0xf1900", "name": "aTok"}, {"name": "missing"}, {}]
+        with open_store(directory) as store:
+            store.write("aTok", ".svg", SVG)
+            write_placements(store, glyphs, 2)
+        with open_store(directory) as store:
+            info = store.info("aTok")
+        self.assertEqual(info["trace_height"], 250)
+        expected = placements([imported_bounds(info["ink"], 250)], ["both"], 2)[0]
+        np.testing.assert_allclose(info["placement"], expected)
+
+    def test_stream_record(self):
+        stream = io.BytesIO()
+        write_stream_record(stream, "aTok", SVG, [1.5, 0, 0, 1.5, -10, 20.25])
+        stream.seek(0)
+        ((name, source, placement),) = list(streamed_sources(stream))
+        self.assertEqual(name, "aTok")
+        self.assertEqual(placement, [1.5, 0, 0, 1.5, -10, 20.25])
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from handwrite.preflight import (
+    PreflightError,
+    check_sheet,
+    check_tools,
+    detect_sheet_version,
+    preflight,
+    row_grid,
+    sheet_version,
+    with_sheet_version,
+)
+
+SHEETS = os.path.join("tests", "test_data", "sheettopng")
+SHEET = os.path.join(SHEETS, "sitelen-pona-pi-jan-Watesa.png")
+CONFIG = os.path.join("handwrite", "default.json")
+
+
+class TestPreflight(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_image(self, width, height):
+        path = os.path.join(self.directory, "sheet.png")
+        cv2.imwrite(path, np.full((height, width), 255, np.uint8))
+        return path
+
+    def checks(self, problems):
+        return [problem.check for problem in problems]
+
+    def test_row_grid(self):
+        self.assertEqual(row_grid({"sheetversion": "2.1"}), (164, 12))
+        self.assertEqual(row_grid({"sheetversion": "3"}), (126, 12))
+        self.assertEqual(row_grid({}), (126, 12))
+
+    def test_good_sheet(self):
+        problems, rows = check_sheet(SHEET, {"sheetversion": "2"})
+        self.assertEqual(problems, [])
+        self.assertEqual(len(rows), 9)
+        # top to bottom, in full-size pixels
+        self.assertEqual([y for x, y, w, h in rows], sorted(y for x, y, w, h in rows))
+        self.assertGreater(rows[0][2], 2000)
+
+    def test_wrong_sheet_version(self):
+        problems, _ = check_sheet(SHEET, {"sheetversion": "3"})
+        self.assertEqual(self.checks(problems), ["aspect"])
+        self.assertIn("--sheet-version 2", problems[0].message)
+        self.assertEqual(problems[0].details["rows"], list(range(1, 10)))
+
+    def test_detect_sheet_version(self):
+        self.assertEqual(
+            detect_sheet_version([(0, 0, 1640, 120), (0, 200, 1630, 121)]), 2
+        )
+        self.assertEqual(detect_sheet_version([(0, 0, 630, 60)]), 3)
+        self.assertIsNone(detect_sheet_version([(0, 0, 1000, 60)]))
+        self.assertIsNone(detect_sheet_version([]))
+
+    def test_sheet_version(self):
+        from handwrite.synthetic import SyntheticSheets
+
+        self.assertEqual(sheet_version(SHEET), "2.1")
+        with open(SHEET, "rb") as f:
+            self.assertEqual(sheet_version(f.read()), "2.1")
+        self.assertEqual(sheet_version([SHEET, "page 2.png"]), "2.1")
+        image = SyntheticSheets(metadata={"sheetversion": "3"}, dpi=150).render()
+        self.assertEqual(sheet_version(image), "3")
+        self.assertIsNone(sheet_version(self.write_image(1000, 1400)))
+        self.assertIsNone(sheet_version(os.path.join(SHEETS, "LICENSE.txt")))
+
+    def test_with_sheet_version(self):
+        metadata = {"filename": "MyFont"}
+        self.assertEqual(
+            with_sheet_version(SHEET, CONFIG, metadata),
+            {"filename": "MyFont", "sheetversion": "2.1"},
+        )
+        self.assertEqual(metadata, {"filename": "MyFont"})
+        # a version that's given is kept, right or wrong
+        self.assertEqual(
+            with_sheet_version(SHEET, CONFIG, {"sheetversion": "3"}),
+            {"sheetversion": "3"},
+        )
+        self.assertEqual(
+            with_sheet_version(self.write_image(1000, 1400), CONFIG, None), {}
+        )
+
+    def test_not_an_image(self):
+        problems, _ = check_sheet(os.path.join(SHEETS, "LICENSE.txt"))
+        self.assertEqual(self.checks(problems), ["image"])
+        problems, _ = check_sheet(os.path.join(SHEETS, "missing.png"))
+        self.assertEqual(self.checks(problems), ["image"])
+
+    def test_too_small(self):
+        problems, _ = check_sheet(self.write_image(300, 400))
+        self.assertEqual(self.checks(problems), ["size"])
+        self.assertEqual(problems[0].details, {"width": 300, "height": 400})
+
+    def test_no_rows(self):
+        problems, _ = check_sheet(self.write_image(1000, 1300))
+        self.assertEqual(self.checks(problems), ["rows"])
+        self.assertEqual(problems[0].details["found"], 0)
+
+    def test_missing_tools(self):
+        with mock.patch.dict(os.environ, {"PATH": self.directory}):
+            problems = check_tools()
+        self.assertEqual(self.checks(problems), ["tools", "tools"])
+
+    def test_preflight_raises_every_problem(self):
+        with mock.patch.dict(os.environ, {"PATH": self.directory}):
+            with self.assertRaises(PreflightError) as raised:
+                preflight(SHEET, CONFIG, {"sheetversion": "3"})
+        self.assertEqual(
+            self.checks(raised.exception.problems), ["aspect", "tools", "tools"]
+        )
+        self.assertEqual(len(raised.exception.as_dict()["problems"]), 3)
+        self.assertIsInstance(raised.exception, ValueError)
+
+    def test_preflight_without_tools(self):
+        self.assertEqual(
+            len(preflight(SHEET, CONFIG, {"sheetversion": "2"}, tools=False)), 9
+        )
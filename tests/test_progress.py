@@ -0,0 +1,82 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from handwrite.pngtosvg import PNGtoSVG
+from handwrite.progress import Progress, TerminalProgress
+from handwrite.svgtottf import PROGRESS_PREFIX, relay_progress
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.progress = Progress(self.events.append)
+
+    def test_stage_counts_glyphs(self):
+        with self.progress.stage("pngtosvg", 2):
+            self.progress.glyph("pngtosvg", "a")
+            self.progress.glyph("pngtosvg", "b")
+        kinds = [event.kind for event in self.events]
+        self.assertEqual(kinds, ["start", "glyph", "glyph", "end"])
+        self.assertEqual(self.events[2].as_dict()["done"], 2)
+        self.assertEqual(self.events[2].total, 2)
+        self.assertEqual(self.events[3].done, 2)
+        self.assertGreaterEqual(self.events[3].elapsed, 0)
+
+    def test_no_callback(self):
+        progress = Progress()
+        with progress.stage("sheettopng"):
+            progress.glyph("sheettopng", "a")
+        self.assertEqual(progress.done["sheettopng"], 1)
+
+    def test_relay_fontforge_output(self):
+        lines = [
+            (PROGRESS_PREFIX + "aTok\n").encode(),
+            b"Some FontForge warning\n",
+            (PROGRESS_PREFIX + "akesiTok\n").encode(),
+        ]
+        relay_progress(lines, self.progress)
+        self.assertEqual(
+            [(event.kind, event.details.get("glyph")) for event in self.events],
+            [("glyph", "aTok"), ("message", None), ("glyph", "akesiTok")],
+        )
+
+    def test_converter_events(self):
+        store = mock.MagicMock()
+        store.names.return_value = ["a", "b", "c"]
+        with mock.patch.object(PNGtoSVG, "convert_glyph"):
+            PNGtoSVG(self.events.append).convert_store(store, {})
+        glyphs = [event.glyph for event in self.events if event.kind == "glyph"]
+        self.assertEqual(glyphs, ["a", "b", "c"])
+        self.assertEqual(self.events[-1].kind, "end")
+
+    def test_directory_store_events(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("a", "b"):
+            os.makedirs(os.path.join(directory, name))
+            for suffix in (".png", ".svg"):
+                open(os.path.join(directory, name, name + suffix), "wb").close()
+        # debug images, not glyphs
+        open(os.path.join(directory, "5 deskewed.png"), "wb").close()
+        with mock.patch.object(PNGtoSVG, "pngToBmp") as pngToBmp, mock.patch.object(
+            PNGtoSVG, "bmpToSvg"
+        ), mock.patch.object(PNGtoSVG, "record_bounds"):
+            PNGtoSVG(self.events.append).convert({}, directory)
+        self.assertEqual(pngToBmp.call_count, 2)
+        self.assertEqual(self.events[0].total, 2)
+        glyphs = [event.glyph for event in self.events if event.kind == "glyph"]
+        self.assertEqual(glyphs, ["a", "b"])
+
+    def test_terminal(self):
+        out = io.StringIO()
+        progress = Progress(TerminalProgress(out, interval=0))
+        with progress.stage("pngtosvg", 1):
+            progress.glyph("pngtosvg", "aTok")
+        progress.emit("skip", "fontforge")
+        lines = out.getvalue().split("\n")
+        self.assertTrue(lines[0].startswith("PNGtoSVG\rPNGtoSVG aTok"))
+        self.assertEqual(lines[1], "fontforge is up to date, skipping")
@@ -0,0 +1,104 @@
+import os
+import importlib.util
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from handwrite.session import Session, decode_sheet, hash_sheet
+from handwrite.checkpoint import hash_file
+
+SHEET = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "test_data",
+    "sheettopng",
+    "sitelen-pona-pi-jan-Watesa.png",
+)
+
+
+class TestSheets(unittest.TestCase):
+    def test_decode_sheet(self):
+        with open(SHEET, "rb") as f:
+            data = f.read()
+        image = cv2.imread(SHEET)
+        self.assertTrue((decode_sheet(data) == image).all())
+        self.assertIs(decode_sheet(image), image)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.assertEqual(decode_sheet(gray).shape, image.shape)
+        with self.assertRaises(ValueError):
+            decode_sheet(b"not an image")
+
+    def test_hash_sheet(self):
+        with open(SHEET, "rb") as f:
+            self.assertEqual(hash_sheet(f.read()), hash_file(SHEET))
+        pixels = np.zeros((4, 4, 3), np.uint8)
+        self.assertEqual(hash_sheet(pixels), hash_sheet(pixels.copy()))
+        self.assertNotEqual(hash_sheet(pixels), hash_sheet(pixels.reshape(8, 2, 3)))
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestSession(unittest.TestCase):
+    def test_build(self):
+        with open(SHEET, "rb") as f:
+            data = f.read()
+        metadata = {"filename": "CustomFont", "sheetversion": "2"}
+        before = set(os.listdir(tempfile.gettempdir()))
+        with Session() as session:
+            first = session.build(data, metadata, deterministic=True)
+            second = session.build(data, metadata, deterministic=True)
+        self.assertEqual(first.filename, "CustomFont.ttf")
+        self.assertEqual(first.font, second.font)
+        self.assertIn("CustomFont.ttf", first.html)
+        self.assertEqual(first.stats["font_bytes"], len(first.font))
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())), before)
+
+    def test_cell_workers_are_kept(self):
+        with open(SHEET, "rb") as f:
+            data = f.read()
+        metadata = {"sheetversion": "2"}
+        with Session(cell_workers=2) as session:
+            first = session.build(data, metadata, deterministic=True)
+            pool = session.cell_pool.executor
+            second = session.build(data, metadata, deterministic=True)
+            self.assertIs(session.cell_pool.executor, pool)
+        self.assertIsNone(session.cell_pool.executor)
+        self.assertEqual(first.font, second.font)
+
+    def test_build_otf(self):
+        from io import BytesIO
+        from fontTools.ttLib import TTFont
+
+        with open(SHEET, "rb") as f:
+            data = f.read()
+        with Session() as session:
+            for format, table in (("otf", "CFF "), ("cff2", "CFF2")):
+                result = session.build(data, {"sheetversion": "2", "format": format})
+                self.assertTrue(result.filename.endswith(".otf"))
+                font = TTFont(BytesIO(result.font))
+                self.assertIn(table, font)
+                self.assertNotIn("glyf", font)
+                self.assertIn("GSUB", font)
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("uharfbuzz"), "uharfbuzz is needed for specimens"
+    )
+    def test_build_specimen(self):
+        with open(SHEET, "rb") as f:
+            data = f.read()
+        with Session() as session:
+            result = session.build(data, {"sheetversion": "2", "specimen": [24, 48]})
+        self.assertEqual(sorted(result.specimens), [24, 48])
+        small, large = (
+            cv2.imdecode(
+                np.frombuffer(result.specimens[size], np.uint8), cv2.IMREAD_GRAYSCALE
+            )
+            for size in (24, 48)
+        )
+        self.assertGreater(large.shape[0], small.shape[0])
+        self.assertLess(large.min(), 128)
+        self.assertIn("specimen", result.stats["seconds"])
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import importlib.util
+import unittest
+
+import cv2
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from handwrite.specimen import (
+    parse_sizes,
+    render_specimens,
+    specimen_path,
+    specimen_text,
+)
+
+FEATURES = "feature liga {\n  sub a b by ab;\n} liga;\n"
+
+
+def box(width, height):
+    pen = TTGlyphPen(None)
+    pen.moveTo((50, 0))
+    pen.lineTo((50, height))
+    pen.lineTo((width - 50, height))
+    pen.lineTo((width - 50, 0))
+    pen.closePath()
+    return pen.glyph()
+
+
+def make_font(path):
+    """A font with boxes for a, b and the ligature ab, which is taller than both."""
+    glyphs = [".notdef", "space", "a", "b", "ab"]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyphs)
+    builder.setupCharacterMap({ord(" "): "space", ord("a"): "a", ord("b"): "b"})
+    builder.setupGlyf(
+        {
+            ".notdef": TTGlyphPen(None).glyph(),
+            "space": TTGlyphPen(None).glyph(),
+            "a": box(500, 500),
+            "b": box(500, 600),
+            "ab": box(800, 700),
+        }
+    )
+    builder.setupHorizontalMetrics(
+        {
+            ".notdef": (500, 0),
+            "space": (300, 0),
+            "a": (500, 50),
+            "b": (500, 50),
+            "ab": (800, 50),
+        }
+    )
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupOS2(sTypoAscender=800, sTypoDescender=-200)
+    builder.setupPost()
+    addOpenTypeFeaturesFromString(builder.font, FEATURES)
+    builder.save(path)
+    return path
+
+
+class TestSpecimenText(unittest.TestCase):
+    def test_specimen_text(self):
+        lines = specimen_text()
+        self.assertTrue(lines[0].startswith("a akesi ala"))
+        self.assertFalse(any("<br>" in line or not line for line in lines))
+
+    def test_specimen_path(self):
+        self.assertEqual(
+            specimen_path(os.path.join("fonts", "MyFont.ttf"), 48),
+            os.path.join("fonts", "MyFont-48.png"),
+        )
+        self.assertEqual(
+            specimen_path("MyFont.otf", 96, "gallery"),
+            os.path.join("gallery", "MyFont-96.png"),
+        )
+
+    def test_parse_sizes(self):
+        self.assertEqual(parse_sizes("48,96"), [48, 96])
+        for text in ["", "48,big", "0", "-48"]:
+            with self.assertRaises(ValueError):
+                parse_sizes(text)
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("uharfbuzz"), "uharfbuzz is needed for specimens"
+)
+class TestSpecimen(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.font = make_font(os.path.join(self.directory, "Boxes.ttf"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shape(self):
+        from handwrite.specimen import SpecimenFont
+
+        font = SpecimenFont(self.font)
+        # the font's own GSUB makes the ligature
+        self.assertEqual(font.shape("ab"), ([("ab", 0, 0)], 800))
+        self.assertEqual(font.shape("ba"), ([("b", 0, 0), ("a", 500, 0)], 1000))
+
+    def test_render(self):
+        from handwrite.specimen import SpecimenFont
+
+        font = SpecimenFont(self.font)
+        image = font.render(["ab a"], 100)
+        # margins of half an em, "ab", a space and "a"
+        self.assertEqual(image.shape, (100 + 100, 80 + 30 + 50 + 100))
+        # the ligature's box, 7 tenths of an em high, then the space
+        column = image[:, 50 + 40]
+        self.assertEqual((column < 128).sum(), 70)
+        self.assertTrue((image[:, 50 + 80 + 10 : 50 + 80 + 30 + 5] == 255).all())
+        # wrapped between the words
+        wrapped = font.render(["ab a"], 100, width=200)
+        self.assertEqual(wrapped.shape, (100 + 150 + 100, 200))
+
+    def test_render_specimens(self):
+        other = make_font(os.path.join(self.directory, "Other.ttf"))
+        output = os.path.join(self.directory, "gallery")
+        paths = render_specimens([self.font, other], [24, 48], output, workers=2)
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            ["Boxes-24.png", "Boxes-48.png", "Other-24.png", "Other-48.png"],
+        )
+        small, large = (cv2.imread(path, cv2.IMREAD_GRAYSCALE) for path in paths[:2])
+        self.assertGreater(large.shape[0], small.shape[0])
+        self.assertLess(large.min(), 128)
+        # in this process, the same
+        self.assertEqual(
+            render_specimens([self.font], [24], self.directory, workers=1),
+            [os.path.join(self.directory, "Boxes-24.png")],
+        )
+        with open(paths[0], "rb") as f, open(
+            os.path.join(self.directory, "Boxes-24.png"), "rb"
+        ) as g:
+            self.assertEqual(f.read(), g.read())
@@ -0,0 +1,43 @@
+import sys
+import subprocess
+import unittest
+
+HEAVY = ["cv2", "PIL", "fontTools", "numpy"]
+
+
+def loaded_modules(code):
+    """Run `code` in a fresh interpreter, return which heavy modules it loaded."""
+    check = (
+        "import sys; print(); print(' '.join(m for m in %r if m in sys.modules))"
+        % HEAVY
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code + "\n" + check],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    # last line, after anything `code` printed
+    return result.stdout.decode().splitlines()[-1].split()
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_lazy(self):
+        self.assertEqual(loaded_modules("import handwrite, handwrite.cli"), [])
+
+    def test_help_is_lazy(self):
+        code = "\n".join(
+            [
+                "import sys",
+                "from handwrite.cli import main",
+                "sys.argv = ['handwrite', '--help']",
+                "try:",
+                "    main()",
+                "except SystemExit:",
+                "    pass",
+            ]
+        )
+        self.assertEqual(loaded_modules(code), [])
+
+    def test_attributes_load_on_use(self):
+        code = "import handwrite; handwrite.SHEETtoPNG"
+        self.assertIn("cv2", loaded_modules(code))
@@ -2,8 +2,16 @@ import os
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 
 from handwrite import SHEETtoPNG, SVGtoTTF, PNGtoSVG
+from handwrite.svgtottf import (
+    finish_cff,
+    font_extension,
+    font_format,
+    ligature_lookup,
+    shard_path,
+)
 
 
 class TestSVGtoTTF(unittest.TestCase):
@@ -47,3 +55,207 @@ class TestSVGtoTTF(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.temp, "MyFont (1).ttf")))
         self.converter.convert(self.characters_dir, self.temp, self.config)
         self.assertTrue(os.path.exists(os.path.join(self.temp, "MyFont (1) (1).ttf")))
+
+
+class TestShardedFontForge(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.converter = SVGtoTTF()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_command(self):
+        command = self.converter.fontforge_command(self.directory, "config.json")
+        self.assertEqual(len(command), 9 if command[0] == "ffpython" else 10)
+        command = self.converter.fontforge_command(
+            self.directory, "config.json", shard=(1, 4)
+        )
+        self.assertEqual(command[-2:], ["--shard", "1/4"])
+        command = self.converter.fontforge_command(
+            self.directory, "config.json", merge=4
+        )
+        self.assertEqual(command[-2:], ["--merge", "4"])
+        command = self.converter.fontforge_command(
+            self.directory, "config.json", patch=["aTok", "alaTok"]
+        )
+        self.assertEqual(command[-2:], ["--patch", "aTok,alaTok"])
+
+    def test_run_shards_then_merge(self):
+        for index in range(3):
+            open(shard_path(self.directory, index), "w").close()
+        with mock.patch("subprocess.Popen") as popen, mock.patch(
+            "subprocess.run"
+        ) as run:
+            popen.return_value.wait.return_value = 0
+            run.return_value.returncode = 0
+            self.converter.run_fontforge(self.directory, "config.json", shards=3)
+        shards = [call.args[0][-1] for call in popen.call_args_list]
+        self.assertEqual(shards, ["0/3", "1/3", "2/3"])
+        self.assertEqual(popen.return_value.wait.call_count, 3)
+        self.assertEqual(run.call_args.args[0][-2:], ["--merge", "3"])
+        # partial fonts are removed after merging
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_retried_shard_is_stopped(self):
+        from handwrite.limits import Limits, ToolError
+
+        class FakeFontForge:
+            def __init__(self, error=None):
+                self.error = error
+                self.killed = False
+
+            def wait(self):
+                if self.error is not None and not self.killed:
+                    raise self.error
+                return 0
+
+            def poll(self):
+                return 0 if self.error is None or self.killed else None
+
+            def kill(self):
+                self.killed = True
+
+        # shard 0 fails, and is interrupted while its retry runs
+        started = [
+            FakeFontForge(ToolError("fontforge", [], "failed")),
+            FakeFontForge(KeyboardInterrupt()),
+            FakeFontForge(KeyboardInterrupt()),
+        ]
+        limits = Limits(retries=1)
+        limits.popen = lambda *args, **kwargs: started.pop(0)
+        workers = list(started)
+        with self.assertRaises(KeyboardInterrupt):
+            SVGtoTTF(limits=limits).run_fontforge(
+                self.directory, "config.json", shards=2
+            )
+        # the retry and the other shard are both killed
+        self.assertEqual([worker.killed for worker in workers], [False, True, True])
+
+    def test_serial_by_default(self):
+        with mock.patch("subprocess.Popen") as popen, mock.patch(
+            "subprocess.run"
+        ) as run:
+            run.return_value.returncode = 0
+            self.converter.run_fontforge(self.directory, "config.json")
+        popen.assert_not_called()
+        self.assertNotIn("--merge", run.call_args.args[0])
+
+
+class TestLigatureLookup(unittest.TestCase):
+    LIGATURES = [
+        (["p", "o", "n", "a"], "ponaTok"),
+        (["s", "i", "n", "a"], "sinaTok"),
+        (["p", "i"], "piTok"),
+        (["p", "i", "l", "i", "n"], "pilinTok"),
+        (["s", "e"], "seTok"),
+    ]
+
+    def rules(self, text):
+        return [line.strip() for line in text.splitlines() if line.startswith("  ")]
+
+    def test_grouped_longest_first(self):
+        text = ligature_lookup("ligatures", self.LIGATURES)
+        self.assertEqual(
+            self.rules(text),
+            [
+                "sub p i l i n by pilinTok;",
+                "sub p o n a by ponaTok;",
+                "sub p i by piTok;",
+                "sub s i n a by sinaTok;",
+                "sub s e by seTok;",
+            ],
+        )
+        self.assertTrue(text.startswith("lookup ligatures {"))
+
+    def test_split_between_groups(self):
+        text = ligature_lookup("ligatures", self.LIGATURES, max_bytes=60)
+        self.assertTrue(text.startswith("lookup ligatures useExtension {"))
+        rules = self.rules(text)
+        self.assertEqual(rules.count("subtable;"), 1)
+        # the p ligatures stay in the same subtable
+        self.assertEqual(rules.index("subtable;"), 3)
+
+    def test_compiles(self):
+        from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+        from fontTools.fontBuilder import FontBuilder
+
+        glyphs = [".notdef"] + sorted(
+            {
+                name
+                for components, glyph in self.LIGATURES
+                for name in components + [glyph]
+            }
+        )
+        builder = FontBuilder(1000, isTTF=True)
+        builder.setupGlyphOrder(glyphs)
+        text = ligature_lookup("ligatures", self.LIGATURES, max_bytes=60)
+        addOpenTypeFeaturesFromString(
+            builder.font, text + "feature liga { lookup ligatures; } liga;"
+        )
+        lookup = builder.font["GSUB"].table.LookupList.Lookup[0]
+        self.assertEqual(lookup.LookupType, 7)
+        self.assertEqual(lookup.SubTableCount, 2)
+
+
+class TestFontFormats(unittest.TestCase):
+    def cff_font(self):
+        from fontTools.fontBuilder import FontBuilder
+        from fontTools.pens.t2CharStringPen import T2CharStringPen
+
+        charstrings = {}
+        for name in (".notdef", "aTok"):
+            pen = T2CharStringPen(1000, None)
+            if name == "aTok":
+                pen.moveTo((100, 100))
+                pen.curveTo((100, 600), (900, 600), (900, 100))
+                pen.closePath()
+            charstrings[name] = pen.getCharString()
+        builder = FontBuilder(1000, isTTF=False)
+        builder.setupGlyphOrder([".notdef", "aTok"])
+        builder.setupCharacterMap({0xF1900: "aTok"})
+        builder.setupCFF("Test", {"FullName": "Test"}, charstrings, {})
+        builder.setupHorizontalMetrics({".notdef": (1000, 0), "aTok": (1000, 100)})
+        builder.setupHorizontalHeader(ascent=800, descent=-200)
+        builder.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+        builder.setupOS2()
+        builder.setupPost()
+        return builder.font
+
+    def bounds(self, tt):
+        from fontTools.pens.boundsPen import BoundsPen
+
+        # CFF2 fonts don't keep glyph names
+        name = tt.getBestCmap()[0xF1900]
+        pen = BoundsPen(tt.getGlyphSet())
+        tt.getGlyphSet()[name].draw(pen)
+        return pen.bounds
+
+    def test_format(self):
+        self.assertEqual(font_format(None), "ttf")
+        self.assertEqual(font_extension({"format": None}), ".ttf")
+        self.assertEqual(font_extension({"format": "otf"}), ".otf")
+        self.assertEqual(font_extension({"format": "cff2"}), ".otf")
+        with self.assertRaises(ValueError):
+            font_format({"format": "woff"})
+
+    def test_cff2(self):
+        from io import BytesIO
+        from fontTools.ttLib import TTFont
+
+        tt = self.cff_font()
+        bounds = self.bounds(tt)
+        try:
+            import cffsubr  # noqa: F401
+        except ImportError:
+            subroutinized = False
+        else:
+            subroutinized = True
+        self.assertEqual(finish_cff(tt, "cff2"), subroutinized)
+        data = BytesIO()
+        tt.save(data)
+        tt = TTFont(BytesIO(data.getvalue()))
+        self.assertIn("CFF2", tt)
+        self.assertNotIn("CFF ", tt)
+        # the cubic curve is kept as it is
+        self.assertEqual(self.bounds(tt), bounds)
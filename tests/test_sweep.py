@@ -0,0 +1,66 @@
+import os
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from handwrite.pngtosvg import PNGtoSVG, cell_threshold, histograms, otsu_thresholds
+from handwrite.sweep import sweep
+
+
+class TestThreshold(unittest.TestCase):
+    def test_otsu_splits_two_levels(self):
+        levels = np.full((2, 10, 10), 240, np.uint8)
+        levels[0, :3] = 40
+        levels[1, :5] = 120
+        thresholds = otsu_thresholds(histograms(levels))
+        self.assertTrue(40 < thresholds[0] <= 240)
+        self.assertTrue(120 < thresholds[1] <= 240)
+
+    def test_cell_threshold(self):
+        levels = np.full((10, 10), 250, np.uint8)
+        self.assertEqual(cell_threshold(levels, {}), 200)
+        self.assertEqual(cell_threshold(levels, {"threshold": "150"}), 150)
+        # a blank cell's Otsu threshold is capped
+        self.assertEqual(cell_threshold(levels, {"threshold": "otsu"}), 200)
+
+    def test_threshold_image(self):
+        pixels = np.full((250, 200, 4), 255, np.uint8)
+        pixels[:100, :, :3] = 180
+        image = PNGtoSVG().threshold(
+            Image.fromarray(pixels, "RGBA"), {"sheetversion": "2"}
+        )
+        result = np.asarray(image)
+        self.assertEqual(result[0, 0].tolist(), [0, 0, 0, 1])
+        self.assertEqual(result[-1, -1].tolist(), [255, 255, 255, 0])
+        image = PNGtoSVG().threshold(
+            Image.fromarray(pixels, "RGBA"), {"sheetversion": "2", "threshold": "150"}
+        )
+        self.assertEqual(np.asarray(image)[0, 0].tolist(), [255, 255, 255, 0])
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.sheet = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "test_data",
+            "sheettopng",
+            "excellent.jpg",
+        )
+        self.config = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "handwrite",
+            "default.json",
+        )
+
+    def test_sweep(self):
+        report = sweep(self.sheet, self.config, [150, 200])
+        self.assertEqual(report.labels, ["150", "200", "otsu", "otsu per cell"])
+        self.assertEqual(report.coverage.shape, (4, len(report.names)))
+        # more of each cell is ink at a higher threshold
+        self.assertTrue((report.coverage[1] >= report.coverage[0]).all())
+        self.assertTrue((report.thresholds[3] <= 200).all())
+        summary = report.summary()
+        self.assertEqual([row["threshold"] for row in summary], report.labels)
+        self.assertIn("otsu per cell", str(report))
+        self.assertEqual(set(report.as_dict()["cells"]), set(report.names))
@@ -0,0 +1,235 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from handwrite.preflight import check_sheet, preflight, with_sheet_version
+from handwrite.sheettopng import SHEETtoPNG
+from handwrite.synthetic import SyntheticSheets
+
+CONFIG = os.path.join("handwrite", "default.json")
+
+
+def stand_in_font(path, names):
+    """A font with a square glyph for each of `names`."""
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    pen = TTGlyphPen(None)
+    pen.moveTo((250, 100))
+    pen.lineTo((250, 600))
+    pen.lineTo((750, 600))
+    pen.lineTo((750, 100))
+    pen.closePath()
+    square = pen.glyph()
+    order = [".notdef"] + names
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(order)
+    builder.setupCharacterMap({})
+    builder.setupGlyf(
+        {name: square if name in names else TTGlyphPen(None).glyph() for name in order}
+    )
+    builder.setupHorizontalMetrics(
+        {name: (1000, 250 if name in names else 0) for name in order}
+    )
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupOS2(sTypoAscender=800, sTypoDescender=-200)
+    builder.setupPost()
+    builder.save(path)
+
+
+def rotate(image, angle):
+    """`image` turned by `angle` degrees about its middle, on white."""
+    height, width = image.shape[:2]
+    return cv2.warpAffine(
+        image,
+        cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0),
+        (width, height),
+        borderValue=(255, 255, 255),
+    )
+
+
+class TestSyntheticSheets(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def cells(self, image, metadata):
+        return SHEETtoPNG().detect_characters(None, image, 200, metadata)
+
+    def test_rows_where_handwrite_finds_them(self):
+        for version in ("2", "3"):
+            metadata = {"sheetversion": version}
+            sheets = SyntheticSheets(metadata=metadata, dpi=150)
+            gray = cv2.cvtColor(sheets.render(), cv2.COLOR_BGR2GRAY)
+            rows = SHEETtoPNG().find_rows(None, gray, 200)
+            self.assertEqual(sorted(rows, key=lambda box: box[1]), sheets.row_boxes())
+            path = os.path.join(self.directory, "sheet.png")
+            cv2.imwrite(path, sheets.render())
+            problems, _ = check_sheet(path, metadata)
+            self.assertEqual(problems, [])
+
+    def test_deskew(self):
+        metadata = {"sheetversion": "3"}
+        image = SyntheticSheets(metadata=metadata, dpi=150).render(seed=2)
+        straight = self.cells(image, metadata)
+        # a straight sheet is cut as it is
+        self.assertTrue(np.shares_memory(straight[0][0], image))
+        rotated = rotate(image, -1)
+        height, width = image.shape[:2]
+        corners = np.float32([(0, 0), (width, 0), (width, height), (0, height)])
+        photographed = cv2.warpPerspective(
+            image,
+            cv2.getPerspectiveTransform(
+                corners, corners + np.float32([(60, 0), (-60, 30), (0, 0), (0, -30)])
+            ),
+            (width, height),
+            borderValue=(255, 255, 255),
+        )
+        for skewed in (rotated, photographed):
+            messages = []
+            cells = SHEETtoPNG(progress=messages.append).detect_characters(
+                None, skewed, 200, metadata
+            )
+            self.assertIn("Straightened", messages[0].text)
+            self.assertEqual(len(cells), len(straight))
+            # each cell is cut where it is on the straight sheet, up to the
+            # blur of resampling
+            differences = [
+                np.abs(
+                    cv2.resize(cell[0], straight_cell[0].shape[1::-1]).astype(int)
+                    - straight_cell[0]
+                ).mean()
+                for cell, straight_cell in zip(cells, straight)
+            ]
+            self.assertLess(np.mean(differences), 6)
+
+    def test_tilted_sheet_version(self):
+        path = os.path.join(self.directory, "sheet.png")
+        for version, angles in (("2.1", (0.5, 1, -1, 2, -2)), ("3", (0.5, 1, -1))):
+            image = SyntheticSheets(
+                metadata={"sheetversion": version}, dpi=150
+            ).render()
+            for angle in angles:
+                cv2.imwrite(path, rotate(image, angle))
+                # the rows are measured along their sides, not by their
+                # bounding boxes, which the tilt makes taller
+                metadata = with_sheet_version(path, CONFIG, {})
+                self.assertEqual(metadata, {"sheetversion": version})
+                preflight(path, CONFIG, metadata, tools=False)
+
+    def test_ink_inside_the_cells(self):
+        metadata = {"sheetversion": "2"}
+        filled = SyntheticSheets(metadata=metadata, dpi=150).render(seed=3)
+        blank = SyntheticSheets(metadata=metadata, dpi=150, blank=1).render(seed=3)
+        ink = (filled < 128).any(axis=2) & ~(blank < 128).any(axis=2)
+        self.assertTrue(ink.any())
+        inside = np.zeros(ink.shape, bool)
+        for _, left, top, width, height in self.cells(filled, metadata):
+            inside[int(top) : int(top + height), int(left) : int(left + width)] = True
+        self.assertFalse((ink & ~inside).any())
+
+    def test_deterministic(self):
+        options = dict(dpi=100, rotation=2, noise=10, blank=0.2, jpeg_quality=50)
+        first = SyntheticSheets(**options)
+        second = SyntheticSheets(**options)
+        self.assertTrue(np.array_equal(first.render(seed=7), second.render(seed=7)))
+        self.assertEqual(first.encode(seed=7), second.encode(seed=7))
+        self.assertFalse(np.array_equal(first.render(seed=7), first.render(seed=8)))
+
+    def test_blank_cells_keep_the_others(self):
+        full = SyntheticSheets(dpi=100).draw(seed=1)
+        some = SyntheticSheets(dpi=100, blank=0.5).draw(seed=1)
+        changed = full != some
+        self.assertTrue(changed.any())
+        # a blank cell is only missing its ink, the rest is drawn the same
+        self.assertTrue((some[changed] > full[changed]).all())
+
+    def test_font(self):
+        font = os.path.join(self.directory, "font.ttf")
+        stand_in_font(font, ["aTok", "alaTok"])
+        metadata = {"sheetversion": "3"}
+        image = SyntheticSheets(font=font, metadata=metadata, dpi=150).render()
+        cells = self.cells(image, metadata)
+        for cell, filled in ((0, True), (1, False), (2, True)):
+            ink = cv2.cvtColor(cells[cell][0], cv2.COLOR_BGR2GRAY) < 128
+            self.assertEqual(ink.any(), filled)
+        _, xs = np.nonzero(cv2.cvtColor(cells[0][0], cv2.COLOR_BGR2GRAY) < 128)
+        width = cells[0][0].shape[1]
+        # the square is in the middle of the cell, horizontally
+        self.assertAlmostEqual((xs.min() + xs.max()) / 2, width / 2, delta=2)
+
+    def test_write(self):
+        config = os.path.join(self.directory, "config.json")
+        with open(CONFIG) as f:
+            data = json.load(f)
+        data["glyphs-fancy"] = [
+            {"codepoint": "0xf1900", "name": "aTok", "page": 1, "row": 0, "col": 0}
+        ]
+        with open(config, "w") as f:
+            json.dump(data, f)
+        sheets = SyntheticSheets(config, dpi=50, jpeg_quality=80)
+        paths = sheets.write(self.directory, 2, seed=5)
+        self.assertEqual(
+            [os.path.basename(path) for path in paths],
+            [
+                "sheet-00000-p1.jpg",
+                "sheet-00000-p2.jpg",
+                "sheet-00001-p1.jpg",
+                "sheet-00001-p2.jpg",
+            ],
+        )
+        with open(paths[3], "rb") as f:
+            self.assertEqual(f.read(), sheets.encode(seed=6, page=1))
+
+
+@unittest.skipUnless(
+    shutil.which("potrace") and shutil.which("fontforge"),
+    "potrace and fontforge are needed for a full build",
+)
+class TestTiltedBuild(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_converters(self):
+        from handwrite import converters
+        from handwrite.checkpoint import Checkpoint, hash_file, hash_sheets
+
+        image = SyntheticSheets(metadata={"sheetversion": "2.1"}, dpi=150).render()
+        sheet = os.path.join(self.directory, "sheet.png")
+        cv2.imwrite(sheet, rotate(image, 1))
+        output = os.path.join(self.directory, "output")
+        os.makedirs(output)
+        debug = os.path.join(self.directory, "debug")
+        events = []
+        # no sheet version, and preflight on
+        converters(
+            sheet,
+            output,
+            debug,
+            metadata={"filename": "Tilted"},
+            progress=events.append,
+        )
+        self.assertTrue(os.path.exists(os.path.join(output, "Tilted.ttf")))
+        # cut as the version it is (a tilted v2 sheet's bounding boxes look v3)
+        inputs = {
+            "sheet": hash_sheets(sheet),
+            "config": hash_file(CONFIG),
+            "sheetversion": "2.1",
+        }
+        self.assertTrue(Checkpoint(debug, "sheettopng", inputs).is_current())
+        self.assertTrue(
+            any(
+                event.kind == "message" and event.text.startswith("Straightened")
+                for event in events
+            )
+        )